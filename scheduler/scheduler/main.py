@@ -1,46 +1,188 @@
+import asyncio
+import heapq
 import logging
-import time
+import random
+from datetime import datetime, timedelta, timezone
 
-from schedule import every, run_pending
-
-from scheduler.settings import BACKEND_API_KEY, TRIGGER_INTERVAL_SECONDS
-from scheduler.utils import BackendAPI
+from scheduler.settings import (
+    ANALYSIS_COMMAND,
+    BACKEND_API_KEY,
+    SCHEDULE_REFRESH_SECONDS,
+    SCHEDULER_JITTER_SECONDS,
+    SCHEDULER_MAX_BACKOFF_SECONDS,
+    SCHEDULER_TICK_SECONDS,
+    TRIGGER_RETRY_SECONDS,
+)
+from scheduler.utils import BackendAPI, run_analysis_command
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 
+# Status codes of a backend that can't take more work for now
+SATURATED_STATUSES = (429, 503)
 
-# def is_working_hours() -> bool:
-#     now = datetime.utcnow()
-#     if now.hour <= 9 or now.hour >= 22:
-#         return False
-#     if now.weekday() in [5, 6]:
-#         return False
-#     return True
 
+class DueQueue:
+    """Subscription ids in a heap by the time they are due for analysis."""
 
-def job():
-    backend_api = BackendAPI(
-        "http://nginx:80/", authorization=f"Api-Key {BACKEND_API_KEY}"
-    )
-    response = backend_api.trigger_analysis()
-    if not response:
-        logging.error("Failed to trigger analysis")
-        return
-    if response.status != 200:
-        logging.error(
-            f"Analysis trigger returned {response.status} status code"
+    def __init__(self) -> None:
+        self.heap: list[tuple[datetime, int]] = []
+        self.loaded_at: datetime | None = None
+
+    def load(self, due: dict[str, str], now: datetime) -> None:
+        """Replace the due times by the backend's whole schedule."""
+        self.heap = []
+        self.push(due)
+        self.loaded_at = now
+
+    def push(self, due: dict[str, str]) -> None:
+        for pk, at in due.items():
+            heapq.heappush(self.heap, (datetime.fromisoformat(at), int(pk)))
+
+    def pop_due(self, now: datetime) -> list[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+
+class Scheduler:
+    """Triggers the due subscriptions, one run at a time.
+
+    A run starts `tick` seconds after the previous one was planned, plus
+    up to `jitter` seconds. Each run in a row that finds the backend
+    saturated doubles the wait, up to `max_backoff` seconds.
+    """
+
+    def __init__(
+        self,
+        backend_api: BackendAPI,
+        tick: float,
+        jitter: float,
+        max_backoff: float,
+    ) -> None:
+        self.backend_api = backend_api
+        self.tick = tick
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.queue = DueQueue()
+        self.saturated_runs = 0
+
+    def delay(self) -> float:
+        backoff = min(self.tick * 2**self.saturated_runs, self.max_backoff)
+        return max(backoff, self.tick) + random.uniform(0, self.jitter)
+
+    def refresh(self, now: datetime) -> None:
+        if self.queue.loaded_at is not None and now - self.queue.loaded_at < (
+            timedelta(seconds=SCHEDULE_REFRESH_SECONDS)
+        ):
+            return
+        response = self.backend_api.analysis_schedule()
+        if response and response.status == 200:
+            self.queue.load(response.json()["subscriptions"], now)
+            logging.info(
+                f"Loaded the schedule of {len(self.queue.heap)} subscriptions"
+            )
+        else:
+            logging.error("Failed to load the analysis schedule")
+
+    def trigger(self, now: datetime) -> bool:
+        """Trigger the due subscriptions, returns whether the backend is
+        saturated."""
+        self.refresh(now)
+        due = self.queue.pop_due(now)
+        if not due:
+            return False
+        if ANALYSIS_COMMAND:
+            return self.run_command(due, now)
+        response = self.backend_api.trigger_analysis(due)
+        if not response or response.status not in (200, 202):
+            logging.error(
+                f"Failed to trigger the analysis of {len(due)} subscriptions"
+                + (f": {response.status} status code" if response else "")
+            )
+            retry_at = now + timedelta(seconds=TRIGGER_RETRY_SECONDS)
+            self.queue.push({pk: retry_at.isoformat() for pk in due})
+            return response is None or response.status in SATURATED_STATUSES
+        data = response.json()
+        # Without it, the subscriptions were removed
+        self.queue.push(data.get("due", {}))
+        if "job" not in data:
+            return False
+        logging.info(
+            f"Analysis job {data['job']} {data['message']} "
+            f"with {len(due)} due subscriptions"
+        )
+        # The previous job is still waiting for a worker
+        return data["message"] == "already queued"
+
+    def run_command(self, due: list[int], now: datetime) -> bool:
+        """Analyse the due subscriptions with `ANALYSIS_COMMAND`, which
+        returns once done, so the backend is never saturated by it."""
+        output = run_analysis_command(ANALYSIS_COMMAND, due)
+        if output is None:
+            logging.error(f"Failed to analyse {len(due)} subscriptions")
+            retry_at = now + timedelta(seconds=TRIGGER_RETRY_SECONDS)
+            self.queue.push({pk: retry_at.isoformat() for pk in due})
+            return False
+        self.queue.push(output["due"])
+        logging.info(
+            f"Analysed {len(due)} due subscriptions: {output['result']}, "
+            f"{output['timings']}"
         )
-        return
+        return False
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        planned = loop.time()
+        number = 0
+        while True:
+            await asyncio.sleep(max(planned - loop.time(), 0))
+            number += 1
+            start = loop.time()
+            logging.info(f"Run {number} started {start - planned:.1f}s late")
+            try:
+                # The requests block, the loop keeps the time meanwhile
+                saturated = await asyncio.to_thread(
+                    self.trigger, datetime.now(timezone.utc)
+                )
+            except Exception:
+                logging.exception(f"Run {number} failed")
+                saturated = False
+            end = loop.time()
+            self.saturated_runs = self.saturated_runs + 1 if saturated else 0
+            # Backing off counts from the end of the run, not its plan
+            planned = (end if saturated else planned) + self.delay()
+            logging.info(
+                f"Run {number} ended after {end - start:.1f}s, "
+                f"next in {max(planned - end, 0):.1f}s"
+                + (
+                    f", backing off after {self.saturated_runs} saturated runs"
+                    if self.saturated_runs
+                    else ""
+                )
+            )
+            if planned < end:
+                logging.warning(
+                    f"Run {number} overran the next one by "
+                    f"{end - planned:.1f}s, it starts now"
+                )
+                planned = end
 
 
 def main():
-    every(TRIGGER_INTERVAL_SECONDS).seconds.do(job)
-    while True:
-        run_pending()
-        time.sleep(1)
+    backend_api = BackendAPI(
+        "http://nginx:80/", authorization=f"Api-Key {BACKEND_API_KEY}"
+    )
+    scheduler = Scheduler(
+        backend_api,
+        tick=SCHEDULER_TICK_SECONDS,
+        jitter=SCHEDULER_JITTER_SECONDS,
+        max_backoff=SCHEDULER_MAX_BACKOFF_SECONDS,
+    )
+    asyncio.run(scheduler.run())
 
 
 if __name__ == "__main__":
@@ -4,4 +4,18 @@ from dotenv import load_dotenv
 
 load_dotenv()
 BACKEND_API_KEY = os.getenv("BACKEND_API_KEY")
-TRIGGER_INTERVAL_SECONDS = int(os.getenv("TRIGGER_INTERVAL_SECONDS", 3600))
+# Seconds between two checks of the due subscriptions, and between two
+# reloads of their due times from the backend
+SCHEDULER_TICK_SECONDS = int(os.getenv("SCHEDULER_TICK_SECONDS", 30))
+SCHEDULE_REFRESH_SECONDS = int(os.getenv("SCHEDULE_REFRESH_SECONDS", 3600))
+# Most seconds added at random to the tick, so that runs don't line up
+SCHEDULER_JITTER_SECONDS = float(os.getenv("SCHEDULER_JITTER_SECONDS", 5))
+# Most seconds between two runs while the backend is saturated
+SCHEDULER_MAX_BACKOFF_SECONDS = int(
+    os.getenv("SCHEDULER_MAX_BACKOFF_SECONDS", 600)
+)
+# Seconds before the subscriptions of a failed trigger are triggered again
+TRIGGER_RETRY_SECONDS = int(os.getenv("TRIGGER_RETRY_SECONDS", 60))
+# Command running the analysis in-process instead of queuing it through the
+# API, e.g. "python manage.py run_analysis" where the server code is
+ANALYSIS_COMMAND = os.getenv("ANALYSIS_COMMAND")
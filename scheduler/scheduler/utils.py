@@ -1,5 +1,7 @@
 import json
 import logging
+import shlex
+import subprocess
 from typing import Any
 
 import urllib3
@@ -54,6 +56,39 @@ class API:
 
 
 class BackendAPI(API):
-    def trigger_analysis(self) -> urllib3.BaseHTTPResponse | None:
+    def trigger_analysis(
+        self, subscriptions: list[int] | None = None
+    ) -> urllib3.BaseHTTPResponse | None:
         url = self.base_url + "api/analysis/"
+        if subscriptions is None:
+            return self._send_request("GET", url)
+        return self._send_request(
+            "POST", url, data={"subscriptions": subscriptions}
+        )
+
+    def analysis_schedule(self) -> urllib3.BaseHTTPResponse | None:
+        url = self.base_url + "api/analysis/schedule/"
         return self._send_request("GET", url)
+
+
+def run_analysis_command(
+    command: str, subscriptions: list[int]
+) -> dict[str, Any] | None:
+    """Run the `run_analysis` management `command` on `subscriptions`.
+
+    Returns its JSON output, None when it failed.
+    """
+    try:
+        completed = subprocess.run(
+            shlex.split(command)
+            + ["--json", "--subscriptions", *map(str, subscriptions)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(completed.stdout)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"{e}: {e.stderr}")
+    except (OSError, ValueError) as e:
+        logger.error(e)
+    return None
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from scheduler.main import DueQueue, Scheduler
+from scheduler.settings import TRIGGER_RETRY_SECONDS
+
+NOW = datetime(2024, 6, 5, 14, tzinfo=timezone.utc)
+
+
+def at(minutes: int) -> str:
+    return (NOW + timedelta(minutes=minutes)).isoformat()
+
+
+def response(status: int, data: dict | None = None) -> MagicMock:
+    mock = MagicMock(status=status)
+    mock.json.return_value = data or {}
+    return mock
+
+
+class TestDueQueue(TestCase):
+    def test_pop_due_in_order(self):
+        queue = DueQueue()
+        queue.load({"1": at(-1), "2": at(5), "3": at(-10)}, NOW)
+        queue.push({"4": at(0)})
+
+        self.assertEqual(queue.pop_due(NOW), [3, 1, 4])
+        self.assertEqual(queue.pop_due(NOW), [])
+        self.assertEqual(queue.pop_due(NOW + timedelta(minutes=5)), [2])
+
+    def test_load_replaces_schedule(self):
+        queue = DueQueue()
+        queue.load({"1": at(-1)}, NOW)
+        queue.load({"2": at(-1)}, NOW)
+
+        self.assertEqual(queue.pop_due(NOW), [2])
+        self.assertEqual(queue.loaded_at, NOW)
+
+
+@patch("scheduler.main.random.uniform", return_value=0.0)
+class TestDelay(TestCase):
+    def test_doubles_while_saturated(self, mock_uniform):
+        scheduler = Scheduler(MagicMock(), tick=30, jitter=5, max_backoff=600)
+
+        delays = []
+        for saturated_runs in range(7):
+            scheduler.saturated_runs = saturated_runs
+            delays.append(scheduler.delay())
+
+        self.assertEqual(delays, [30, 60, 120, 240, 480, 600, 600])
+        mock_uniform.assert_called_with(0, 5)
+
+    def test_never_below_tick(self, mock_uniform):
+        scheduler = Scheduler(MagicMock(), tick=30, jitter=0, max_backoff=10)
+        scheduler.saturated_runs = 3
+
+        self.assertEqual(scheduler.delay(), 30)
+
+    def test_jitter_added(self, mock_uniform):
+        mock_uniform.return_value = 4.5
+        scheduler = Scheduler(MagicMock(), tick=30, jitter=5, max_backoff=600)
+
+        self.assertEqual(scheduler.delay(), 34.5)
+
+
+class TestTrigger(TestCase):
+    def setUp(self):
+        self.backend_api = MagicMock()
+        self.scheduler = Scheduler(
+            self.backend_api, tick=30, jitter=0, max_backoff=600
+        )
+        self.scheduler.queue.load({"1": at(-1), "2": at(10)}, NOW)
+
+    def trigger(self, trigger_response):
+        self.backend_api.trigger_analysis.return_value = trigger_response
+        return self.scheduler.trigger(NOW)
+
+    def assert_retried(self):
+        retry_at = NOW + timedelta(seconds=TRIGGER_RETRY_SECONDS)
+        self.assertEqual(self.scheduler.queue.pop_due(retry_at), [1])
+
+    def test_saturated_backend_retried(self):
+        for trigger_response in (response(429), response(503), None):
+            with self.subTest(trigger_response=trigger_response):
+                self.setUp()
+
+                self.assertTrue(self.trigger(trigger_response))
+
+                self.backend_api.trigger_analysis.assert_called_once_with([1])
+                self.assertEqual(self.scheduler.queue.pop_due(NOW), [])
+                self.assert_retried()
+
+    def test_failure_retried(self):
+        self.assertFalse(self.trigger(response(500)))
+
+        self.assert_retried()
+
+    def test_already_queued(self):
+        saturated = self.trigger(
+            response(
+                202,
+                {"message": "already queued", "job": 1, "due": {"1": at(60)}},
+            )
+        )
+
+        self.assertTrue(saturated)
+        self.assertEqual(
+            self.scheduler.queue.pop_due(NOW + timedelta(minutes=60)), [2, 1]
+        )
+
+    def test_queued(self):
+        saturated = self.trigger(
+            response(202, {"message": "queued", "job": 1, "due": {}})
+        )
+
+        self.assertFalse(saturated)
+        self.backend_api.analysis_schedule.assert_not_called()
+
+    def test_nothing_due(self):
+        self.scheduler.queue.pop_due(NOW)
+
+        self.assertFalse(self.scheduler.trigger(NOW))
+        self.backend_api.trigger_analysis.assert_not_called()
+
+    def test_schedule_refreshed(self):
+        self.scheduler.queue.loaded_at = NOW - timedelta(days=1)
+        self.backend_api.analysis_schedule.return_value = response(
+            200, {"subscriptions": {"3": at(-1)}}
+        )
+
+        self.trigger(response(202, {"message": "queued", "job": 1}))
+
+        self.backend_api.trigger_analysis.assert_called_once_with([3])
+
+
+@patch("scheduler.main.random.uniform", return_value=0.0)
+class TestRun(TestCase):
+    def test_runs_never_overlap(self, mock_uniform):
+        scheduler = Scheduler(MagicMock(), tick=0, jitter=0, max_backoff=0)
+        running = threading.Lock()
+        runs = []
+
+        def trigger(now):
+            self.assertTrue(running.acquire(blocking=False))
+            runs.append(now)
+            running.release()
+            if len(runs) == 3:
+                raise asyncio.CancelledError
+            return len(runs) == 1
+
+        with patch.object(scheduler, "trigger", side_effect=trigger):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(scheduler.run())
+
+        self.assertEqual(len(runs), 3)
+        self.assertEqual(scheduler.saturated_runs, 0)
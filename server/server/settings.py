@@ -20,6 +20,76 @@ DEBUG = "True" == os.getenv("DEBUG")
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "").split(",")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
+# Stocks analysis
+# Compute the indicators of all subscriptions sharing an interval in one
+# vectorized panel instead of per subscription
+ANALYSIS_BATCH_MODE = "True" == os.getenv("ANALYSIS_BATCH_MODE")
+# Directory of the local OHLCV history store, bars are downloaded on every
+# run when it is not set
+STOCKS_HISTORY_DIR = os.getenv("STOCKS_HISTORY_DIR")
+# When set, the analysis only fetches the bars the latest indicator values
+# need to be within this precision of the ones of the whole period; the full
+# period is fetched for the chart of a state change
+ANALYSIS_LOOKBACK_PRECISION = (
+    float(os.environ["ANALYSIS_LOOKBACK_PRECISION"])
+    if os.getenv("ANALYSIS_LOOKBACK_PRECISION")
+    else None
+)
+# Number of tickers downloaded together by the analysis
+ANALYSIS_DOWNLOAD_BATCH_SIZE = int(
+    os.getenv("ANALYSIS_DOWNLOAD_BATCH_SIZE", 50)
+)
+# Source of the bars: "yfinance", or "replay" to serve the files under
+# MARKET_DATA_REPLAY_DIR (synthetic bars for the others) after
+# MARKET_DATA_REPLAY_LATENCY seconds, see stocks/analysis/providers.py
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+MARKET_DATA_REPLAY_DIR = os.getenv("MARKET_DATA_REPLAY_DIR")
+MARKET_DATA_REPLAY_LATENCY = float(os.getenv("MARKET_DATA_REPLAY_LATENCY", 0))
+# Requests per second to the market data provider, across all the fetches
+# of the process; 0 is unlimited
+MARKET_DATA_RATE_LIMIT = float(os.getenv("MARKET_DATA_RATE_LIMIT", 2))
+# Bounds of the concurrent requests, which adapt to the responses in between,
+# see AdaptiveLimiter in stocks/analysis/fetcher.py
+MARKET_DATA_MIN_CONCURRENCY = int(os.getenv("MARKET_DATA_MIN_CONCURRENCY", 1))
+MARKET_DATA_MAX_CONCURRENCY = int(os.getenv("MARKET_DATA_MAX_CONCURRENCY", 16))
+# Latency, relative to the lowest one seen, at which a host is considered
+# congested
+MARKET_DATA_LATENCY_TOLERANCE = float(
+    os.getenv("MARKET_DATA_LATENCY_TOLERANCE", 3)
+)
+# Seconds after which the analysis gives up on the bars of one ticker
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", 30))
+# Retries of a failed market data request, waiting up to
+# MARKET_DATA_RETRY_BACKOFF seconds doubled per attempt
+MARKET_DATA_RETRIES = int(os.getenv("MARKET_DATA_RETRIES", 2))
+MARKET_DATA_RETRY_BACKOFF = float(os.getenv("MARKET_DATA_RETRY_BACKOFF", 0.5))
+# Failed requests in a row after which the provider is not called for
+# MARKET_DATA_BREAKER_RESET seconds
+MARKET_DATA_BREAKER_THRESHOLD = int(
+    os.getenv("MARKET_DATA_BREAKER_THRESHOLD", 5)
+)
+MARKET_DATA_BREAKER_RESET = float(os.getenv("MARKET_DATA_BREAKER_RESET", 60))
+# Seconds a ticker that returned no bars twice is not fetched for, doubled
+# after each further miss up to MARKET_DATA_MISS_MAX_RECHECK
+MARKET_DATA_MISS_RECHECK = int(os.getenv("MARKET_DATA_MISS_RECHECK", 3600))
+MARKET_DATA_MISS_MAX_RECHECK = int(
+    os.getenv("MARKET_DATA_MISS_MAX_RECHECK", 7 * 24 * 3600)
+)
+# Threads fetching the bars of one ticker each; 0 downloads
+# ANALYSIS_DOWNLOAD_BATCH_SIZE tickers per request instead
+ANALYSIS_FETCH_WORKERS = int(os.getenv("ANALYSIS_FETCH_WORKERS", 0))
+# Minutes the last bars of a session may take to be served after its close,
+# subscriptions whose exchange was closed since are not analysed
+ANALYSIS_BAR_DELAY = int(os.getenv("ANALYSIS_BAR_DELAY", 20))
+# Seconds an analysis worker waits between two checks of an empty queue, and
+# without progress of a running job before it is failed as lost
+ANALYSIS_JOB_POLL = float(os.getenv("ANALYSIS_JOB_POLL", 5))
+ANALYSIS_JOB_TIMEOUT = int(os.getenv("ANALYSIS_JOB_TIMEOUT", 3600))
+# Subscriptions an analysis worker leases at a time, and seconds after which
+# the lease of a worker that stopped renewing it is taken over
+ANALYSIS_LEASE_SIZE = int(os.getenv("ANALYSIS_LEASE_SIZE", 100))
+ANALYSIS_LEASE_SECONDS = int(os.getenv("ANALYSIS_LEASE_SECONDS", 600))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -8,6 +8,10 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from stocks.views import (
+    AnalysisJobStatus,
+    AnalysisSchedule,
+    Backtest,
+    FetchStats,
     SubscriptionViewSet,
     TelegramSubscriptionViewSet,
     TriggerAnalysis,
@@ -37,4 +41,20 @@ urlpatterns = [
         TriggerUserAnalysis.as_view(),
         name="trigger-user-analysis",
     ),
+    path(
+        "api/analysis/schedule/",
+        AnalysisSchedule.as_view(),
+        name="analysis-schedule",
+    ),
+    path(
+        "api/analysis/jobs/<int:pk>/",
+        AnalysisJobStatus.as_view(),
+        name="analysis-job",
+    ),
+    path("api/analysis/backtest/", Backtest.as_view(), name="backtest"),
+    path(
+        "api/analysis/fetch-stats/",
+        FetchStats.as_view(),
+        name="fetch-stats",
+    ),
 ]
@@ -0,0 +1,105 @@
+"""Replay the state rules over whole histories.
+
+The indicators of many tickers are computed together and every bar is
+classified at once with `CompiledRules`, instead of one `analyse_stock` call
+per bar. The states are then reduced to the bars where they change.
+"""
+
+from typing import Mapping
+
+import numpy as np
+from pandas import DataFrame
+
+from stocks.analysis.kernel import INDICATOR_COLUMNS
+from stocks.analysis.panel import align_closes, compute_panel
+from stocks.analysis.rules import StateRuleIndex, get_rule_index
+
+TRANSITION_COLUMNS = ["State", "Close", "Bars", "Return"]
+# Tickers whose indicators are computed together, which bounds the memory
+# of the (bars x tickers x indicators) block
+BACKTEST_CHUNK = 256
+
+
+def classify_histories(
+    histories: Mapping[str, DataFrame], rules: StateRuleIndex
+) -> dict[str, np.ndarray]:
+    """State id of every bar of every OHLCV history.
+
+    The indicators of `BACKTEST_CHUNK` tickers are computed together with
+    `compute_panel` and classified in one call.
+    """
+    items = list(histories.items())
+    state_ids = {}
+    for i in range(0, len(items), BACKTEST_CHUNK):
+        chunk = dict(items[i : i + BACKTEST_CHUNK])
+        closes = align_closes(chunk)
+        bars, tickers = closes.shape
+        block = compute_panel(closes).reshape(
+            bars * tickers, len(INDICATOR_COLUMNS)
+        )
+        ids = rules.compiled.classify_values(block, INDICATOR_COLUMNS)
+        ids = ids.reshape(bars, tickers)
+        for column, (ticker, history) in enumerate(chunk.items()):
+            state_ids[ticker] = ids[bars - len(history) :, column]
+    return state_ids
+
+
+def state_transitions(
+    history: DataFrame, state_ids: np.ndarray, rules: StateRuleIndex
+) -> DataFrame:
+    """Bars at which the state changes, with what holding it returned.
+
+    A state is held from its bar until the next transition, or the last bar
+    for the current one. `Return` is the relative change of the Close over
+    that time.
+    """
+    if not len(history):
+        return DataFrame(columns=TRANSITION_COLUMNS)
+
+    changes = np.flatnonzero(np.diff(state_ids)) + 1
+    starts = np.insert(changes, 0, 0)
+    ends = np.append(changes, len(history) - 1)
+
+    close = history["Close"].to_numpy(dtype=float)
+    held, positions = np.unique(state_ids[starts], return_inverse=True)
+    names = np.array([rules.states[state_id].name for state_id in held])
+    return DataFrame(
+        {
+            "State": names[positions],
+            "Close": close[starts],
+            "Bars": ends - starts,
+            "Return": close[ends] / close[starts] - 1,
+        },
+        index=history.index[starts],
+    )
+
+
+def backtest(
+    histories: Mapping[str, DataFrame], rules: StateRuleIndex | None = None
+) -> dict[str, DataFrame]:
+    """State transitions of every ticker in `histories`."""
+    if rules is None:
+        rules = get_rule_index()
+    state_ids = classify_histories(histories, rules)
+    return {
+        ticker: state_transitions(history, state_ids[ticker], rules)
+        for ticker, history in histories.items()
+    }
+
+
+def summarize(transitions: Mapping[str, DataFrame]) -> DataFrame:
+    """Number of signals, mean return and hit rate of each state."""
+    frames = [frame for frame in transitions.values() if len(frame)]
+    if not frames:
+        return DataFrame(columns=["Signals", "Mean return", "Hit rate"])
+
+    signals = np.concatenate([frame["State"].to_numpy() for frame in frames])
+    returns = np.concatenate([frame["Return"].to_numpy() for frame in frames])
+    grouped = DataFrame({"State": signals, "Return": returns}).groupby("State")
+    return DataFrame(
+        {
+            "Signals": grouped["Return"].count(),
+            "Mean return": grouped["Return"].mean(),
+            "Hit rate": grouped["Return"].agg(lambda r: (r > 0).mean()),
+        }
+    )
@@ -0,0 +1,338 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.utils import timezone
+from pandas import DataFrame, Timestamp
+
+from stocks.analysis.exchanges import exchange_for
+from stocks.analysis.fetcher import fetch_concurrently, get_limiter
+from stocks.analysis.lookback import lookback_start
+from stocks.analysis.periods import (
+    longest_period,
+    period_start,
+    slice_period,
+)
+from stocks.analysis.providers import get_provider
+from stocks.analysis.resample import RESAMPLE_SOURCES, resample_history
+from stocks.analysis.resilience import cached_misses, record_fetches
+from stocks.analysis.store import HistoryStore
+from stocks.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+def download_batch(
+    tickers: list[str],
+    period: str,
+    interval: str,
+    start: Timestamp | None = None,
+) -> dict[str, DataFrame]:
+    """Download the bars of several tickers in one provider call.
+
+    `start`, when given, replaces the `period`. The result has one frame per
+    ticker that has bars.
+    """
+    return get_provider().download(tickers, period, interval, start=start)
+
+
+@dataclass
+class FetchPlan:
+    """One download serving every subscription of a (ticker, interval)."""
+
+    ticker: str
+    interval: str
+    period: str
+    subscriptions: list[Subscription]
+    # Only fetch from here on instead of the whole period
+    start: Timestamp | None = None
+
+    def effective_start(self, now: datetime) -> Timestamp:
+        return self.start or period_start(self.period, now)
+
+
+def plan_fetches(subscriptions: Iterable[Subscription]) -> list[FetchPlan]:
+    """Fetch each (ticker, interval) once, for the longest requested period.
+
+    `Subscription` is unique on (stock, period, interval), so subscriptions
+    of the same ticker and interval only differ by how much of the history
+    they look at.
+
+    With `ANALYSIS_LOOKBACK_PRECISION` set, only the warm-up window the
+    latest indicator values need is fetched, see `lookback`.
+    """
+    by_key: dict[tuple[str, str], list[Subscription]] = defaultdict(list)
+    for sub in subscriptions:
+        by_key[(sub.stock.ticker, sub.interval)].append(sub)
+
+    now = timezone.now()
+    plans = [
+        FetchPlan(
+            ticker=ticker,
+            interval=interval,
+            period=longest_period((sub.period for sub in subs), now),
+            subscriptions=subs,
+        )
+        for (ticker, interval), subs in by_key.items()
+    ]
+
+    precision = settings.ANALYSIS_LOOKBACK_PRECISION
+    if precision:
+        for plan in plans:
+            start = lookback_start(
+                plan.interval, precision, now, exchange_for(plan.ticker)
+            )
+            if start > period_start(plan.period, now):
+                plan.start = start
+
+    total = sum(len(plan.subscriptions) for plan in plans)
+    logger.info(
+        f"Planned {len(plans)} fetches for {total} subscriptions, "
+        f"saved {total - len(plans)}"
+    )
+    return plans
+
+
+def plan_resampling(
+    plans: list[FetchPlan], now: datetime
+) -> dict[tuple[str, str], str]:
+    """Pick the plans that can be resampled from a finer one of their ticker.
+
+    A finer plan qualifies when it starts no later, so it covers the same
+    span a direct download would. Returns the source interval per
+    (ticker, interval) to derive.
+    """
+    starts = {
+        (plan.ticker, plan.interval): plan.effective_start(now)
+        for plan in plans
+    }
+    derived = {}
+    for plan in plans:
+        start = starts[(plan.ticker, plan.interval)]
+        for source in RESAMPLE_SOURCES.get(plan.interval, []):
+            source_start = starts.get((plan.ticker, source))
+            if source_start is not None and source_start <= start:
+                derived[(plan.ticker, plan.interval)] = source
+                break
+    return derived
+
+
+def _fetch_plan(plan: FetchPlan, store: HistoryStore | None) -> DataFrame:
+    """Bars of one plan, from the store when it covers them."""
+    if store:
+        history = store.update_history(
+            plan.ticker, plan.interval, plan.period, plan.start
+        )
+        if history is not None:
+            return history
+    history = get_provider().history(
+        plan.ticker,
+        period=None if plan.start else plan.period,
+        interval=plan.interval,
+        start=plan.start,
+        timeout=settings.MARKET_DATA_TIMEOUT,
+    )
+    if store:
+        history = store.save_history(
+            plan.ticker, plan.interval, plan.period, history, start=plan.start
+        )
+    return history
+
+
+def _fetch_concurrently(
+    plans: list[FetchPlan], store: HistoryStore | None, workers: int
+) -> Iterator[tuple[tuple[str, str], DataFrame | None]]:
+    tasks = {
+        (plan.ticker, plan.interval): partial(_fetch_plan, plan, store)
+        for plan in plans
+    }
+    for key, result in fetch_concurrently(
+        tasks,
+        workers=workers,
+        timeout=settings.MARKET_DATA_TIMEOUT,
+    ):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to fetch {key}: {result}")
+            yield key, None
+        else:
+            yield key, result
+
+
+def _iter_fetch(
+    plans: list[FetchPlan],
+    store: HistoryStore | None,
+    workers: int | None = None,
+) -> Iterator[tuple[tuple[str, str], DataFrame | None]]:
+    """(key, bars) of every plan as they arrive, None when fetching failed.
+
+    An empty frame means the upstream has no bars for the key. `workers`
+    defaults to `ANALYSIS_FETCH_WORKERS`.
+    """
+    if workers is None:
+        workers = settings.ANALYSIS_FETCH_WORKERS
+    if workers:
+        yield from _fetch_concurrently(plans, store, workers)
+        return
+
+    groups: dict[tuple[str, str, Timestamp | None], list[FetchPlan]] = (
+        defaultdict(list)
+    )
+    limiter = get_limiter()
+    for plan in plans:
+        if store:
+            with limiter:
+                history = store.update_history(
+                    plan.ticker, plan.interval, plan.period, plan.start
+                )
+            if history is not None:
+                yield (plan.ticker, plan.interval), history
+                continue
+        groups[(plan.interval, plan.period, plan.start)].append(plan)
+
+    batch_size = settings.ANALYSIS_DOWNLOAD_BATCH_SIZE
+    for (interval, period, start), group in groups.items():
+        tickers = sorted(plan.ticker for plan in group)
+        for i in range(0, len(tickers), batch_size):
+            batch = tickers[i : i + batch_size]
+            logger.info(f"Downloading {interval}/{period} of {batch}")
+            try:
+                with limiter:
+                    downloaded = download_batch(
+                        batch, period, interval, start=start
+                    )
+            except Exception as e:
+                logger.error(f"Failed to download {batch}: {e}")
+                downloaded = None
+            # yf.download returns nothing at all rather than raising when
+            # throttled, which says nothing about the tickers
+            if downloaded is None or (not downloaded and len(batch) > 1):
+                for ticker in batch:
+                    yield (ticker, interval), None
+                continue
+
+            for ticker in batch:
+                history = downloaded.get(ticker, DataFrame())
+                if store:
+                    history = store.save_history(
+                        ticker, interval, period, history, start=start
+                    )
+                yield (ticker, interval), history
+
+
+def _fetch(
+    plans: list[FetchPlan], store: HistoryStore | None
+) -> dict[tuple[str, str], DataFrame]:
+    return {
+        key: DataFrame() if history is None else history
+        for key, history in _iter_fetch(plans, store)
+    }
+
+
+def _get_store() -> HistoryStore | None:
+    if settings.STOCKS_HISTORY_DIR:
+        return HistoryStore(settings.STOCKS_HISTORY_DIR)
+    return None
+
+
+def fetch_tickers(
+    tickers: Iterable[str], period: str, interval: str
+) -> dict[str, DataFrame]:
+    """Bars of several tickers that no subscription needs to exist for."""
+    plans = [
+        FetchPlan(
+            ticker=ticker, interval=interval, period=period, subscriptions=[]
+        )
+        for ticker in dict.fromkeys(tickers)
+    ]
+    fetched = _fetch(plans, _get_store())
+    return {plan.ticker: fetched[(plan.ticker, interval)] for plan in plans}
+
+
+def iter_histories(
+    subscriptions: Iterable[Subscription], workers: int | None = None
+) -> Iterator[tuple[Subscription, DataFrame]]:
+    """Batch counterpart of `functions.fetch_history`.
+
+    Every (ticker, interval) is fetched once, see `plan_fetches`, and
+    coarser intervals are resampled from finer bars of the same ticker when
+    possible, see `plan_resampling`. Bars in the local store only download
+    the new ones. With `workers`, `ANALYSIS_FETCH_WORKERS` by default, each
+    ticker is fetched on its own thread, see `fetcher`. Otherwise the others are grouped by
+    (interval, period) and downloaded `ANALYSIS_DOWNLOAD_BATCH_SIZE` tickers
+    at a time.
+
+    (subscription, history) pairs are yielded as soon as the bars arrive,
+    each with a zero-copy slice of its own period, or an empty frame when
+    there is no data. A (ticker, interval) that keeps having no bars is not
+    fetched, nor yielded, until its re-check, see `resilience`.
+    """
+    store = _get_store()
+
+    now = timezone.now()
+    plans = plan_fetches(subscriptions)
+    missing = cached_misses(
+        ((plan.ticker, plan.interval) for plan in plans), now
+    )
+    if missing:
+        logger.info(
+            f"Skipped {len(missing)} fetches without bars until their "
+            "re-check"
+        )
+        plans = [p for p in plans if (p.ticker, p.interval) not in missing]
+
+    resampling = plan_resampling(plans, now)
+    by_key = {(plan.ticker, plan.interval): plan for plan in plans}
+    derived: dict[tuple[str, str], list[FetchPlan]] = defaultdict(list)
+    for key, source in resampling.items():
+        derived[(key[0], source)].append(by_key[key])
+
+    outcomes = {}
+    fallback = []
+    for key, history in _iter_fetch(
+        [p for p in plans if (p.ticker, p.interval) not in resampling],
+        store,
+        workers,
+    ):
+        if history is not None:
+            outcomes[key] = not history.empty
+        yield from _slices(by_key[key], history, now)
+        for plan in derived.pop(key, []):
+            if history is None or history.empty:
+                fallback.append(plan)
+                continue
+            yield from _slices(
+                plan, resample_history(history, plan.interval), now
+            )
+
+    for key, history in _iter_fetch(fallback, store, workers):
+        if history is not None:
+            outcomes[key] = not history.empty
+        yield from _slices(by_key[key], history, now)
+    logger.info(
+        f"Resampled {len(resampling) - len(fallback)} of {len(plans)} fetches"
+    )
+    record_fetches(outcomes, now)
+
+
+def _slices(
+    plan: FetchPlan, history: DataFrame | None, now: datetime
+) -> Iterator[tuple[Subscription, DataFrame]]:
+    if history is None:
+        history = DataFrame()
+    for sub in plan.subscriptions:
+        yield sub, (
+            slice_period(history, sub.period, now)
+            if not history.empty
+            else history
+        )
+
+
+def fetch_histories(
+    subscriptions: Iterable[Subscription],
+) -> dict[Subscription, DataFrame]:
+    """All of `iter_histories` at once."""
+    return dict(iter_histories(subscriptions))
@@ -0,0 +1,176 @@
+"""Offline micro-benchmarks of the analysis functions.
+
+Histories are synthetic and seeded, so runs on different commits measure
+the same data without any Yahoo access.
+"""
+
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+from django.db import transaction
+from matplotlib import pyplot as plt
+from pandas import DataFrame, __version__ as pandas_version
+
+from stocks.analysis.functions import (
+    add_indicators,
+    analyse_stock,
+    calculate_bollinger_bands,
+    get_fig_buffer,
+    rma,
+    rsi,
+)
+from stocks.analysis.kernel import compute_indicators
+from stocks.analysis.providers import synthetic_history
+from stocks.models import Indicator, State, StateIndicator
+
+# Bars Yahoo returns for an interval/period, during regular NYSE sessions
+SCENARIOS = {
+    "1d/6mo": ("1d", 126),
+    "1h/1mo": ("1h", 147),
+    "15m/1mo": ("15m", 546),
+    "1d/5y": ("1d", 1260),
+    "1h/1y": ("1h", 1764),
+    "1m/7d": ("1m", 1950),
+}
+
+
+@dataclass
+class BenchmarkResult:
+    function: str
+    scenario: str
+    bars: int
+    repeat: int
+    best: float
+    median: float
+    peak_memory: int
+
+
+def _render_chart(history: DataFrame) -> None:
+    get_fig_buffer(history, "BENCH")
+    plt.close("all")
+
+
+BENCHMARKS: dict[str, Callable[[DataFrame], object]] = {
+    "rsi": lambda history: rsi(history["Close"]),
+    "rma": lambda history: rma(history["Close"], 14),
+    "calculate_bollinger_bands": lambda history: calculate_bollinger_bands(
+        history["Close"]
+    ),
+    "compute_indicators": lambda history: compute_indicators(
+        history["Close"].to_numpy()
+    ),
+    "add_indicators": lambda history: add_indicators(history.copy()),
+    "get_fig_buffer": _render_chart,
+    "analyse_stock": lambda history: analyse_stock(
+        history["BBands%"].iloc[-1]
+    ),
+}
+
+
+def seed_rules() -> None:
+    """Thresholds like the ones of the test fixtures, unless there are any."""
+    if StateIndicator.objects.exists():
+        return
+    bbands, _ = Indicator.objects.get_or_create(name="BBands%")
+    for name, lower, upper in (
+        ("Strong Buy", -1.0, 0.0),
+        ("Buy", 0.0, 0.2),
+        ("Sell", 0.8, 1.0),
+        ("Strong Sell", 1.0, 2.0),
+    ):
+        StateIndicator.objects.create(
+            state=State.objects.get_or_create(name=name)[0],
+            indicator=bbands,
+            lower_threshold=lower,
+            upper_threshold=upper,
+        )
+
+
+def measure(
+    function: Callable[[DataFrame], object], history: DataFrame, repeat: int
+) -> tuple[list[float], int]:
+    """Timings of `repeat` calls, then the peak memory of one more."""
+    # Warm up caches, lazy imports and numba compilation
+    function(history)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(history)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function(history)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, peak
+
+
+def run_benchmarks(
+    functions: list[str] | None = None,
+    scenarios: list[str] | None = None,
+    repeat: int = 5,
+    seed: int = 0,
+) -> list[BenchmarkResult]:
+    """Benchmark `functions` on the histories of `scenarios`, all by default.
+
+    When there are no state rules, the ones `analyse_stock` needs are
+    created in a transaction that is rolled back afterwards.
+    """
+    results = []
+    with transaction.atomic():
+        seed_rules()
+        for scenario in scenarios or SCENARIOS:
+            interval, bars = SCENARIOS[scenario]
+            history = add_indicators(synthetic_history(interval, bars, seed))
+            for name in functions or BENCHMARKS:
+                timings, peak = measure(BENCHMARKS[name], history, repeat)
+                results.append(
+                    BenchmarkResult(
+                        function=name,
+                        scenario=scenario,
+                        bars=bars,
+                        repeat=repeat,
+                        best=min(timings),
+                        median=statistics.median(timings),
+                        peak_memory=peak,
+                    )
+                )
+        transaction.set_rollback(True)
+    return results
+
+
+def benchmark_report(results: list[BenchmarkResult]) -> dict:
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas_version,
+        "machine": platform.machine(),
+        "results": [asdict(result) for result in results],
+    }
+
+
+def compare(report: dict, baseline: dict) -> list[tuple[str, str, float]]:
+    """Median time of each result relative to the same one in `baseline`."""
+    previous = {
+        (result["function"], result["scenario"]): result["median"]
+        for result in baseline["results"]
+    }
+    return [
+        (
+            result["function"],
+            result["scenario"],
+            result["median"] / previous[key],
+        )
+        for result in report["results"]
+        if (key := (result["function"], result["scenario"])) in previous
+        and previous[key] > 0
+    ]
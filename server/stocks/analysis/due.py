@@ -0,0 +1,81 @@
+"""When each subscription is due for analysis: after its next bar closes.
+
+Intraday bars are cut from the session open of the exchange, daily and
+longer ones close with the last session of their day, week, month or
+quarter. Markets without a known calendar trade around the clock, on bars
+aligned on UTC.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Hashable
+
+from stocks.analysis.exchanges import Exchange, exchange_for
+from stocks.analysis.periods import INTERVAL_DURATIONS
+from stocks.models import Subscription
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Days searched for the close of a quarterly bar
+MAX_BAR_DAYS = 100
+
+# The bar a day belongs to, for the intervals of a day or more
+BAR_OF_DAY: dict[str, Callable[[date], Hashable]] = {
+    "1d": lambda day: day,
+    "5d": lambda day: day.isocalendar()[:2],
+    "1wk": lambda day: day.isocalendar()[:2],
+    "1mo": lambda day: (day.year, day.month),
+    "3mo": lambda day: (day.year, (day.month - 1) // 3),
+}
+
+
+def _utc_bar_close(interval: str, after: datetime) -> datetime:
+    """First close after `after` of a bar of a round-the-clock market."""
+    if interval == "1d" or interval not in BAR_OF_DAY:
+        duration = INTERVAL_DURATIONS[interval]
+        return EPOCH + ((after - EPOCH) // duration + 1) * duration
+    bar = BAR_OF_DAY[interval]
+    day = after.astimezone(timezone.utc).date()
+    while bar(day + timedelta(days=1)) == bar(day):
+        day += timedelta(days=1)
+    return datetime.combine(
+        day + timedelta(days=1), datetime.min.time(), timezone.utc
+    )
+
+
+def bar_close(
+    exchange: Exchange | None, interval: str, after: datetime
+) -> datetime:
+    """First close after `after` of a bar of `interval` on `exchange`."""
+    if exchange is None:
+        return _utc_bar_close(interval, after)
+
+    sessions = exchange.sessions(after, after + timedelta(days=MAX_BAR_DAYS))
+    if interval not in BAR_OF_DAY:
+        duration = INTERVAL_DURATIONS[interval]
+        for open_, close in sessions:
+            if close <= after:
+                continue
+            bars = max((after - open_) // duration + 1, 1)
+            return min(open_ + bars * duration, close)
+    else:
+        bar = BAR_OF_DAY[interval]
+        session = next(sessions, None)
+        if session is None:
+            raise ValueError(f"{exchange.name} has no session after {after}")
+        for following in sessions:
+            if session[1] > after and bar(following[0].date()) != bar(
+                session[0].date()
+            ):
+                return session[1]
+            session = following
+    raise ValueError(f"No {interval} bar of {exchange.name} after {after}")
+
+
+def due_at(sub: Subscription, after: datetime, delay: timedelta) -> datetime:
+    """When `sub`, analysed at `after`, has a new bar to analyse.
+
+    That is `delay` after the close of its next bar, once it is served.
+    """
+    close = bar_close(
+        exchange_for(sub.stock.ticker), sub.interval, after - delay
+    )
+    return close + delay
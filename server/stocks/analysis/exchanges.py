@@ -0,0 +1,289 @@
+"""Trading sessions of the exchanges, by Yahoo ticker suffix.
+
+Holidays and early closes follow each exchange's published rules, so no
+calendar data has to be downloaded. One-off closures (national mourning,
+coronations) are not known. Tickers of unknown or round-the-clock markets
+(crypto, futures, currencies) have no `Exchange` and are never gated.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Callable, Iterator
+from zoneinfo import ZoneInfo
+
+MONDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = 0, 3, 4, 5, 6
+
+
+def easter(year: int) -> date:
+    """Western Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """`n`th `weekday` of the month, counting from the end when negative."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(
+            days=(weekday - first.weekday()) % 7 + 7 * (n - 1)
+        )
+    last = (date(year, month, 28) + timedelta(days=4)).replace(
+        day=1
+    ) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7 - 7 * (n + 1))
+
+
+def observed(day: date) -> date:
+    """US rule: Saturday holidays move to Friday, Sunday ones to Monday."""
+    if day.weekday() == SATURDAY:
+        return day - timedelta(days=1)
+    if day.weekday() == SUNDAY:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache
+def nyse_holidays(year: int) -> frozenset[date]:
+    holidays = {
+        nth_weekday(year, 1, MONDAY, 3),
+        nth_weekday(year, 2, MONDAY, 3),
+        easter(year) - timedelta(days=2),
+        nth_weekday(year, 5, MONDAY, -1),
+        observed(date(year, 7, 4)),
+        nth_weekday(year, 9, MONDAY, 1),
+        nth_weekday(year, 11, THURSDAY, 4),
+        observed(date(year, 12, 25)),
+    }
+    # Not moved to the last trading day of the year before
+    if date(year, 1, 1).weekday() != SATURDAY:
+        holidays.add(observed(date(year, 1, 1)))
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))
+    return frozenset(holidays)
+
+
+@lru_cache
+def nyse_early_closes(year: int) -> dict[date, time]:
+    days = [
+        date(year, 7, 3),
+        nth_weekday(year, 11, THURSDAY, 4) + timedelta(days=1),
+        date(year, 12, 24),
+    ]
+    return {
+        day: time(13)
+        for day in days
+        if day.weekday() < SATURDAY and day not in nyse_holidays(year)
+    }
+
+
+@lru_cache
+def xetra_holidays(year: int) -> frozenset[date]:
+    return frozenset(
+        {
+            date(year, 1, 1),
+            easter(year) - timedelta(days=2),
+            easter(year) + timedelta(days=1),
+            date(year, 5, 1),
+            date(year, 12, 24),
+            date(year, 12, 25),
+            date(year, 12, 26),
+            date(year, 12, 31),
+        }
+    )
+
+
+@lru_cache
+def lse_holidays(year: int) -> frozenset[date]:
+    new_year = date(year, 1, 1)
+    while new_year.weekday() >= SATURDAY:
+        new_year += timedelta(days=1)
+    # Christmas and Boxing Day falling on a weekend are substituted by the
+    # next weekdays not already holidays
+    christmas = []
+    for day in (date(year, 12, 25), date(year, 12, 26)):
+        while day.weekday() >= SATURDAY or day in christmas:
+            day += timedelta(days=1)
+        christmas.append(day)
+    return frozenset(
+        {
+            new_year,
+            easter(year) - timedelta(days=2),
+            easter(year) + timedelta(days=1),
+            nth_weekday(year, 5, MONDAY, 1),
+            nth_weekday(year, 5, MONDAY, -1),
+            nth_weekday(year, 8, MONDAY, -1),
+            *christmas,
+        }
+    )
+
+
+@lru_cache
+def euronext_holidays(year: int) -> frozenset[date]:
+    return frozenset(
+        {
+            date(year, 1, 1),
+            easter(year) - timedelta(days=2),
+            easter(year) + timedelta(days=1),
+            date(year, 5, 1),
+            date(year, 12, 25),
+            date(year, 12, 26),
+        }
+    )
+
+
+@lru_cache
+def six_holidays(year: int) -> frozenset[date]:
+    return frozenset(
+        {
+            date(year, 1, 1),
+            date(year, 1, 2),
+            easter(year) - timedelta(days=2),
+            easter(year) + timedelta(days=1),
+            easter(year) + timedelta(days=39),
+            easter(year) + timedelta(days=50),
+            date(year, 5, 1),
+            date(year, 8, 1),
+            date(year, 12, 24),
+            date(year, 12, 25),
+            date(year, 12, 26),
+            date(year, 12, 31),
+        }
+    )
+
+
+def _closes_on_eves(close: time) -> Callable[[int], dict[date, time]]:
+    """Early closes on the Christmas and New Year's Eves that are traded."""
+
+    def early_closes(year: int) -> dict[date, time]:
+        return {
+            day: close
+            for day in (date(year, 12, 24), date(year, 12, 31))
+            if day.weekday() < SATURDAY
+        }
+
+    return early_closes
+
+
+def _no_early_closes(year: int) -> dict[date, time]:
+    return {}
+
+
+@dataclass(frozen=True)
+class Exchange:
+    name: str
+    tz: ZoneInfo
+    open: time
+    close: time
+    holidays: Callable[[int], frozenset[date]] = field(repr=False)
+    early_closes: Callable[[int], dict[date, time]] = field(
+        default=_no_early_closes, repr=False
+    )
+
+    def session(self, day: date) -> tuple[datetime, datetime] | None:
+        """Open and close of `day` in the exchange's time zone, if traded."""
+        if day.weekday() >= SATURDAY or day in self.holidays(day.year):
+            return None
+        close = self.early_closes(day.year).get(day, self.close)
+        return (
+            datetime.combine(day, self.open, self.tz),
+            datetime.combine(day, close, self.tz),
+        )
+
+    def sessions(
+        self, start: datetime, end: datetime
+    ) -> Iterator[tuple[datetime, datetime]]:
+        """Sessions of the days from `start` to `end`."""
+        day = start.astimezone(self.tz).date()
+        last = end.astimezone(self.tz).date()
+        while day <= last:
+            session = self.session(day)
+            if session:
+                yield session
+            day += timedelta(days=1)
+
+    def is_open(self, at: datetime) -> bool:
+        return any(
+            open_ <= at < close for open_, close in self.sessions(at, at)
+        )
+
+    def traded_between(self, start: datetime, end: datetime) -> bool:
+        """Whether a session overlaps `start` to `end`."""
+        return any(
+            open_ < end and close > start
+            for open_, close in self.sessions(start, end)
+        )
+
+
+NYSE = Exchange(
+    "NYSE",
+    ZoneInfo("America/New_York"),
+    time(9, 30),
+    time(16),
+    nyse_holidays,
+    nyse_early_closes,
+)
+XETRA = Exchange(
+    "XETRA", ZoneInfo("Europe/Berlin"), time(9), time(17, 30), xetra_holidays
+)
+# Börse Frankfurt trades into the evening, on the days of XETRA
+FRANKFURT = Exchange(
+    "Frankfurt",
+    ZoneInfo("Europe/Berlin"),
+    time(8),
+    time(22),
+    xetra_holidays,
+)
+LSE = Exchange(
+    "LSE",
+    ZoneInfo("Europe/London"),
+    time(8),
+    time(16, 30),
+    lse_holidays,
+    _closes_on_eves(time(12, 30)),
+)
+EURONEXT = Exchange(
+    "Euronext",
+    ZoneInfo("Europe/Paris"),
+    time(9),
+    time(17, 30),
+    euronext_holidays,
+    _closes_on_eves(time(14, 5)),
+)
+SIX = Exchange(
+    "SIX", ZoneInfo("Europe/Zurich"), time(9), time(17, 30), six_holidays
+)
+
+SUFFIXES = {
+    "": NYSE,
+    "DE": XETRA,
+    "F": FRANKFURT,
+    "L": LSE,
+    "PA": EURONEXT,
+    "AS": EURONEXT,
+    "BR": EURONEXT,
+    "LS": EURONEXT,
+    "SW": SIX,
+}
+# Quote currencies of Yahoo's round-the-clock crypto pairs, e.g. BTC-USD;
+# other dashes are share classes, e.g. BRK-B
+CRYPTO_QUOTES = {"USD", "EUR", "GBP", "USDT", "BTC", "ETH"}
+
+
+def exchange_for(ticker: str) -> Exchange | None:
+    """Exchange of a Yahoo ticker, None when it is not known to close."""
+    if ticker.startswith("^") or "=" in ticker:
+        return None
+    if "-" in ticker and ticker.rsplit("-", 1)[1] in CRYPTO_QUOTES:
+        return None
+    suffix = ticker.rsplit(".", 1)[1] if "." in ticker else ""
+    return SUFFIXES.get(suffix)
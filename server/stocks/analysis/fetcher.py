@@ -0,0 +1,275 @@
+"""Concurrent market data requests that stay below Yahoo's throttling.
+
+Downloads run on a bounded thread pool and are yielded as they complete,
+so the caller can compute indicators on the main thread meanwhile. Every
+request goes through one process-wide `AdaptiveLimiter`, whose concurrency
+follows the responses the providers report with `record_response`.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Callable, Hashable, Iterator, Mapping, TypeVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+# Weight of the latest response in the moving average of the latency
+LATENCY_SMOOTHING = 0.2
+
+
+class FetchTimeout(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket of `rate` requests per second plus a concurrency cap.
+
+    The bucket holds up to `burst` tokens, one second of requests by
+    default. A `rate` of 0 only caps the concurrency. Used as a context
+    manager around one request.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        max_concurrent: int,
+        burst: float | None = None,
+    ) -> None:
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.limit = max_concurrent
+        self.active = 0
+        self._lock = threading.Lock()
+        self._slots = threading.Condition()
+
+    def _take_token(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def acquire(self) -> None:
+        with self._slots:
+            self._slots.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        if self.rate:
+            try:
+                self._take_token()
+            except BaseException:
+                self.release()
+                raise
+
+    def release(self) -> None:
+        with self._slots:
+            self.active -= 1
+            self._slots.notify()
+
+    def __enter__(self) -> "RateLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    # HTTP 429
+    throttled: int = 0
+    # HTTP 5xx
+    server_errors: int = 0
+    # No response at all
+    failures: int = 0
+    # Moving average of the latency and its lowest value, in seconds
+    latency: float | None = None
+    baseline: float | None = None
+    last_status: int | None = None
+
+
+class AdaptiveLimiter(RateLimiter):
+    """`RateLimiter` whose concurrency limit follows AIMD.
+
+    Starting from `min_concurrent`, every healthy response adds 1/limit to
+    the limit, so it grows by about one per round of requests up to
+    `max_concurrent`. A 429, a 5xx, a failure or a host latency above
+    `latency_tolerance` times its lowest one halves it, at most once per
+    round trip of that host.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        max_concurrent: int,
+        min_concurrent: int = 1,
+        latency_tolerance: float = 3.0,
+        backoff: float = 0.5,
+    ) -> None:
+        super().__init__(rate, min_concurrent)
+        self.min_limit = min_concurrent
+        self.max_limit = max(max_concurrent, min_concurrent)
+        self.window = float(min_concurrent)
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.decreases = 0
+        self.hosts: dict[str, HostStats] = {}
+        self._decreased_at = -float("inf")
+
+    def record(self, host: str, status: int | None, seconds: float) -> None:
+        """Count one response of `host` and adjust the limit to it.
+
+        `status` is None when the request failed without a response.
+        """
+        with self._lock:
+            stats = self.hosts.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.last_status = status
+            congested = True
+            if status is None:
+                stats.failures += 1
+            elif status == 429:
+                stats.throttled += 1
+            elif status >= 500:
+                stats.server_errors += 1
+            else:
+                latency = (
+                    seconds
+                    if stats.latency is None
+                    else LATENCY_SMOOTHING * seconds
+                    + (1 - LATENCY_SMOOTHING) * stats.latency
+                )
+                baseline = min(stats.baseline or latency, latency)
+                stats.latency, stats.baseline = latency, baseline
+                congested = latency > self.latency_tolerance * baseline
+
+            now = time.monotonic()
+            if not congested:
+                self.window = min(
+                    self.max_limit, self.window + 1 / self.window
+                )
+            elif now - self._decreased_at >= (stats.latency or 0):
+                self.window = max(self.min_limit, self.window * self.backoff)
+                self._decreased_at = now
+                self.decreases += 1
+                logger.warning(
+                    f"{host} is congested ({status}, {seconds:.2f}s), "
+                    f"fetching {int(self.window)} at a time"
+                )
+
+        with self._slots:
+            self.limit = int(self.window)
+            self._slots.notify_all()
+
+    def snapshot(self) -> dict:
+        """The limit and the statistics of every host, for monitoring."""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "active": self.active,
+                "rate": self.rate,
+                "decreases": self.decreases,
+                "hosts": {
+                    host: asdict(stats) for host, stats in self.hosts.items()
+                },
+            }
+
+
+_limiter: dict[tuple, AdaptiveLimiter] = {}
+
+
+def get_limiter() -> AdaptiveLimiter:
+    """The limiter of the `MARKET_DATA_*` settings, kept between calls."""
+    key = (
+        settings.MARKET_DATA_RATE_LIMIT,
+        settings.MARKET_DATA_MAX_CONCURRENCY,
+        settings.MARKET_DATA_MIN_CONCURRENCY,
+        settings.MARKET_DATA_LATENCY_TOLERANCE,
+    )
+    if key not in _limiter:
+        _limiter.clear()
+        _limiter[key] = AdaptiveLimiter(*key)
+    return _limiter[key]
+
+
+def record_response(host: str, status: int | None, seconds: float) -> None:
+    get_limiter().record(host, status, seconds)
+
+
+def fetch_concurrently(
+    tasks: Mapping[K, Callable[[], T]],
+    workers: int,
+    timeout: float | None = None,
+    limiter: RateLimiter | None = None,
+) -> Iterator[tuple[K, T | BaseException]]:
+    """Run `tasks` on `workers` threads, yielding (key, result) as they end.
+
+    A task that raises yields its exception instead of a result, and one
+    that has been running for longer than `timeout` seconds yields a
+    `FetchTimeout` and is abandoned. Its thread can not be stopped and
+    finishes in the background, still holding its slot of `limiter`.
+    """
+    limiter = limiter or get_limiter()
+    started: dict[K, float] = {}
+
+    def run(key: K, task: Callable[[], T]) -> T:
+        with limiter:
+            started[key] = time.monotonic()
+            return task()
+
+    executor = ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="fetch"
+    )
+    try:
+        pending = {
+            executor.submit(run, key, task): key for key, task in tasks.items()
+        }
+        while pending:
+            deadlines = [
+                started[key] + timeout
+                for key in pending.values()
+                if timeout and key in started
+            ]
+            poll = (
+                max(min(deadlines) - time.monotonic(), 0)
+                if deadlines
+                else timeout
+            )
+            done, _ = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                error = future.exception()
+                yield key, error if error else future.result()
+
+            now = time.monotonic()
+            for future, key in list(pending.items()):
+                if (
+                    timeout
+                    and key in started
+                    and now - started[key] >= timeout
+                ):
+                    del pending[future]
+                    yield key, FetchTimeout(
+                        f"{key} took longer than {timeout}s"
+                    )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
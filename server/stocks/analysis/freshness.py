@@ -0,0 +1,91 @@
+"""Skip the subscriptions whose bars can not have changed since last run.
+
+Subscriptions whose exchange had no session since their last analysis,
+minus `ANALYSIS_BAR_DELAY` for the bars that were not served yet, are
+skipped without any request. For the others, the last trade of every ticker is asked in one quote request per batch of
+tickers, which is much cheaper than their bars. Without a trade since the
+one known when a subscription was last analysed, its bars, and so its
+state, are the same.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Mapping
+
+from django.conf import settings
+from pandas import DataFrame, Timestamp
+
+from stocks.analysis.exchanges import exchange_for
+from stocks.analysis.fetcher import get_limiter
+from stocks.analysis.providers import get_provider
+from stocks.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+def last_trades(tickers: Iterable[str]) -> dict[str, Timestamp]:
+    """Last trade of each ticker, without the ones it is unknown for."""
+    tickers = sorted(set(tickers))
+    trades = {}
+    batch_size = settings.ANALYSIS_DOWNLOAD_BATCH_SIZE
+    for i in range(0, len(tickers), batch_size):
+        batch = tickers[i : i + batch_size]
+        try:
+            with get_limiter():
+                trades.update(get_provider().last_trades(batch))
+        except Exception as e:
+            logger.warning(f"Failed to get the last trades of {batch}: {e}")
+    return trades
+
+
+def market_traded(sub: Subscription, now: datetime) -> bool:
+    """Whether the exchange of `sub` may have new bars since its analysis."""
+    exchange = exchange_for(sub.stock.ticker)
+    if exchange is None or sub.analysed_at is None:
+        return True
+    delay = timedelta(minutes=settings.ANALYSIS_BAR_DELAY)
+    return exchange.traded_between(sub.analysed_at - delay, now)
+
+
+def split_due(
+    subscriptions: Iterable[Subscription], now: datetime
+) -> tuple[list[Subscription], list[Subscription], dict[str, Timestamp]]:
+    """(due, skipped) subscriptions, and the last trades they were split by.
+
+    A subscription is skipped when its exchange was closed since it was
+    analysed, or when its ticker did not trade since the last trade known
+    then. When in doubt, it is due.
+    """
+    skipped: list[Subscription] = []
+    traded: list[Subscription] = []
+    for sub in subscriptions:
+        (traded if market_traded(sub, now) else skipped).append(sub)
+    if skipped:
+        logger.info(f"{len(skipped)} subscriptions have their market closed")
+    trades = last_trades(sub.stock.ticker for sub in traded)
+
+    due = []
+    for sub in traded:
+        trade = trades.get(sub.stock.ticker)
+        if sub.last_trade_at and trade and trade <= sub.last_trade_at:
+            skipped.append(sub)
+        else:
+            due.append(sub)
+    return due, skipped, trades
+
+
+def mark_analysed(
+    histories: Mapping[Subscription, DataFrame],
+    trades: Mapping[str, Timestamp],
+    now: datetime,
+) -> None:
+    """Record when each subscription was analysed `now`, with which last bar
+    and trade."""
+    for sub, history in histories.items():
+        sub.analysed_at = now
+        sub.last_bar_at = history.index[-1].to_pydatetime()
+        trade = trades.get(sub.stock.ticker)
+        sub.last_trade_at = trade.to_pydatetime() if trade else None
+    Subscription.objects.bulk_update(
+        list(histories), ["analysed_at", "last_bar_at", "last_trade_at"]
+    )
@@ -1,11 +1,14 @@
 import io
 
 import mplfinance as mpf
-import yfinance as yf
-from django.db.models import Q
+from django.conf import settings
 from pandas import DataFrame
+from stocks.analysis.fetcher import get_limiter
+from stocks.analysis.kernel import INDICATOR_COLUMNS, compute_indicators
+from stocks.analysis.providers import get_provider
+from stocks.analysis.rules import StateRuleIndex, get_rule_index
+from stocks.analysis.store import HistoryStore
 from stocks.models import State, Subscription
-from technical_analysis import moving_average
 
 
 def calculate_bollinger_bands(close, window_size=20, num_of_std=2):
@@ -91,36 +94,55 @@ def get_fig_buffer(history: DataFrame, symbol: str) -> io.BytesIO:
     return buffer
 
 
-def get_stock_history(subscription: Subscription) -> DataFrame:
-    ticker = yf.Ticker(subscription.stock.ticker)
-    history = ticker.history(
-        period=subscription.period,
-        interval=subscription.interval,
-    )
-
-    history["RSI"] = rsi(history["Close"], 14)
-    history["RSI_SMA14"] = moving_average.sma(history["RSI"], 14)
-    (
-        history["BB_lower"],
-        history["SMA20"],
-        history["BB_upper"],
-    ) = calculate_bollinger_bands(history["Close"])
-    history["BBands%"] = (history["Close"] - history["BB_lower"]) / (
-        history["BB_upper"] - history["BB_lower"]
-    )
-    return history
+def fetch_history(subscription: Subscription) -> DataFrame:
+    with get_limiter():
+        if settings.STOCKS_HISTORY_DIR:
+            return HistoryStore(settings.STOCKS_HISTORY_DIR).get_history(
+                subscription.stock.ticker,
+                subscription.interval,
+                subscription.period,
+            )
+
+        return get_provider().history(
+            subscription.stock.ticker,
+            period=subscription.period,
+            interval=subscription.interval,
+            timeout=settings.MARKET_DATA_TIMEOUT,
+        )
 
 
-def analyse_stock(current_bb_percent: float) -> State:
-    states_with_either_condition = State.objects.filter(
-        Q(
-            stateindicator__indicator__name="BBands%",
-            stateindicator__lower_threshold__lte=current_bb_percent,
-            stateindicator__upper_threshold__gt=current_bb_percent,
-        )
-    )
+def add_indicators(history: DataFrame) -> DataFrame:
+    block = compute_indicators(history["Close"].to_numpy())
+    history[INDICATOR_COLUMNS] = block
+    return history
 
-    if states_with_either_condition.count() == 0:
-        return State.objects.get(name="Hold")
 
-    return states_with_either_condition.first()  # type: ignore
+def get_stock_history(subscription: Subscription) -> DataFrame:
+    return add_indicators(fetch_history(subscription))
+
+
+def analyse_stock(
+    current_bb_percent: float, rules: StateRuleIndex | None = None
+) -> State:
+    """State whose BBands% thresholds hold `current_bb_percent`, else Hold.
+
+    Pass the `rules` of `get_rule_index()` when analysing several stocks so
+    that their version is only checked once.
+    """
+    if rules is None:
+        rules = get_rule_index()
+    return rules.classify(current_bb_percent)
+
+
+def analyse_stocks(
+    latest: DataFrame, rules: StateRuleIndex | None = None
+) -> list[State]:
+    """States of several stocks, from their latest indicator values.
+
+    `latest` has one row per stock and one column per indicator. Unlike
+    `analyse_stock`, every indicator of a state has to be within its
+    thresholds.
+    """
+    if rules is None:
+        rules = get_rule_index()
+    return rules.classify_many(latest)
@@ -0,0 +1,263 @@
+import math
+from collections import deque
+from datetime import datetime
+from typing import Any, cast
+
+from pandas import DataFrame, DatetimeIndex, Timestamp
+
+from stocks.models import IndicatorSnapshot, Subscription
+
+RSI_PERIOD = 14
+RSI_SMA_PERIOD = 14
+BB_WINDOW = 20
+BB_NUM_OF_STD = 2
+
+# Relative difference between the stored and the refetched close of the last
+# committed bar above which the history is treated as re-adjusted
+# (dividends, splits) and the state is rebuilt from scratch.
+CLOSE_REL_TOLERANCE = 1e-9
+
+
+class RunningMovingAverage:
+    """O(1) counterpart of `rma()`, i.e. `ewm(alpha=1/period, adjust=False)`."""
+
+    def __init__(self, period: int, value: float | None = None) -> None:
+        self.alpha = 1 / period
+        self.value = value
+
+    def push(self, x: float) -> float:
+        if math.isnan(x):
+            return math.nan if self.value is None else self.value
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.value
+
+
+class RollingWindow:
+    """O(1) counterpart of `rolling(window=size).mean()/.std()`.
+
+    Keeps the window values plus running sums. NaN values are kept in the
+    window but not in the sums, so that like pandas any window containing a
+    NaN yields NaN. The sums are recomputed from the window once per full
+    cycle so floating point drift can not accumulate.
+    """
+
+    def __init__(self, size: int, values: list[float] | None = None) -> None:
+        self.size = size
+        self.values: deque[float] = deque(maxlen=size)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nan_count = 0
+        self._pushes = 0
+        for value in values or []:
+            self.push(value)
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.size:
+            old = self.values[0]
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self.total -= old
+                self.total_sq -= old * old
+        self.values.append(value)
+        if math.isnan(value):
+            self.nan_count += 1
+        else:
+            self.total += value
+            self.total_sq += value * value
+
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._resync()
+
+    def _resync(self) -> None:
+        valid = [v for v in self.values if not math.isnan(v)]
+        self.total = math.fsum(valid)
+        self.total_sq = math.fsum(v * v for v in valid)
+        self._pushes = 0
+
+    @property
+    def is_valid(self) -> bool:
+        return len(self.values) == self.size and self.nan_count == 0
+
+    def mean(self) -> float:
+        if not self.is_valid:
+            return math.nan
+        return self.total / self.size
+
+    def std(self) -> float:
+        """Sample standard deviation (ddof=1), as pandas computes it."""
+        if not self.is_valid:
+            return math.nan
+        variance = (self.total_sq - self.total * self.total / self.size) / (
+            self.size - 1
+        )
+        return math.sqrt(max(variance, 0.0))
+
+
+class IndicatorEngine:
+    """Carries the RSI/RSI_SMA14/Bollinger state from one bar to the next.
+
+    Feeding the closes of a history one by one through `update()` yields the
+    same values as the vectorized functions in `stocks.analysis.functions`,
+    but every new bar only costs O(1).
+    """
+
+    def __init__(self) -> None:
+        self.last_bar_at: datetime | None = None
+        self.last_close: float | None = None
+        self.gains = RunningMovingAverage(RSI_PERIOD)
+        self.losses = RunningMovingAverage(RSI_PERIOD)
+        self.rsi_window = RollingWindow(RSI_SMA_PERIOD)
+        self.close_window = RollingWindow(BB_WINDOW)
+
+    def update(
+        self, close: float, bar_at: datetime | None = None
+    ) -> dict[str, float]:
+        if self.last_close is None:
+            gain = loss = math.nan
+        else:
+            delta = close - self.last_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        avg_gain = self.gains.push(gain)
+        avg_loss = self.losses.push(loss)
+        current_rsi = self._rsi(avg_gain, avg_loss)
+
+        self.rsi_window.push(current_rsi)
+        self.close_window.push(close)
+        self.last_close = close
+        self.last_bar_at = bar_at
+
+        sma = self.close_window.mean()
+        std_dev = self.close_window.std()
+        upper = sma + std_dev * BB_NUM_OF_STD
+        lower = sma - std_dev * BB_NUM_OF_STD
+        width = upper - lower
+        bb_percent = (close - lower) / width if width else math.nan
+
+        return {
+            "Close": close,
+            "RSI": current_rsi,
+            "RSI_SMA14": self.rsi_window.mean(),
+            "BB_lower": lower,
+            "SMA20": sma,
+            "BB_upper": upper,
+            "BBands%": bb_percent,
+        }
+
+    @staticmethod
+    def _rsi(avg_gain: float, avg_loss: float) -> float:
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            return math.nan
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else math.nan
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "last_close": self.last_close,
+            "avg_gain": self.gains.value,
+            "avg_loss": self.losses.value,
+            "rsi_window": [_encode(v) for v in self.rsi_window.values],
+            "close_window": [_encode(v) for v in self.close_window.values],
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, Any], last_bar_at: datetime | None = None
+    ) -> "IndicatorEngine":
+        engine = cls()
+        engine.last_bar_at = last_bar_at
+        engine.last_close = data["last_close"]
+        engine.gains.value = data["avg_gain"]
+        engine.losses.value = data["avg_loss"]
+        engine.rsi_window = RollingWindow(
+            RSI_SMA_PERIOD, [_decode(v) for v in data["rsi_window"]]
+        )
+        engine.close_window = RollingWindow(
+            BB_WINDOW, [_decode(v) for v in data["close_window"]]
+        )
+        return engine
+
+    def copy(self) -> "IndicatorEngine":
+        return IndicatorEngine.from_dict(self.to_dict(), self.last_bar_at)
+
+
+def _encode(value: float) -> float | None:
+    # JSON has no NaN
+    return None if math.isnan(value) else value
+
+
+def _decode(value: float | None) -> float:
+    return math.nan if value is None else value
+
+
+def _as_index_timestamp(value: datetime, history: DataFrame) -> Timestamp:
+    timestamp = Timestamp(value)
+    index = cast(DatetimeIndex, history.index)
+    if index.tz is None and timestamp.tz is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp
+
+
+def _is_usable(engine: IndicatorEngine, history: DataFrame) -> bool:
+    """Whether `history` continues the bars the engine was fed with."""
+    if engine.last_bar_at is None or engine.last_close is None:
+        return False
+    last_bar_at = _as_index_timestamp(engine.last_bar_at, history)
+    if last_bar_at not in history.index:
+        return False
+    close = float(history["Close"].loc[last_bar_at])
+    return math.isclose(close, engine.last_close, rel_tol=CLOSE_REL_TOLERANCE)
+
+
+def latest_indicators(
+    subscription: Subscription, history: DataFrame
+) -> dict[str, float]:
+    """Return the indicator values of the last bar of `history`.
+
+    The state is committed up to the second to last bar only, since the last
+    bar may still be forming and will be refetched with its final close on
+    the next run.
+    """
+    snapshot = IndicatorSnapshot.objects.filter(
+        subscription=subscription
+    ).first()
+
+    engine = None
+    if snapshot:
+        engine = IndicatorEngine.from_dict(
+            snapshot.state, snapshot.last_bar_at
+        )
+        if not _is_usable(engine, history):
+            engine = None
+
+    if engine is None or engine.last_bar_at is None:
+        engine = IndicatorEngine()
+        new_bars = history["Close"]
+    else:
+        last_bar_at = _as_index_timestamp(engine.last_bar_at, history)
+        new_bars = history["Close"].loc[history.index > last_bar_at]
+
+    if new_bars.empty:
+        engine = IndicatorEngine()
+        new_bars = history["Close"]
+
+    for bar_at, close in new_bars.iloc[:-1].items():
+        engine.update(float(close), cast(Timestamp, bar_at).to_pydatetime())
+
+    if engine.last_bar_at is not None:
+        IndicatorSnapshot.objects.update_or_create(
+            subscription=subscription,
+            defaults={
+                "last_bar_at": engine.last_bar_at,
+                "state": engine.to_dict(),
+            },
+        )
+
+    return engine.copy().update(
+        float(new_bars.iloc[-1]), new_bars.index[-1].to_pydatetime()
+    )
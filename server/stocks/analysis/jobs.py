@@ -0,0 +1,288 @@
+"""Analysis runs queued in the `AnalysisJob` table and run by workers.
+
+The API only queues a job, at most one waiting at a time. The worker
+processes (`manage.py analysis_worker`) all work on the oldest unfinished
+job: each leases `ANALYSIS_LEASE_SIZE` subscriptions at a time with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so no two workers analyse the same
+one, and adds what it did to the job. A lease is renewed while its
+subscriptions are analysed and taken over by another worker once it
+expired, so the subscriptions of a crashed worker are not lost.
+"""
+
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from stocks.analysis.fetcher import get_limiter
+from stocks.analysis.pipeline import Progress, run_analysis
+from stocks.models import AnalysisJob, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Least seconds between two saves of the stage of a job
+PROGRESS_SAVE_INTERVAL = 1.0
+# Part of `ANALYSIS_LEASE_SECONDS` after which a lease is renewed
+LEASE_RENEWAL = 0.25
+
+
+def _lease_end() -> datetime:
+    return timezone.now() + timedelta(seconds=settings.ANALYSIS_LEASE_SECONDS)
+
+
+class JobProgress(Progress):
+    """`Progress` of the subscriptions leased by a worker for a job.
+
+    The stage is saved on the job at most every `PROGRESS_SAVE_INTERVAL`
+    seconds within a stage, and the lease renewed on the way. The end of
+    the lease identifies it, a lease taken over is left alone.
+    """
+
+    def __init__(
+        self, job: AnalysisJob, leased: list[int], until: datetime
+    ) -> None:
+        super().__init__()
+        self.job = job
+        self.leased = leased
+        self.until = until
+        self._saved = -float("inf")
+        self._renewed = time.monotonic()
+
+    def changed(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._saved < PROGRESS_SAVE_INTERVAL:
+            return
+        self._saved = now
+        AnalysisJob.objects.filter(pk=self.job.pk).update(
+            stage=self.current, updated_at=timezone.now()
+        )
+        if (
+            now - self._renewed
+            >= LEASE_RENEWAL * settings.ANALYSIS_LEASE_SECONDS
+        ):
+            self._renewed = now
+            until = _lease_end()
+            Subscription.objects.filter(
+                pk__in=self.leased, leased_until=self.until
+            ).update(leased_until=until)
+            self.until = until
+
+
+def enqueue_analysis(
+    subscriptions: list[int] | None = None,
+) -> tuple[AnalysisJob, bool]:
+    """The queued job, or a new one, and whether it was created.
+
+    `subscriptions` are the ids to analyse, all when None, and are added to
+    the ones of the queued job. A run that takes longer than the trigger
+    interval leaves one job waiting instead of piling them up.
+    """
+    with transaction.atomic():
+        job = (
+            AnalysisJob.objects.select_for_update()
+            .filter(status=AnalysisJob.Status.QUEUED)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return (
+                AnalysisJob.objects.create(subscriptions=subscriptions),
+                True,
+            )
+        if job.subscriptions is not None:
+            job.subscriptions = (
+                None
+                if subscriptions is None
+                else sorted(set(job.subscriptions) | set(subscriptions))
+            )
+            job.save(update_fields=["subscriptions", "updated_at"])
+    return job, False
+
+
+def fail_lost_jobs() -> int:
+    """Fail the running jobs without progress for `ANALYSIS_JOB_TIMEOUT`
+    seconds, all their workers are gone."""
+    lost = AnalysisJob.objects.filter(
+        status=AnalysisJob.Status.RUNNING,
+        updated_at__lt=timezone.now()
+        - timedelta(seconds=settings.ANALYSIS_JOB_TIMEOUT),
+    ).update(
+        status=AnalysisJob.Status.FAILED,
+        error="Worker lost",
+        finished_at=timezone.now(),
+    )
+    if lost:
+        logger.warning(f"Failed {lost} analysis jobs of lost workers")
+    return lost
+
+
+def start_job(job: AnalysisJob, worker: str) -> None:
+    """Mark `job` as run, by `worker` if it was still queued."""
+    now = timezone.now()
+    AnalysisJob.objects.filter(
+        pk=job.pk, status=AnalysisJob.Status.QUEUED
+    ).update(
+        status=AnalysisJob.Status.RUNNING,
+        worker=worker,
+        started_at=now,
+        updated_at=now,
+    )
+    job.refresh_from_db()
+
+
+def active_job(worker: str) -> AnalysisJob | None:
+    """The oldest unfinished job, started by `worker` if it was queued."""
+    job = (
+        AnalysisJob.objects.filter(
+            status__in=[AnalysisJob.Status.QUEUED, AnalysisJob.Status.RUNNING]
+        )
+        .order_by("created_at")
+        .first()
+    )
+    if job and job.status == AnalysisJob.Status.QUEUED:
+        start_job(job, worker)
+    return job
+
+
+def lease_subscriptions(
+    job: AnalysisJob, size: int
+) -> tuple[list[int], datetime]:
+    """Lease up to `size` subscriptions of `job` not analysed for it yet,
+    and the end of the lease.
+
+    Subscriptions under an expired lease of the job are taken over.
+    """
+    now = timezone.now()
+    until = _lease_end()
+    subscriptions = Subscription.objects.all()
+    if job.subscriptions is not None:
+        subscriptions = subscriptions.filter(pk__in=job.subscriptions)
+    with transaction.atomic():
+        leased = list(
+            subscriptions.select_for_update(skip_locked=True)
+            .filter(~Q(analysis_job=job) | Q(leased_until__lt=now))
+            .order_by("pk")
+            .values_list("pk", flat=True)[:size]
+        )
+        Subscription.objects.filter(pk__in=leased).update(
+            analysis_job=job, leased_until=until
+        )
+    return leased, until
+
+
+def _add(totals: dict, counts: dict) -> dict:
+    return {
+        key: totals.get(key, 0) + counts.get(key, 0)
+        for key in totals.keys() | counts.keys()
+    }
+
+
+def analyse_leased(
+    job: AnalysisJob, leased: list[int], until: datetime
+) -> None:
+    """Analyse the `leased` subscriptions and add the outcome to `job`."""
+    progress = JobProgress(job, leased, until)
+    result, error = {}, ""
+    try:
+        result = run_analysis(
+            Subscription.objects.select_related("stock", "state").filter(
+                pk__in=leased
+            ),
+            progress,
+        )
+    except Exception as e:
+        logger.exception(f"Analysis job {job.pk} failed")
+        error = f"{type(e).__name__}: {e}"
+
+    with transaction.atomic():
+        # Other workers add theirs concurrently
+        locked = AnalysisJob.objects.select_for_update().get(pk=job.pk)
+        locked.progress = _add(locked.progress, progress.counts)
+        locked.timings = {
+            stage: round(seconds, 3)
+            for stage, seconds in _add(
+                locked.timings, progress.timings
+            ).items()
+        }
+        locked.result = _add(locked.result or {}, result)
+        locked.error = error or locked.error
+        # The limiter lives in the worker, the API can only read it here
+        locked.fetch_stats = {
+            **locked.fetch_stats,
+            worker_name(): get_limiter().snapshot(),
+        }
+        locked.save()
+        Subscription.objects.filter(
+            pk__in=leased, leased_until=progress.until
+        ).update(leased_until=None)
+
+
+def finish_job(job: AnalysisJob) -> bool:
+    """Mark `job` done unless subscriptions are still leased for it.
+
+    Returns whether this call finished it.
+    """
+    if Subscription.objects.filter(
+        analysis_job=job, leased_until__isnull=False
+    ).exists():
+        return False
+    now = timezone.now()
+    finished = AnalysisJob.objects.filter(
+        pk=job.pk, status=AnalysisJob.Status.RUNNING
+    ).update(
+        status=Case(
+            When(error="", then=Value(AnalysisJob.Status.SUCCEEDED)),
+            default=Value(AnalysisJob.Status.FAILED),
+        ),
+        finished_at=now,
+        updated_at=now,
+    )
+    if finished:
+        job.refresh_from_db()
+        logger.info(f"Analysis job {job.pk} {job.status}: {job.timings}")
+    return bool(finished)
+
+
+def execute_job(job: AnalysisJob) -> bool:
+    """Analyse leased subscriptions of `job` until none are left.
+
+    Returns whether this worker finished the job, false while others are
+    still on their leases.
+    """
+    while True:
+        leased, until = lease_subscriptions(job, settings.ANALYSIS_LEASE_SIZE)
+        if not leased:
+            return finish_job(job)
+        logger.info(f"Analysing {len(leased)} subscriptions for job {job.pk}")
+        analyse_leased(job, leased, until)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(poll: float, once: bool = False) -> int:
+    """Work on the unfinished jobs as they come, polling every `poll`
+    seconds.
+
+    With `once`, returns when no job is left. Returns the number of jobs
+    finished by this worker.
+    """
+    name = worker_name()
+    finished = 0
+    while True:
+        close_old_connections()
+        fail_lost_jobs()
+        job = active_job(name)
+        if job is None and once:
+            return finished
+        if job and execute_job(job):
+            finished += 1
+        else:
+            time.sleep(poll)
@@ -0,0 +1,196 @@
+"""Fused indicator kernel writing every column into one preallocated block.
+
+`fused_kernel` reads the Close array once and keeps the RMAs and the rolling
+windows in ring buffers. It is compiled with numba when it is installed;
+otherwise `numpy_kernel` computes the same block with NumPy operations.
+"""
+
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from stocks.analysis.incremental import (
+    BB_NUM_OF_STD,
+    BB_WINDOW,
+    RSI_PERIOD,
+    RSI_SMA_PERIOD,
+)
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is optional
+    njit = None
+
+INDICATOR_COLUMNS = [
+    "RSI",
+    "RSI_SMA14",
+    "SMA20",
+    "BB_upper",
+    "BB_lower",
+    "BBands%",
+]
+RSI, RSI_SMA14, SMA20, BB_UPPER, BB_LOWER, BB_PERCENT = range(
+    len(INDICATOR_COLUMNS)
+)
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0.0:
+        return 100.0 if avg_gain > 0.0 else math.nan
+    return 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+
+
+def fused_kernel(close: np.ndarray, out: np.ndarray) -> None:
+    bars = close.shape[0]
+    alpha = 1.0 / RSI_PERIOD
+
+    avg_gain = math.nan
+    avg_loss = math.nan
+    rsi_ring = np.empty(RSI_SMA_PERIOD)
+    rsi_sum = 0.0
+    rsi_nans = 0
+
+    # The close window sums are kept relative to the first close, which
+    # avoids the cancellation of sum-of-squares on large prices
+    close_ring = np.empty(BB_WINDOW)
+    shift = close[0] if bars else 0.0
+    close_sum = 0.0
+    close_sum_sq = 0.0
+    close_nans = 0
+
+    for i in range(bars):
+        current = close[i]
+
+        # RSI
+        if i > 0:
+            delta = current - close[i - 1]
+            if not math.isnan(delta):
+                gain = delta if delta > 0.0 else 0.0
+                loss = -delta if delta < 0.0 else 0.0
+                if math.isnan(avg_gain):
+                    avg_gain = gain
+                    avg_loss = loss
+                else:
+                    avg_gain = (1.0 - alpha) * avg_gain + alpha * gain
+                    avg_loss = (1.0 - alpha) * avg_loss + alpha * loss
+        if math.isnan(avg_gain):
+            current_rsi = math.nan
+        else:
+            current_rsi = _rsi(avg_gain, avg_loss)
+        out[i, RSI] = current_rsi
+
+        # RSI_SMA14
+        slot = i % RSI_SMA_PERIOD
+        if i >= RSI_SMA_PERIOD:
+            old = rsi_ring[slot]
+            if math.isnan(old):
+                rsi_nans -= 1
+            else:
+                rsi_sum -= old
+        rsi_ring[slot] = current_rsi
+        if math.isnan(current_rsi):
+            rsi_nans += 1
+        else:
+            rsi_sum += current_rsi
+        if i >= RSI_SMA_PERIOD - 1 and rsi_nans == 0:
+            out[i, RSI_SMA14] = rsi_sum / RSI_SMA_PERIOD
+        else:
+            out[i, RSI_SMA14] = math.nan
+
+        # Bollinger bands
+        slot = i % BB_WINDOW
+        if i >= BB_WINDOW:
+            old = close_ring[slot]
+            if math.isnan(old):
+                close_nans -= 1
+            else:
+                close_sum -= old
+                close_sum_sq -= old * old
+        shifted = current - shift
+        close_ring[slot] = shifted
+        if math.isnan(shifted):
+            close_nans += 1
+        else:
+            close_sum += shifted
+            close_sum_sq += shifted * shifted
+
+        if i >= BB_WINDOW - 1 and close_nans == 0:
+            mean = close_sum / BB_WINDOW
+            variance = (close_sum_sq - close_sum * mean) / (BB_WINDOW - 1)
+            std_dev = math.sqrt(variance) if variance > 0.0 else 0.0
+            sma = mean + shift
+            upper = sma + std_dev * BB_NUM_OF_STD
+            lower = sma - std_dev * BB_NUM_OF_STD
+            out[i, SMA20] = sma
+            out[i, BB_UPPER] = upper
+            out[i, BB_LOWER] = lower
+            if upper > lower:
+                out[i, BB_PERCENT] = (current - lower) / (upper - lower)
+            else:
+                out[i, BB_PERCENT] = math.nan
+        else:
+            out[i, SMA20] = math.nan
+            out[i, BB_UPPER] = math.nan
+            out[i, BB_LOWER] = math.nan
+            out[i, BB_PERCENT] = math.nan
+
+
+def numpy_kernel(close: np.ndarray, out: np.ndarray) -> None:
+    bars = close.shape[0]
+    alpha = 1.0 / RSI_PERIOD
+    out[:] = np.nan
+
+    # The RMA recursion can not be vectorized, but runs on plain floats
+    rsi = out[:, RSI]
+    closes = close.tolist()
+    avg_gain = avg_loss = math.nan
+    for i in range(1, bars):
+        delta = closes[i] - closes[i - 1]
+        if math.isnan(delta):
+            pass
+        elif math.isnan(avg_gain):
+            avg_gain, avg_loss = max(delta, 0.0), max(-delta, 0.0)
+        else:
+            avg_gain = (1.0 - alpha) * avg_gain + alpha * max(delta, 0.0)
+            avg_loss = (1.0 - alpha) * avg_loss + alpha * max(-delta, 0.0)
+        if not math.isnan(avg_gain):
+            rsi[i] = _rsi(avg_gain, avg_loss)
+
+    if bars >= RSI_SMA_PERIOD:
+        sliding_window_view(rsi, RSI_SMA_PERIOD).mean(
+            axis=1, out=out[RSI_SMA_PERIOD - 1 :, RSI_SMA14]
+        )
+
+    if bars >= BB_WINDOW:
+        windows = sliding_window_view(close, BB_WINDOW)
+        sma = out[BB_WINDOW - 1 :, SMA20]
+        windows.mean(axis=1, out=sma)
+        std_dev = windows.std(axis=1, ddof=1)
+        std_dev *= BB_NUM_OF_STD
+        np.add(sma, std_dev, out=out[BB_WINDOW - 1 :, BB_UPPER])
+        np.subtract(sma, std_dev, out=out[BB_WINDOW - 1 :, BB_LOWER])
+        lower = out[BB_WINDOW - 1 :, BB_LOWER]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(
+                close[BB_WINDOW - 1 :] - lower,
+                out[BB_WINDOW - 1 :, BB_UPPER] - lower,
+                out=out[BB_WINDOW - 1 :, BB_PERCENT],
+            )
+        # A flat window has no band, as in the incremental engine
+        out[BB_WINDOW - 1 :, BB_PERCENT][std_dev == 0] = np.nan
+
+
+if njit is not None:
+    _rsi = njit(_rsi)
+    _kernel = njit(fused_kernel)
+else:
+    _kernel = numpy_kernel
+
+
+def compute_indicators(close: np.ndarray) -> np.ndarray:
+    """Return a (bars x len(INDICATOR_COLUMNS)) block of indicator values."""
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    out = np.empty((close.shape[0], len(INDICATOR_COLUMNS)))
+    _kernel(close, out)
+    return out
@@ -0,0 +1,80 @@
+"""Shortest history the latest indicator values can be evaluated from.
+
+`analyse_stock` only looks at the last bar. BBands% depends on the last
+`BB_WINDOW` bars, while the RMAs behind the RSI weigh their seed by
+(1 - 1/RSI_PERIOD)^n after n bars, so a few hundred bars are enough for the
+RSI to match the one of the full period to a given precision.
+
+Bars are only produced while the exchange trades, so for tickers of a known
+exchange the window counts back its sessions. Other tickers fall back to a
+fixed ratio of calendar to trading time.
+"""
+
+import math
+from datetime import datetime, time, timedelta
+
+from pandas import Timestamp
+
+from stocks.analysis.exchanges import Exchange
+from stocks.analysis.incremental import BB_WINDOW, RSI_PERIOD, RSI_SMA_PERIOD
+from stocks.analysis.periods import interval_duration
+
+# Calendar time spanned by one bar of trading time when the sessions are not
+# known: regular NYSE sessions are 6.5 hours on 5 days a week, and holidays
+# take roughly a tenth more
+INTRADAY_CALENDAR_FACTOR = 24 / 6.5 * 7 / 5 * 1.1
+DAILY_CALENDAR_FACTOR = 7 / 5 * 1.1
+LONG_CALENDAR_FACTOR = 1.1
+
+
+def warmup_bars(precision: float) -> int:
+    """Bars after which the seed of the RSI weighs less than `precision`.
+
+    RSI_SMA14 averages the last RSI_SMA_PERIOD values, so the oldest of them
+    has to have converged as well.
+    """
+    rma_bars = math.ceil(math.log(precision) / math.log(1 - 1 / RSI_PERIOD))
+    return max(rma_bars + RSI_SMA_PERIOD, BB_WINDOW)
+
+
+def session_lookback_start(
+    exchange: Exchange, bars: int, duration: timedelta, now: datetime
+) -> Timestamp:
+    """Start of the day from which the sessions of `exchange` up to `now`
+    hold at least `bars` bars of `duration`, the forming one included."""
+    day = now.astimezone(exchange.tz).date()
+    while True:
+        session = exchange.session(day)
+        if session and session[0] < now:
+            open_, close = session
+            if duration >= timedelta(days=1):
+                bars -= 1
+            else:
+                bars -= math.ceil((min(close, now) - open_) / duration)
+            if bars <= 0:
+                return Timestamp(datetime.combine(day, time(), exchange.tz))
+        day -= timedelta(days=1)
+
+
+def lookback_start(
+    interval: str,
+    precision: float,
+    now: datetime,
+    exchange: Exchange | None = None,
+) -> Timestamp:
+    """Start of a window holding at least `warmup_bars(precision)` bars.
+
+    `exchange` is the one the ticker trades on, if known.
+    """
+    duration = interval_duration(interval)
+    if exchange and duration <= timedelta(days=1):
+        return session_lookback_start(
+            exchange, warmup_bars(precision), duration, now
+        )
+    if duration < timedelta(days=1):
+        factor = INTRADAY_CALENDAR_FACTOR
+    elif duration == timedelta(days=1):
+        factor = DAILY_CALENDAR_FACTOR
+    else:
+        factor = LONG_CALENDAR_FACTOR
+    return Timestamp(now) - warmup_bars(precision) * duration * factor
@@ -0,0 +1,236 @@
+"""Search StateIndicator thresholds that would have signalled best.
+
+The indicators do not depend on the thresholds, so they are computed once
+with `compute_panel` and put in shared memory together with the closes.
+Candidates are then classified and scored in a process pool whose workers
+attach to that memory instead of receiving the arrays pickled per task.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator, Mapping
+
+import numpy as np
+from pandas import DataFrame
+
+from stocks.analysis.kernel import INDICATOR_COLUMNS
+from stocks.analysis.panel import align_closes, compute_panel
+from stocks.analysis.rules import CompiledRules
+
+# Fewer signals than this are too few to rank a candidate on
+MIN_SIGNALS = 10
+
+
+@dataclass
+class Rule:
+    """What a threshold row applies to, without the thresholds."""
+
+    state_id: int
+    state: str
+    indicator: str
+
+
+def state_direction(name: str) -> int:
+    """+1 for states advising to buy, -1 for selling ones, else 0."""
+    name = name.lower()
+    if "buy" in name:
+        return 1
+    if "sell" in name:
+        return -1
+    return 0
+
+
+def score_states(
+    state_ids: np.ndarray,
+    closes: np.ndarray,
+    directions: Mapping[int, int],
+    min_signals: int = MIN_SIGNALS,
+) -> tuple[float, int]:
+    """Mean return of following the signals, and how many there were.
+
+    `state_ids` and `closes` are (bars x tickers) and right-aligned like
+    `align_closes`. Every run of a state within a ticker is a signal, held
+    until the next transition as in `backtest.state_transitions`. Returns of
+    selling states count negatively and states without a direction are not
+    signals.
+    """
+    bars = closes.shape[0]
+    states = state_ids.T.ravel()
+    close = closes.T.ravel()
+    if not len(close):
+        return -np.inf, 0
+
+    valid = ~np.isnan(close)
+    column_start = np.arange(len(close)) % bars == 0
+    changed = np.empty(len(states), dtype=bool)
+    changed[0] = True
+    changed[1:] = states[1:] != states[:-1]
+    first_valid = valid.copy()
+    first_valid[1:] &= ~valid[:-1]
+    starts = np.flatnonzero(valid & (column_start | changed | first_valid))
+
+    column_end = (starts // bars + 1) * bars - 1
+    ends = np.minimum(np.append(starts[1:], len(close)), column_end)
+
+    held, positions = np.unique(states[starts], return_inverse=True)
+    sign = np.array(
+        [directions.get(state_id, 0) for state_id in held], dtype=int
+    )[positions]
+
+    signals = sign != 0
+    count = int(signals.sum())
+    if count < min_signals:
+        return -np.inf, count
+    returns = close[ends[signals]] / close[starts[signals]] - 1
+    return float((returns * sign[signals]).mean()), count
+
+
+def random_candidates(
+    base: np.ndarray, count: int, span: float, seed: int | None = None
+) -> Iterator[np.ndarray]:
+    """Thresholds moved by up to `span` times the width of their range.
+
+    Candidates whose lower threshold is not below the upper one are skipped.
+    """
+    rng = np.random.default_rng(seed)
+    width = (base[:, 1] - base[:, 0])[:, None]
+    for _ in range(count):
+        candidate = base + rng.uniform(-span, span, base.shape) * width
+        if (candidate[:, 0] < candidate[:, 1]).all():
+            yield candidate
+
+
+def grid_candidates(
+    base: np.ndarray, steps: int, span: float
+) -> Iterator[np.ndarray]:
+    """Every combination of `steps` moves of each threshold."""
+    width = (base[:, 1] - base[:, 0])[:, None]
+    moves = np.linspace(-span, span, steps)
+    for offsets in product(moves, repeat=base.size):
+        candidate = base + np.reshape(offsets, base.shape) * width
+        if (candidate[:, 0] < candidate[:, 1]).all():
+            yield candidate
+
+
+# State of the pool workers, see `_attach`
+_worker: dict = {}
+
+
+def _share(array: np.ndarray) -> tuple[SharedMemory, tuple[str, tuple]]:
+    memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=np.float64, buffer=memory.buf)[:] = array
+    return memory, (memory.name, array.shape)
+
+
+def _view(spec: tuple[str, tuple]) -> np.ndarray:
+    name, shape = spec
+    # Workers share the resource tracker of the parent, which unlinks the
+    # memory once the search is done
+    memory = SharedMemory(name=name)
+    _worker.setdefault("memory", []).append(memory)
+    return np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+
+
+def _attach(
+    values: tuple[str, tuple],
+    closes: tuple[str, tuple],
+    columns: list[str],
+    rules: list[Rule],
+    default_id: int,
+    min_signals: int,
+) -> None:
+    _worker.update(
+        values=_view(values),
+        closes=_view(closes),
+        columns=columns,
+        rules=rules,
+        default_id=default_id,
+        directions={
+            rule.state_id: state_direction(rule.state) for rule in rules
+        },
+        min_signals=min_signals,
+    )
+
+
+def _evaluate(candidate: np.ndarray) -> tuple[float, int]:
+    compiled = CompiledRules(
+        [
+            (rule.indicator, lower, upper, rule.state_id)
+            for rule, (lower, upper) in zip(_worker["rules"], candidate)
+        ],
+        _worker["default_id"],
+    )
+    closes = _worker["closes"]
+    state_ids = compiled.classify_values(
+        _worker["values"], _worker["columns"]
+    ).reshape(closes.shape)
+    return score_states(
+        state_ids, closes, _worker["directions"], _worker["min_signals"]
+    )
+
+
+def optimize_thresholds(
+    histories: Mapping[str, DataFrame],
+    rules: list[Rule],
+    candidates: Iterable[np.ndarray],
+    default_id: int,
+    workers: int | None = None,
+    top: int | None = 10,
+    min_signals: int = MIN_SIGNALS,
+) -> list[tuple[float, int, np.ndarray]]:
+    """Score every candidate and return the `top` ones, or all, best first.
+
+    A candidate is a (rules x 2) array of lower and upper thresholds, in the
+    order of `rules`. Results are (score, signals, candidate).
+    """
+    closes = align_closes(histories)
+    bars, tickers = closes.shape
+    columns = [
+        name
+        for name in INDICATOR_COLUMNS
+        if name in {rule.indicator for rule in rules}
+    ]
+    block = compute_panel(closes)[
+        :, :, [INDICATOR_COLUMNS.index(name) for name in columns]
+    ]
+
+    values_memory, values = _share(block.reshape(bars * tickers, len(columns)))
+    closes_memory, closes_spec = _share(closes)
+    del block
+    workers = workers or os.cpu_count() or 1
+    candidate_list = list(candidates)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_attach,
+            initargs=(
+                values,
+                closes_spec,
+                columns,
+                rules,
+                default_id,
+                min_signals,
+            ),
+        ) as executor:
+            chunksize = max(1, len(candidate_list) // (4 * workers))
+            scores = executor.map(
+                _evaluate, candidate_list, chunksize=chunksize
+            )
+            ranked = sorted(
+                (
+                    (score, signals, candidate)
+                    for (score, signals), candidate in zip(
+                        scores, candidate_list
+                    )
+                ),
+                key=lambda result: result[0],
+                reverse=True,
+            )
+    finally:
+        for memory in (values_memory, closes_memory):
+            memory.close()
+            memory.unlink()
+    return ranked[:top]
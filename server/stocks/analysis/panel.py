@@ -0,0 +1,211 @@
+from collections import defaultdict
+from typing import Mapping
+
+import numpy as np
+from pandas import DataFrame
+
+from stocks.analysis.incremental import (
+    BB_NUM_OF_STD,
+    BB_WINDOW,
+    RSI_PERIOD,
+    RSI_SMA_PERIOD,
+)
+from stocks.analysis.kernel import (
+    BB_LOWER,
+    BB_PERCENT,
+    BB_UPPER,
+    INDICATOR_COLUMNS,
+    RSI,
+    RSI_SMA14,
+    SMA20,
+)
+from stocks.models import Subscription
+
+LATEST_COLUMNS = [
+    "Close",
+    "RSI",
+    "RSI_SMA14",
+    "BB_lower",
+    "SMA20",
+    "BB_upper",
+    "BBands%",
+]
+
+
+def align_closes(histories: Mapping[str, DataFrame]) -> np.ndarray:
+    """Stack the Close columns into a (bars x tickers) array.
+
+    Histories are aligned on their last bar and padded with NaN at the top.
+    The indicators of a ticker only depend on its own sequence of bars, so
+    aligning by position instead of by timestamp keeps every column free of
+    gaps even when the tickers trade on different calendars.
+    """
+    bars = max((len(history) for history in histories.values()), default=0)
+    closes = np.full((bars, len(histories)), np.nan)
+    for column, history in enumerate(histories.values()):
+        if len(history):
+            closes[bars - len(history) :, column] = history["Close"].to_numpy(
+                dtype=float
+            )
+    return closes
+
+
+def compute_latest(closes: np.ndarray) -> dict[str, np.ndarray]:
+    """Compute the last-bar indicators of every column of `closes` at once.
+
+    The RMAs are carried through all bars with one vectorized step per bar;
+    the rolling windows only need the last `BB_WINDOW`/`RSI_SMA_PERIOD` rows.
+    """
+    bars, tickers = closes.shape
+    alpha = 1 / RSI_PERIOD
+
+    delta = np.diff(closes, axis=0, prepend=np.nan)
+    gains = np.clip(delta, 0, None)
+    losses = np.clip(-delta, 0, None)
+
+    avg_gain = np.full(tickers, np.nan)
+    avg_loss = np.full(tickers, np.nan)
+    rsi_tail = np.full((RSI_SMA_PERIOD, tickers), np.nan)
+    first_tail_row = bars - RSI_SMA_PERIOD
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for row in range(bars):
+            avg_gain = _rma_step(avg_gain, gains[row], alpha)
+            avg_loss = _rma_step(avg_loss, losses[row], alpha)
+            if row >= first_tail_row:
+                rs = avg_gain / avg_loss
+                rsi_tail[row - first_tail_row] = 100 - (100 / (1 + rs))
+
+        close_tail = closes[-BB_WINDOW:]
+        if len(close_tail) < BB_WINDOW:
+            sma = std_dev = np.full(tickers, np.nan)
+        else:
+            sma = close_tail.mean(axis=0)
+            std_dev = close_tail.std(axis=0, ddof=1)
+        upper = sma + std_dev * BB_NUM_OF_STD
+        lower = sma - std_dev * BB_NUM_OF_STD
+        close = closes[-1] if bars else np.full(tickers, np.nan)
+
+        return {
+            "Close": close,
+            "RSI": rsi_tail[-1],
+            "RSI_SMA14": rsi_tail.mean(axis=0),
+            "BB_lower": lower,
+            "SMA20": sma,
+            "BB_upper": upper,
+            # A flat window has no band, as in `compute_panel`
+            "BBands%": np.where(
+                std_dev > 0, (close - lower) / (upper - lower), np.nan
+            ),
+        }
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the last `window` rows at every row, NaN before that.
+
+    Summing `window` shifted slices keeps every temporary the size of
+    `values`, unlike a sliding window view over all of them.
+    """
+    mean = np.full(values.shape, np.nan)
+    bars = len(values)
+    if bars >= window:
+        total = values[: bars - window + 1].copy()
+        for offset in range(1, window):
+            total += values[offset : bars - window + 1 + offset]
+        mean[window - 1 :] = total / window
+    return mean
+
+
+def _rolling_std(
+    values: np.ndarray, mean: np.ndarray, window: int
+) -> np.ndarray:
+    """Sample standard deviation around the `_rolling_mean` of each row."""
+    std = np.full(values.shape, np.nan)
+    bars = len(values)
+    if bars >= window:
+        centre = mean[window - 1 :]
+        total = np.zeros(centre.shape)
+        for offset in range(window):
+            total += (
+                values[offset : bars - window + 1 + offset] - centre
+            ) ** 2
+        std[window - 1 :] = np.sqrt(total / (window - 1))
+    return std
+
+
+def compute_panel(closes: np.ndarray) -> np.ndarray:
+    """Indicators of every bar of every column of `closes` at once.
+
+    Returns a (bars x tickers x len(INDICATOR_COLUMNS)) block, the column-wise
+    counterpart of `kernel.compute_indicators`.
+    """
+    bars, tickers = closes.shape
+    alpha = 1 / RSI_PERIOD
+    out = np.full((bars, tickers, len(INDICATOR_COLUMNS)), np.nan)
+
+    delta = np.diff(closes, axis=0, prepend=np.nan)
+    gains = np.clip(delta, 0, None)
+    losses = np.clip(-delta, 0, None)
+
+    avg_gain = np.full(tickers, np.nan)
+    avg_loss = np.full(tickers, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for row in range(bars):
+            avg_gain = _rma_step(avg_gain, gains[row], alpha)
+            avg_loss = _rma_step(avg_loss, losses[row], alpha)
+            out[row, :, RSI] = 100 - (100 / (1 + avg_gain / avg_loss))
+
+        rsi = out[:, :, RSI]
+        out[:, :, RSI_SMA14] = _rolling_mean(rsi, RSI_SMA_PERIOD)
+
+        sma = _rolling_mean(closes, BB_WINDOW)
+        std_dev = _rolling_std(closes, sma, BB_WINDOW)
+        upper = sma + std_dev * BB_NUM_OF_STD
+        lower = sma - std_dev * BB_NUM_OF_STD
+        out[:, :, SMA20] = sma
+        out[:, :, BB_UPPER] = upper
+        out[:, :, BB_LOWER] = lower
+        # A flat window has no band, as in the fused kernel
+        out[:, :, BB_PERCENT] = np.where(
+            std_dev > 0, (closes - lower) / (upper - lower), np.nan
+        )
+    return out
+
+
+def _rma_step(
+    previous: np.ndarray, current: np.ndarray, alpha: float
+) -> np.ndarray:
+    started = ~np.isnan(previous)
+    step = np.where(started, (1 - alpha) * previous + alpha * current, current)
+    # Missing observations (the NaN padding) keep the previous value
+    return np.where(np.isnan(current), previous, step)
+
+
+def latest_panel(histories: Mapping[str, DataFrame]) -> DataFrame:
+    """Latest indicator values of every history, one row per key."""
+    latest = compute_latest(align_closes(histories))
+    return DataFrame(latest, index=list(histories), columns=LATEST_COLUMNS)
+
+
+def batch_latest_indicators(
+    histories: Mapping[Subscription, DataFrame],
+) -> dict[Subscription, dict[str, float]]:
+    """Batch counterpart of `incremental.latest_indicators`.
+
+    Subscriptions sharing an interval are computed together in one panel.
+    """
+    by_interval: dict[str, list[Subscription]] = defaultdict(list)
+    for subscription in histories:
+        by_interval[subscription.interval].append(subscription)
+
+    latest: dict[Subscription, dict[str, float]] = {}
+    for group in by_interval.values():
+        panel = latest_panel(
+            {
+                str(i): histories[subscription]
+                for i, subscription in enumerate(group)
+            }
+        )
+        for subscription, row in zip(group, panel.to_numpy(dtype=float)):
+            latest[subscription] = dict(zip(LATEST_COLUMNS, row.tolist()))
+    return latest
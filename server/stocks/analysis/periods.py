@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from typing import Iterable, cast
+
+from pandas import DataFrame, DateOffset, Timestamp
+
+# Periods and intervals offered by the telegram bot, see
+# telegram/routers/subscribe.py
+PERIOD_OFFSETS = {
+    "1d": DateOffset(days=1),
+    "5d": DateOffset(days=5),
+    "1mo": DateOffset(months=1),
+    "3mo": DateOffset(months=3),
+    "6mo": DateOffset(months=6),
+    "1y": DateOffset(years=1),
+    "2y": DateOffset(years=2),
+    "5y": DateOffset(years=5),
+    "10y": DateOffset(years=10),
+}
+
+INTERVAL_DURATIONS = {
+    "1m": timedelta(minutes=1),
+    "2m": timedelta(minutes=2),
+    "5m": timedelta(minutes=5),
+    "15m": timedelta(minutes=15),
+    "30m": timedelta(minutes=30),
+    "60m": timedelta(hours=1),
+    "90m": timedelta(minutes=90),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+    "5d": timedelta(days=5),
+    "1wk": timedelta(weeks=1),
+    "1mo": timedelta(days=31),
+    "3mo": timedelta(days=92),
+}
+
+
+def period_start(period: str, now: datetime) -> Timestamp:
+    """First instant covered by a yfinance `period` ending at `now`."""
+    now = Timestamp(now)
+    if period == "ytd":
+        return now.normalize().replace(month=1, day=1)
+    if period == "max":
+        return Timestamp.min.tz_localize(now.tz)
+    return now - PERIOD_OFFSETS[period]
+
+
+def interval_duration(interval: str) -> timedelta:
+    return INTERVAL_DURATIONS[interval]
+
+
+def longest_period(periods: Iterable[str], now: datetime) -> str:
+    return min(periods, key=lambda period: period_start(period, now))
+
+
+def slice_from(history: DataFrame, start: datetime) -> DataFrame:
+    """Zero-copy view of the bars of `history` from `start` on."""
+    position = cast(int, history.index.searchsorted(start))
+    # A new frame over the same blocks, so that adding indicator columns to
+    # it neither copies the bars nor warns about setting on a slice
+    return DataFrame(history.iloc[position:], copy=False)
+
+
+def slice_period(history: DataFrame, period: str, now: datetime) -> DataFrame:
+    """Zero-copy view of the bars of `history` that fall within `period`."""
+    return slice_from(history, period_start(period, now))
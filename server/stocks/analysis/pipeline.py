@@ -0,0 +1,138 @@
+"""The analysis of the subscriptions, run by the analysis workers.
+
+Each stage of a run is reported to a `Progress`, which times it and keeps
+the counts of the subscriptions done so far.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.utils import timezone
+from pandas import DataFrame
+
+from stocks.analysis.batch import iter_histories
+from stocks.analysis.freshness import mark_analysed, split_due
+from stocks.analysis.functions import (
+    add_indicators,
+    analyse_stocks,
+    fetch_history,
+)
+from stocks.analysis.incremental import latest_indicators
+from stocks.analysis.panel import batch_latest_indicators
+from stocks.analysis.rules import get_rule_index
+from stocks.models import Subscription
+from stocks.signals.signals import analytics_done
+
+logger = logging.getLogger(__name__)
+
+
+class Progress:
+    """Stage being run, counts so far and seconds spent in each stage."""
+
+    def __init__(self) -> None:
+        self.current = ""
+        self.counts: dict[str, int] = {}
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.current = name
+        self.changed(force=True)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+            self.changed(force=True)
+
+    def update(self, **counts: int) -> None:
+        self.counts.update(counts)
+        self.changed()
+
+    def changed(self, force: bool = False) -> None:
+        """Called on every change, `force` at the stage boundaries."""
+
+
+def run_analysis(
+    subscriptions: Iterable[Subscription],
+    progress: Progress | None = None,
+    workers: int | None = None,
+) -> dict[str, int]:
+    """Analyse `subscriptions` and notify the users of the new states.
+
+    `workers` threads fetch the histories, see `iter_histories`. Returns the
+    counts of analysed, skipped and changed subscriptions.
+    """
+    progress = progress or Progress()
+    now = timezone.now()
+    subscriptions = list(subscriptions)
+    progress.update(subscriptions=len(subscriptions))
+
+    with progress.stage("filter"):
+        due, skipped, trades = split_due(subscriptions, now)
+    logger.info(
+        f"Analysing {len(due)} subscriptions, skipped {len(skipped)} "
+        "without trades since their last analysis"
+    )
+    progress.update(due=len(due), skipped=len(skipped))
+
+    histories: dict[Subscription, DataFrame] = {}
+    latest = {}
+    with progress.stage("fetch"):
+        # Histories arrive as they are fetched, the indicators of the ones
+        # already there are computed while the others download
+        for sub, history in iter_histories(due, workers):
+            if history.empty:
+                logger.error(f"Failed to get history for {sub.stock.ticker}")
+                continue
+            histories[sub] = history
+            if not settings.ANALYSIS_BATCH_MODE:
+                latest[sub] = latest_indicators(sub, history)
+            progress.update(fetched=len(histories))
+
+    if settings.ANALYSIS_BATCH_MODE:
+        with progress.stage("compute"):
+            latest = batch_latest_indicators(histories)
+
+    with progress.stage("classify"):
+        new_states = analyse_stocks(
+            DataFrame([latest[sub] for sub in histories]), get_rule_index()
+        )
+
+    changed = 0
+    with progress.stage("notify"):
+        for (sub, history), new_state in zip(histories.items(), new_states):
+            if new_state == sub.state:
+                continue
+            sub.state = new_state
+            # The lease fields were renewed since `sub` was loaded
+            sub.save(update_fields=["state"])
+            logger.info(
+                f"{sub.stock} {sub.interval}/{sub.period} has new state: {new_state}"
+            )
+            if settings.ANALYSIS_LOOKBACK_PRECISION:
+                # Only the warm-up window was fetched, but the chart
+                # shows the whole period
+                history = fetch_history(sub)
+            # The full indicator columns are only needed for the chart
+            analytics_done.send(
+                sender=Subscription.__class__,
+                instance=sub,
+                history=add_indicators(history),
+            )
+            changed += 1
+            progress.update(changed=changed)
+
+    with progress.stage("db_write"):
+        mark_analysed(histories, trades, now)
+
+    return {
+        "analysed": len(histories),
+        "skipped": len(skipped),
+        "changed": changed,
+    }
@@ -0,0 +1,446 @@
+"""Where the analysis gets its bars from.
+
+`YFinanceProvider` downloads them from Yahoo. `ReplayProvider` serves bars
+recorded in local Parquet/CSV files, or seeded synthetic ones, after an
+optional delay standing in for the network, so load tests and benchmarks
+run on a box without Yahoo access. `MARKET_DATA_PROVIDER` picks one.
+"""
+
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+import yfinance as yf
+from yfinance.data import YfData
+from django.conf import settings
+from django.utils import timezone
+from pandas import (
+    DataFrame,
+    MultiIndex,
+    Timestamp,
+    date_range,
+    read_csv,
+    read_parquet,
+    to_datetime,
+)
+
+from stocks.analysis.fetcher import record_response
+from stocks.analysis.resilience import (
+    CircuitBreaker,
+    UpstreamError,
+    call_with_retries,
+)
+from stocks.analysis.periods import (
+    PERIOD_OFFSETS,
+    interval_duration,
+    period_start,
+)
+
+# Yahoo quotes of many symbols at once
+QUOTE_URL = "https://query2.finance.yahoo.com/v7/finance/quote"
+
+FREQUENCIES = {
+    "1m": "min",
+    "2m": "2min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "60m": "h",
+    "90m": "90min",
+    "1h": "h",
+    "1d": "B",
+    "5d": "5B",
+    "1wk": "W-MON",
+    "1mo": "MS",
+    "3mo": "QS",
+}
+
+
+def synthetic_history(
+    interval: str, bars: int, seed: int = 0, end: datetime | None = None
+) -> DataFrame:
+    """Seeded OHLCV bars following a geometric random walk.
+
+    The bars start on 2024-01-02, or end at `end` when it is given.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.005, bars)) * close
+    if end is None:
+        index = date_range(
+            "2024-01-02 09:30",
+            periods=bars,
+            freq=FREQUENCIES[interval],
+            tz="America/New_York",
+        )
+    else:
+        index = date_range(end=end, periods=bars, freq=FREQUENCIES[interval])
+    return DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread,
+            "Low": np.minimum(open_, close) - spread,
+            "Close": close,
+            "Volume": rng.integers(1_000, 1_000_000, bars).astype(float),
+        },
+        index=index,
+    )
+
+
+class MarketDataProvider(ABC):
+    @abstractmethod
+    def history(
+        self,
+        ticker: str,
+        period: str | None = None,
+        interval: str = "1d",
+        start: datetime | None = None,
+        end: datetime | None = None,
+        raise_errors: bool = False,
+        timeout: float | None = None,
+    ) -> DataFrame:
+        """Bars of one ticker, like `yf.Ticker(ticker).history()`.
+
+        `start`/`end` replace the `period` when given. `timeout` bounds each
+        HTTP request, in seconds.
+        """
+
+    @abstractmethod
+    def download(
+        self,
+        tickers: list[str],
+        period: str,
+        interval: str,
+        start: datetime | None = None,
+    ) -> dict[str, DataFrame]:
+        """Bars of several tickers at once, without the empty ones."""
+
+    @abstractmethod
+    def last_trades(self, tickers: list[str]) -> dict[str, Timestamp]:
+        """Time of the last trade of each ticker, in one cheap request.
+
+        Tickers the upstream knows nothing about are left out.
+        """
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Yahoo through yfinance, reporting every response to the limiter."""
+
+    def __init__(self) -> None:
+        self.session = requests.Session()
+        self.session.hooks["response"].append(self._report)
+        # Status of the last response on each thread
+        self._last = threading.local()
+
+    def _report(self, response: requests.Response, *_, **__) -> None:
+        self._last.status = response.status_code
+        record_response(
+            urlparse(response.url).hostname or "yahoo",
+            response.status_code,
+            response.elapsed.total_seconds(),
+        )
+
+    @staticmethod
+    def _report_failure(error: requests.RequestException) -> None:
+        url = error.request.url if error.request else None
+        host = urlparse(url).hostname if url else None
+        record_response(host or "yahoo", None, 0)
+
+    def history(
+        self,
+        ticker: str,
+        period: str | None = None,
+        interval: str = "1d",
+        start: datetime | None = None,
+        end: datetime | None = None,
+        raise_errors: bool = False,
+        timeout: float | None = None,
+    ) -> DataFrame:
+        kwargs = {
+            "period": period,
+            "start": start,
+            "end": end,
+            "timeout": timeout,
+        }
+        if raise_errors:
+            kwargs["raise_errors"] = True
+        self._last.status = None
+        try:
+            history = yf.Ticker(ticker, session=self.session).history(
+                interval=interval,
+                **{key: value for key, value in kwargs.items() if value},
+            )
+        except requests.RequestException as e:
+            self._report_failure(e)
+            raise
+        # yfinance returns no bars rather than raising when throttled
+        status = self._last.status
+        if history.empty and status and (status == 429 or status >= 500):
+            raise UpstreamError(status)
+        return history
+
+    def download(
+        self,
+        tickers: list[str],
+        period: str,
+        interval: str,
+        start: datetime | None = None,
+    ) -> dict[str, DataFrame]:
+        """One `yf.download` call, split back into one frame per ticker.
+
+        Rows that only exist because another ticker traded at that time are
+        dropped.
+        """
+        try:
+            data = yf.download(
+                tickers,
+                period=period,
+                start=start,
+                interval=interval,
+                group_by="ticker",
+                # Same bars as Ticker.history()
+                auto_adjust=True,
+                actions=False,
+                ignore_tz=False,
+                progress=False,
+                session=self.session,
+            )
+        except requests.RequestException as e:
+            self._report_failure(e)
+            raise
+        if data.empty:
+            return {}
+
+        if not isinstance(data.columns, MultiIndex):
+            return {tickers[0]: data.dropna(how="all")}
+
+        histories = {}
+        for ticker in data.columns.get_level_values(0).unique():
+            history = data[ticker].dropna(how="all")
+            if not history.empty:
+                histories[ticker] = history
+        return histories
+
+    def last_trades(self, tickers: list[str]) -> dict[str, Timestamp]:
+        try:
+            data = YfData(session=self.session).get_raw_json(
+                QUOTE_URL,
+                params={
+                    "symbols": ",".join(tickers),
+                    "fields": "regularMarketTime",
+                },
+                timeout=settings.MARKET_DATA_TIMEOUT,
+            )
+        except requests.HTTPError as e:
+            status = e.response.status_code
+            if status == 429 or status >= 500:
+                raise UpstreamError(status) from e
+            raise
+        except requests.RequestException as e:
+            self._report_failure(e)
+            raise
+        return {
+            quote["symbol"]: Timestamp(
+                quote["regularMarketTime"], unit="s", tz="UTC"
+            )
+            for quote in data["quoteResponse"]["result"]
+            if quote.get("regularMarketTime")
+        }
+
+
+class ReplayProvider(MarketDataProvider):
+    """Bars from `<root>/<interval>/<TICKER>.parquet` or `.csv` files.
+
+    Recorded bars are shifted by whole intervals so that the last one is
+    recent, which keeps them within the periods the analysis asks for.
+    Tickers without a file get synthetic bars when `synthetic` is set, and
+    no bars otherwise. Every call sleeps `latency` seconds first.
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        latency: float = 0.0,
+        synthetic: bool = True,
+    ) -> None:
+        self.root = Path(root) if root else None
+        self.latency = latency
+        self.synthetic = synthetic
+        self._recorded: dict[tuple[str, str], DataFrame | None] = {}
+
+    def _wait(self) -> None:
+        time.sleep(self.latency)
+        record_response("replay", 200, self.latency)
+
+    def _read(self, ticker: str, interval: str) -> DataFrame | None:
+        key = (ticker, interval)
+        if key in self._recorded:
+            return self._recorded[key]
+
+        history = None
+        if self.root:
+            parquet = self.root / interval / f"{ticker}.parquet"
+            csv = self.root / interval / f"{ticker}.csv"
+            if parquet.exists():
+                history = read_parquet(parquet)
+            elif csv.exists():
+                history = read_csv(csv, index_col=0)
+        if history is not None:
+            history.index = to_datetime(history.index, utc=True)
+            history = history.sort_index()
+        self._recorded[key] = history
+        return history
+
+    def _bars(
+        self, ticker: str, interval: str, start: Timestamp, now: Timestamp
+    ) -> DataFrame:
+        recorded = self._read(ticker, interval)
+        if recorded is not None and not recorded.empty:
+            duration = interval_duration(interval)
+            shift = (now - recorded.index[-1]) // duration * duration
+            history = recorded.copy()
+            history.index = history.index + shift
+            return history
+        if not self.synthetic:
+            return DataFrame()
+        # Synthetic bars are regenerated for every window
+        start = max(start, now - PERIOD_OFFSETS["10y"])
+        bars = len(date_range(start, now, freq=FREQUENCIES[interval]))
+        return synthetic_history(
+            interval, bars, seed=zlib.crc32(ticker.encode()), end=now
+        )
+
+    def history(
+        self,
+        ticker: str,
+        period: str | None = None,
+        interval: str = "1d",
+        start: datetime | None = None,
+        end: datetime | None = None,
+        raise_errors: bool = False,
+        timeout: float | None = None,
+    ) -> DataFrame:
+        self._wait()
+        now = Timestamp(timezone.now())
+        if start is None:
+            if period is None:
+                raise ValueError("A period or a start is required")
+            start = period_start(period, now)
+        start = Timestamp(start)
+        end = Timestamp(end) if end else now
+        history = self._bars(ticker, interval, start, now)
+        if not history.empty:
+            history = history[
+                (history.index >= start) & (history.index <= end)
+            ]
+        if history.empty and raise_errors:
+            raise ValueError(f"{ticker}: no data to replay for {interval}")
+        return history
+
+    def download(
+        self,
+        tickers: list[str],
+        period: str,
+        interval: str,
+        start: datetime | None = None,
+    ) -> dict[str, DataFrame]:
+        self._wait()
+        now = Timestamp(timezone.now())
+        if start is None:
+            if period is None:
+                raise ValueError("A period or a start is required")
+            start = period_start(period, now)
+        start = Timestamp(start)
+        histories = {}
+        for ticker in tickers:
+            history = self._bars(ticker, interval, start, now)
+            if not history.empty:
+                history = history[history.index >= start]
+            if not history.empty:
+                histories[ticker] = history
+        return histories
+
+    def last_trades(self, tickers: list[str]) -> dict[str, Timestamp]:
+        """Now, replayed bars being shifted to end at the time of the call."""
+        self._wait()
+        now = Timestamp(timezone.now())
+        return {
+            ticker: now
+            for ticker in tickers
+            if self.synthetic
+            or any(
+                self._read(ticker, interval) is not None
+                for interval in FREQUENCIES
+            )
+        }
+
+
+class ResilientProvider(MarketDataProvider):
+    """Another provider whose calls are retried and behind a breaker.
+
+    See `resilience.call_with_retries`.
+    """
+
+    def __init__(self, provider: MarketDataProvider, name: str) -> None:
+        self.provider = provider
+        self.breaker = CircuitBreaker(
+            name,
+            settings.MARKET_DATA_BREAKER_THRESHOLD,
+            settings.MARKET_DATA_BREAKER_RESET,
+        )
+
+    def _call(self, method: str, *args, **kwargs):
+        return call_with_retries(
+            lambda: getattr(self.provider, method)(*args, **kwargs),
+            self.breaker,
+            settings.MARKET_DATA_RETRIES,
+            settings.MARKET_DATA_RETRY_BACKOFF,
+        )
+
+    def history(self, ticker: str, *args, **kwargs) -> DataFrame:
+        return self._call("history", ticker, *args, **kwargs)
+
+    def download(
+        self, tickers: list[str], *args, **kwargs
+    ) -> dict[str, DataFrame]:
+        return self._call("download", tickers, *args, **kwargs)
+
+    def last_trades(self, tickers: list[str]) -> dict[str, Timestamp]:
+        return self._call("last_trades", tickers)
+
+
+PROVIDERS = {"yfinance": YFinanceProvider, "replay": ReplayProvider}
+
+_provider: dict[tuple, MarketDataProvider] = {}
+
+
+def get_provider() -> MarketDataProvider:
+    """The provider `MARKET_DATA_PROVIDER` selects, kept between calls."""
+    key = (
+        settings.MARKET_DATA_PROVIDER,
+        settings.MARKET_DATA_REPLAY_DIR,
+        settings.MARKET_DATA_REPLAY_LATENCY,
+        settings.MARKET_DATA_BREAKER_THRESHOLD,
+        settings.MARKET_DATA_BREAKER_RESET,
+    )
+    if key not in _provider:
+        name, root, latency, *_ = key
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown market data provider {name}")
+        _provider.clear()
+        _provider[key] = ResilientProvider(
+            (
+                ReplayProvider(root, latency)
+                if name == "replay"
+                else YFinanceProvider()
+            ),
+            name,
+        )
+    return _provider[key]
@@ -0,0 +1,62 @@
+from typing import Hashable, cast
+
+from pandas import DataFrame, DatetimeIndex, Timedelta
+
+from stocks.analysis.store import COLUMNS
+
+# Finer intervals an interval can be derived from, finest first. Daily bars
+# are not derived from intraday ones since Yahoo only adjusts the former
+# for dividends.
+RESAMPLE_SOURCES = {
+    "2m": ["1m"],
+    "5m": ["1m"],
+    "15m": ["1m", "5m"],
+    "30m": ["1m", "5m", "15m"],
+    "1h": ["1m", "5m", "15m", "30m"],
+    "1wk": ["1d"],
+    "1mo": ["1d"],
+}
+
+INTRADAY_RULES = {
+    "2m": "2min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "60min",
+}
+
+AGGREGATIONS: dict[Hashable, str] = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Volume": "sum",
+}
+
+
+def resample_history(history: DataFrame, interval: str) -> DataFrame:
+    """Aggregate finer OHLCV bars into bars of `interval`.
+
+    Bars are labelled like Yahoo labels them: intraday buckets start at the
+    session open (e.g. 9:30, 10:30 for hourly NYSE bars), weekly ones on
+    Monday and monthly ones on the first of the month.
+    """
+    if interval in INTRADAY_RULES:
+        index = DatetimeIndex(history.index)
+        times_of_day = index - index.normalize()
+        origin = index[0].normalize() + Timedelta(times_of_day.min())
+        resampler = history[COLUMNS].resample(
+            INTRADAY_RULES[interval], origin=origin
+        )
+    elif interval == "1wk":
+        resampler = history[COLUMNS].resample(
+            "W-MON", label="left", closed="left"
+        )
+    elif interval == "1mo":
+        resampler = history[COLUMNS].resample("MS")
+    else:
+        raise ValueError(f"Interval {interval} can not be resampled")
+
+    # A mapping of columns aggregates into a frame
+    bars = cast(DataFrame, resampler.agg(AGGREGATIONS))
+    return bars.dropna(subset=["Close"])
@@ -0,0 +1,215 @@
+"""Keep failing upstreams and dead tickers from costing every run.
+
+Transient errors are retried with exponential backoff and full jitter, and
+an upstream that keeps failing trips its `CircuitBreaker`, which fails the
+following calls fast. Tickers that keep returning no bars are persisted in
+`MissingHistory` and left out of the runs for escalating intervals.
+"""
+
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Mapping, TypeVar
+
+import requests
+from django.conf import settings
+
+from stocks.models import MissingHistory
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Longest wait between two attempts, in seconds
+RETRY_BACKOFF_CAP = 8.0
+
+
+class UpstreamError(Exception):
+    """The upstream answered with a status worth retrying, 429 or 5xx."""
+
+    def __init__(self, status: int) -> None:
+        super().__init__(f"Upstream responded {status}")
+        self.status = status
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    UpstreamError,
+)
+
+
+def backoff_delay(attempt: int, base: float) -> float:
+    """Full jitter: uniform up to `base` doubled per attempt, capped."""
+    return random.uniform(0, min(RETRY_BACKOFF_CAP, base * 2**attempt))
+
+
+class CircuitBreaker:
+    """Fails calls fast after `threshold` failures in a row.
+
+    Once open, one trial call is let through every `reset_timeout` seconds
+    and closes it again when it succeeds.
+    """
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._trial or (
+            time.monotonic() - self.opened_at < self.reset_timeout
+        ):
+            return "open"
+        return "half-open"
+
+    def allow(self) -> None:
+        """Raise `CircuitOpen` unless a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == "open":
+                raise CircuitOpen(f"{self.name} circuit is open")
+            if state == "half-open":
+                self._trial = True
+
+    def success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                logger.warning(
+                    f"{self.name} circuit opened after "
+                    f"{self.failures} failures"
+                )
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+def call_with_retries(
+    call: Callable[[], T],
+    breaker: CircuitBreaker,
+    retries: int,
+    backoff: float,
+) -> T:
+    """`call`, retried up to `retries` times on `TRANSIENT_ERRORS`.
+
+    The breaker counts one failure per call whose attempts all failed.
+    Other exceptions are raised right away, the upstream did answer.
+    """
+    breaker.allow()
+    for attempt in range(retries + 1):
+        try:
+            result = call()
+        except TRANSIENT_ERRORS as e:
+            if attempt == retries:
+                breaker.failure()
+                raise
+            delay = backoff_delay(attempt, backoff)
+            logger.info(f"Retrying in {delay:.2f}s after: {e}")
+            time.sleep(delay)
+        except Exception:
+            breaker.success()
+            raise
+        else:
+            breaker.success()
+            return result
+    raise AssertionError("unreachable")
+
+
+def recheck_delay(misses: int) -> timedelta:
+    """How long a (ticker, interval) without bars is left out of runs.
+
+    The first miss is fetched again on the next run, then the delay starts
+    at `MARKET_DATA_MISS_RECHECK` and doubles up to
+    `MARKET_DATA_MISS_MAX_RECHECK`.
+    """
+    if misses < 2:
+        return timedelta(0)
+    return timedelta(
+        seconds=min(
+            settings.MARKET_DATA_MISS_RECHECK * 2 ** (misses - 2),
+            settings.MARKET_DATA_MISS_MAX_RECHECK,
+        )
+    )
+
+
+def cached_misses(
+    keys: Iterable[tuple[str, str]], now: datetime
+) -> set[tuple[str, str]]:
+    """The (ticker, interval) keys without bars that are not due yet."""
+    keys = set(keys)
+    return {
+        key
+        for key in MissingHistory.objects.filter(
+            ticker__in={ticker for ticker, _ in keys},
+            recheck_at__gt=now,
+        ).values_list("ticker", "interval")
+        if key in keys
+    }
+
+
+def record_fetches(
+    outcomes: Mapping[tuple[str, str], bool], now: datetime
+) -> None:
+    """Persist which (ticker, interval) keys had bars.
+
+    Keys with bars are forgotten, the others count one more miss.
+    """
+    if not outcomes:
+        return
+    existing = {
+        (miss.ticker, miss.interval): miss
+        for miss in MissingHistory.objects.filter(
+            ticker__in={ticker for ticker, _ in outcomes}
+        )
+    }
+    found = [
+        existing[key].pk
+        for key, has_bars in outcomes.items()
+        if has_bars and key in existing
+    ]
+    if found:
+        MissingHistory.objects.filter(pk__in=found).delete()
+
+    created, updated = [], []
+    for key, has_bars in outcomes.items():
+        if has_bars:
+            continue
+        miss = existing.get(key)
+        if miss is None:
+            miss = MissingHistory(ticker=key[0], interval=key[1])
+            created.append(miss)
+        else:
+            updated.append(miss)
+        miss.misses += 1
+        miss.recheck_at = now + recheck_delay(miss.misses)
+        miss.updated_at = now
+    MissingHistory.objects.bulk_create(created)
+    MissingHistory.objects.bulk_update(
+        updated, ["misses", "recheck_at", "updated_at"]
+    )
+    if created or updated:
+        logger.info(
+            f"{len(created) + len(updated)} fetches had no bars, "
+            f"{len(found)} are back"
+        )
@@ -0,0 +1,219 @@
+"""In-memory index of the StateIndicator thresholds.
+
+The rule set is loaded once per process and answers a lookup with a bisect,
+or classifies many stocks at once with `CompiledRules`.
+Every change to `State`/`StateIndicator` stores a new version token (see
+`stocks.signals.signals`), so the other uwsgi workers notice that their
+index is stale with a single query per analysis run.
+"""
+
+import logging
+import math
+from bisect import bisect_right
+from typing import Iterable
+from uuid import uuid4
+
+import numpy as np
+from django.db import DatabaseError, transaction
+from pandas import DataFrame
+
+from stocks.models import CacheVersion, State, StateIndicator
+
+logger = logging.getLogger(__name__)
+
+RULES_CACHE = "state_rules"
+
+
+class IntervalIndex:
+    """Maps a value to the first state whose [lower, upper) range holds it.
+
+    The thresholds split the line into elementary segments, and the winning
+    state of each segment is resolved when the index is built. Like
+    `QuerySet.first()`, the state with the lowest primary key wins when
+    ranges overlap.
+    """
+
+    def __init__(self, ranges: Iterable[tuple[float, float, int]]) -> None:
+        ranges = list(ranges)
+        self.boundaries = sorted(
+            {bound for lower, upper, _ in ranges for bound in (lower, upper)}
+        )
+        self.winners: list[int | None] = []
+        for start in self.boundaries[:-1]:
+            covering = [
+                state_id
+                for lower, upper, state_id in ranges
+                if lower <= start < upper
+            ]
+            self.winners.append(min(covering) if covering else None)
+
+    def lookup(self, value: float) -> int | None:
+        if math.isnan(value):
+            return None
+        segment = bisect_right(self.boundaries, value) - 1
+        if segment < 0 or segment >= len(self.winners):
+            return None
+        return self.winners[segment]
+
+
+class CompiledRules:
+    """All the thresholds of the states as arrays.
+
+    A state matches when every one of its indicators is within range, and
+    the state with the lowest primary key wins, like with `IntervalIndex`.
+    Indicators that are not among the classified columns are not checked,
+    so BBands% alone classifies like `IntervalIndex` does.
+    """
+
+    def __init__(
+        self, rows: Iterable[tuple[str, float, float, int]], default_id: int
+    ) -> None:
+        rows = list(rows)
+        self.indicators = sorted({row[0] for row in rows})
+        self.state_ids = np.array(sorted({row[3] for row in rows}), dtype=int)
+        self.default_id = default_id
+
+        shape = (len(self.state_ids), len(self.indicators))
+        self.lower = np.full(shape, -np.inf)
+        self.upper = np.full(shape, np.inf)
+        # Whether a state has a threshold for an indicator
+        self.constrained = np.zeros(shape, dtype=bool)
+        states = {state_id: i for i, state_id in enumerate(self.state_ids)}
+        columns = {name: j for j, name in enumerate(self.indicators)}
+        for indicator, lower, upper, state_id in rows:
+            position = states[state_id], columns[indicator]
+            self.lower[position] = lower
+            self.upper[position] = upper
+            self.constrained[position] = True
+
+    def classify(self, latest: DataFrame) -> np.ndarray:
+        """State id of each row of `latest`, one column per indicator."""
+        columns = [name for name in self.indicators if name in latest.columns]
+        return self.classify_values(latest[columns].to_numpy(float), columns)
+
+    def classify_values(
+        self, values: np.ndarray, columns: list[str]
+    ) -> np.ndarray:
+        """State id of each row of a (rows x len(columns)) array."""
+        checked = [
+            (i, self.indicators.index(name))
+            for i, name in enumerate(columns)
+            if name in self.indicators
+        ]
+        if not len(values) or not len(self.state_ids):
+            return np.full(len(values), self.default_id)
+
+        values = values[:, [i for i, _ in checked]][:, None, :]
+        rules = [j for _, j in checked]
+        lower = self.lower[:, rules]
+        upper = self.upper[:, rules]
+        constrained = self.constrained[:, rules]
+
+        # (rows, states, indicators)
+        within = (values >= lower) & (values < upper)
+        matches = (within | ~constrained).all(axis=2)
+        # States without thresholds on the checked indicators never match
+        matches &= constrained.any(axis=1)
+
+        first = matches.argmax(axis=1)
+        return np.where(
+            matches.any(axis=1), self.state_ids[first], self.default_id
+        )
+
+
+class StateRuleIndex:
+    def __init__(
+        self,
+        rows: Iterable[tuple[str, float, float, int]],
+        states: dict[int, State],
+        default: State,
+    ) -> None:
+        rows = list(rows)
+        by_indicator: dict[str, list[tuple[float, float, int]]] = {}
+        for indicator, lower, upper, state_id in rows:
+            by_indicator.setdefault(indicator, []).append(
+                (lower, upper, state_id)
+            )
+        self.indexes = {
+            indicator: IntervalIndex(ranges)
+            for indicator, ranges in by_indicator.items()
+        }
+        self.compiled = CompiledRules(rows, default.id)
+        self.states = states
+        self.default = default
+
+    def lookup(self, indicator: str, value: float) -> State | None:
+        index = self.indexes.get(indicator)
+        state_id = index.lookup(value) if index else None
+        return self.states[state_id] if state_id is not None else None
+
+    def classify(self, current_bb_percent: float) -> State:
+        return self.lookup("BBands%", current_bb_percent) or self.default
+
+    def classify_many(self, latest: DataFrame) -> list[State]:
+        return [
+            self.states[state_id]
+            for state_id in self.compiled.classify(latest)
+        ]
+
+    @classmethod
+    def load(cls) -> "StateRuleIndex":
+        rows = StateIndicator.objects.values_list(
+            "indicator__name", "lower_threshold", "upper_threshold", "state_id"
+        )
+        default, _ = State.objects.get_or_create(name="Hold")
+        return cls(rows, State.objects.in_bulk(), default)
+
+
+_cache: dict[str, object] = {}
+
+
+def _current_version() -> str | None:
+    return (
+        CacheVersion.objects.filter(name=RULES_CACHE)
+        .values_list("version", flat=True)
+        .first()
+    )
+
+
+def get_rule_index() -> StateRuleIndex:
+    """Return the rule index, reloading it if the rules changed anywhere."""
+    version = _current_version()
+    index = _cache.get("index")
+    if index is None or _cache.get("version") != version:
+        index = StateRuleIndex.load()
+        _cache.update(
+            index=index, version=version, default_id=index.default.id
+        )
+    return index  # type: ignore
+
+
+def get_default_state_id() -> int:
+    """Id of the Hold state, resolved once per process.
+
+    Unlike `get_rule_index` this does not check the version, so the
+    migrations can use it before the version table exists. A change to the
+    states anywhere drops it along with the index.
+    """
+    default_id = _cache.get("default_id")
+    if default_id is None:
+        state, _ = State.objects.get_or_create(name="Hold")
+        default_id = _cache["default_id"] = state.id
+    return default_id  # type: ignore
+
+
+def invalidate_rules() -> None:
+    """Drop the index of this process and make other processes drop theirs.
+
+    The version is a random token rather than a counter, so a rolled back
+    change can not make an old version current again.
+    """
+    _cache.clear()
+    try:
+        with transaction.atomic():
+            CacheVersion.objects.update_or_create(
+                name=RULES_CACHE, defaults={"version": uuid4().hex}
+            )
+    except DatabaseError:
+        # The migrations create the Hold state before the version table
+        logger.warning("Could not store a new version of the state rules")
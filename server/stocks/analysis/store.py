@@ -0,0 +1,250 @@
+"""On-disk columnar OHLCV history, keyed by (ticker, interval).
+
+Every key is a directory holding generations of one `.npy` file per column.
+The `CURRENT` file names the live generation and is swapped atomically, so
+readers memory-map a consistent set of columns while a writer prepares the
+next one. Several workers may write the same key at once: a writer only
+removes the generation it replaced, and the ones left over for longer than
+any write takes.
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import quote
+from uuid import uuid4
+
+import numpy as np
+from django.utils import timezone
+from pandas import DataFrame, DatetimeIndex, Timestamp, concat
+
+from stocks.analysis.periods import period_start, slice_from
+from stocks.analysis.providers import get_provider
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Relative difference between the stored and the refetched close of a closed
+# bar above which the stored bars are considered re-adjusted (dividends,
+# splits) and are downloaded again
+CLOSE_REL_TOLERANCE = 1e-6
+# Seconds after which a generation that is not current was left over by a
+# writer, longer than any write takes
+STALE_GENERATION_SECONDS = 3600
+
+
+@dataclass
+class StoredHistory:
+    history: DataFrame
+    covered_from: Timestamp
+
+
+class HistoryStore:
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def _key_dir(self, ticker: str, interval: str) -> Path:
+        return self.root / interval / quote(ticker, safe="")
+
+    def read(self, ticker: str, interval: str) -> StoredHistory | None:
+        key_dir = self._key_dir(ticker, interval)
+        try:
+            generation = key_dir / (key_dir / "CURRENT").read_text()
+            meta = json.loads((generation / "meta.json").read_text())
+            index = np.load(generation / "index.npy", mmap_mode="r")
+            columns = {
+                column: np.load(generation / f"{column}.npy", mmap_mode="r")
+                for column in COLUMNS
+            }
+        except FileNotFoundError:
+            # Not stored yet, or the generation was replaced while reading
+            return None
+
+        datetimes = DatetimeIndex(np.asarray(index).view("datetime64[ns]"))
+        if meta["tz"]:
+            datetimes = datetimes.tz_localize("UTC").tz_convert(meta["tz"])
+        return StoredHistory(
+            history=DataFrame(columns, index=datetimes, copy=False),
+            covered_from=Timestamp(meta["covered_from"]),
+        )
+
+    def write(
+        self,
+        ticker: str,
+        interval: str,
+        history: DataFrame,
+        covered_from: Timestamp,
+    ) -> None:
+        """Make the bars of `history` from `covered_from` on current.
+
+        A failed write leaves the stored bars as they were.
+        """
+        key_dir = self._key_dir(ticker, interval)
+        generation = key_dir / uuid4().hex
+        try:
+            self._write_generation(
+                generation, slice_from(history, covered_from), covered_from
+            )
+            current = key_dir / "CURRENT"
+            try:
+                replaced = current.read_text()
+            except FileNotFoundError:
+                replaced = None
+            pointer = key_dir / f"CURRENT.{generation.name}"
+            pointer.write_text(generation.name)
+            os.replace(pointer, current)
+        except OSError as e:
+            logger.error(f"Failed to store {ticker} {interval} bars: {e}")
+            shutil.rmtree(generation, ignore_errors=True)
+            return
+        self._remove_old_generations(key_dir, generation, replaced)
+
+    @staticmethod
+    def _write_generation(
+        generation: Path, history: DataFrame, covered_from: Timestamp
+    ) -> None:
+        generation.mkdir(parents=True)
+        index = DatetimeIndex(history.index)
+        tz = str(index.tz) if index.tz else None
+        utc = index.tz_convert(None) if index.tz else index
+        np.save(
+            generation / "index.npy",
+            utc.to_numpy(dtype="datetime64[ns]").view(np.int64),
+        )
+        for column in COLUMNS:
+            np.save(
+                generation / f"{column}.npy",
+                history[column].to_numpy(dtype=np.float64),
+            )
+        (generation / "meta.json").write_text(
+            json.dumps({"tz": tz, "covered_from": covered_from.isoformat()})
+        )
+
+    @staticmethod
+    def _remove_old_generations(
+        key_dir: Path, generation: Path, replaced: str | None
+    ) -> None:
+        """Remove the `replaced` generation and the stale ones, but not the
+        ones other writers are still preparing."""
+        stale_before = time.time() - STALE_GENERATION_SECONDS
+        for path in key_dir.iterdir():
+            if not path.is_dir() or path == generation:
+                continue
+            try:
+                old = (
+                    path.name == replaced
+                    or path.stat().st_mtime < stale_before
+                )
+            except FileNotFoundError:
+                continue
+            if old:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def get_history(
+        self, ticker: str, interval: str, period: str
+    ) -> DataFrame:
+        """Return `period` of bars, downloading only what is not stored."""
+        history = self.update_history(ticker, interval, period)
+        if history is not None:
+            return history
+
+        history = get_provider().history(
+            ticker, period=period, interval=interval
+        )
+        return self.save_history(ticker, interval, period, history)
+
+    def update_history(
+        self,
+        ticker: str,
+        interval: str,
+        period: str,
+        start: Timestamp | None = None,
+    ) -> DataFrame | None:
+        """Bring the stored bars up to date, if they cover `period`.
+
+        `start` narrows the bars needed to a shorter window than `period`.
+        The download restarts at the second to last stored bar: the last one
+        may have been still forming and is replaced, the one before is closed
+        and must match, otherwise the stored bars are downloaded again.
+        Returns None when the whole window has to be downloaded.
+        """
+        now = Timestamp(timezone.now())
+        if start is None:
+            start = period_start(period, now)
+
+        stored = self.read(ticker, interval)
+        if not stored or stored.covered_from > start:
+            return None
+        if len(stored.history) < 2:
+            return None
+
+        history = self._update(ticker, interval, stored, now)
+        if history is None:
+            return None
+        if history is not stored.history:
+            # Bars older than `period` are no longer needed
+            covered_from = max(stored.covered_from, period_start(period, now))
+            self.write(ticker, interval, history, covered_from)
+        return slice_from(history, start)
+
+    def save_history(
+        self,
+        ticker: str,
+        interval: str,
+        period: str,
+        history: DataFrame,
+        start: Timestamp | None = None,
+    ) -> DataFrame:
+        """Store a freshly downloaded window of bars.
+
+        The window is `period`, or starts at `start` when one is given.
+        """
+        if history.empty:
+            return history
+        if start is None:
+            start = period_start(period, timezone.now())
+        history = history[COLUMNS]
+        self.write(ticker, interval, history, start)
+        return slice_from(history, start)
+
+    def _update(
+        self,
+        ticker: str,
+        interval: str,
+        stored: StoredHistory,
+        now: Timestamp,
+    ) -> DataFrame | None:
+        history = stored.history
+        overlap_from = history.index[-2]
+        try:
+            fetched = get_provider().history(
+                ticker,
+                start=overlap_from,
+                end=now + timedelta(days=1),
+                interval=interval,
+                raise_errors=True,
+            )
+        except Exception as e:
+            logger.error(f"Failed to update {ticker} {interval}: {e}")
+            return None
+
+        if fetched.empty:
+            return history
+        if overlap_from not in fetched.index or not math.isclose(
+            fetched["Close"].loc[overlap_from],
+            history["Close"].iloc[-2],
+            rel_tol=CLOSE_REL_TOLERANCE,
+        ):
+            logger.info(f"Stored {ticker} {interval} bars were re-adjusted")
+            return None
+
+        return concat(
+            [history.loc[history.index < overlap_from], fetched[COLUMNS]]
+        )
@@ -0,0 +1,214 @@
+"""End-to-end benchmark of a `TriggerAnalysis` run.
+
+N stocks with one subscriber each are seeded in a transaction that is rolled
+back afterwards. The job queued by the endpoint is run in this process, bars
+come from the replay provider and Telegram is replaced with a local fake,
+and the time and queries of every stage of the run are recorded.
+"""
+
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import wraps
+from importlib import import_module
+from typing import Callable
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from core.models import UserAPIKey, UserProfile
+from stocks.analysis.benchmark import seed_rules
+from stocks.analysis.jobs import execute_job, start_job
+from stocks.models import AnalysisJob, Stock, Subscription, default_state
+from stocks.signals import signals
+from stocks.views import TriggerAnalysis
+
+STAGES = ["fetch", "compute", "classify", "db_write", "chart", "send"]
+# Far from the ids of real Telegram users
+FAKE_TELEGRAM_ID_BASE = 1_900_000_000
+_DONE = object()
+
+
+class FakeTelegramAPI:
+    def __init__(self, *_, **__) -> None:
+        self.sent = 0
+
+    def send_photo_from_buffer(self, *_, **__) -> None:
+        self.sent += 1
+
+
+class StageRecorder:
+    """Time, calls and queries spent in each stage of the run."""
+
+    def __init__(self, queries: CaptureQueriesContext) -> None:
+        self.queries = queries
+        self.stages: dict[str, dict[str, float]] = defaultdict(
+            lambda: {"seconds": 0.0, "calls": 0, "queries": 0}
+        )
+
+    def wrap(self, stage: str, function: Callable) -> Callable:
+        @wraps(function)
+        def timed(*args, **kwargs):
+            queries = len(self.queries)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record = self.stages[stage]
+                record["seconds"] += time.perf_counter() - start
+                record["calls"] += 1
+                record["queries"] += len(self.queries) - queries
+
+        return timed
+
+    def wrap_iterator(self, stage: str, function: Callable) -> Callable:
+        """`wrap` for generators, timing each step instead of the call.
+
+        Only the time the caller waits for the next item is recorded.
+        """
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            iterator = iter(function(*args, **kwargs))
+            step = self.wrap(stage, lambda: next(iterator, _DONE))
+            while (item := step()) is not _DONE:
+                yield item
+
+        return timed
+
+
+def seed_subscriptions(count: int) -> None:
+    """`count` stocks, each with a subscription and one Telegram user."""
+    stocks = Stock.objects.bulk_create(
+        [Stock(ticker=f"BENCH{i}") for i in range(count)]
+    )
+    # bulk_create does not send the post_save creating the profiles
+    users = User.objects.bulk_create(
+        [User(username=f"bench-user-{i}") for i in range(count)]
+    )
+    UserProfile.objects.bulk_create(
+        [
+            UserProfile(user=user, telegram_id=FAKE_TELEGRAM_ID_BASE + i)
+            for i, user in enumerate(users)
+        ]
+    )
+    hold = default_state()
+    subscriptions = Subscription.objects.bulk_create(
+        [Subscription(stock=stock, state_id=hold) for stock in stocks]
+    )
+    Subscription.users.through.objects.bulk_create(
+        [
+            Subscription.users.through(subscription=sub, user=user)
+            for sub, user in zip(subscriptions, users)
+        ]
+    )
+
+
+def _patches(recorder: StageRecorder, telegram: FakeTelegramAPI) -> list:
+    def wrapped(target: str, stage: str, wrap=recorder.wrap):
+        module, name = target.rsplit(".", 1)
+        original = getattr(import_module(module), name)
+        return patch(target, wrap(stage, original))
+
+    return [
+        patch.object(
+            telegram,
+            "send_photo_from_buffer",
+            recorder.wrap("send", telegram.send_photo_from_buffer),
+        ),
+        wrapped("stocks.analysis.pipeline.split_due", "fetch"),
+        wrapped(
+            "stocks.analysis.pipeline.iter_histories",
+            "fetch",
+            recorder.wrap_iterator,
+        ),
+        wrapped("stocks.analysis.pipeline.fetch_history", "fetch"),
+        wrapped("stocks.analysis.pipeline.latest_indicators", "compute"),
+        wrapped("stocks.analysis.pipeline.batch_latest_indicators", "compute"),
+        wrapped("stocks.analysis.pipeline.add_indicators", "compute"),
+        wrapped("stocks.analysis.pipeline.get_rule_index", "classify"),
+        wrapped("stocks.analysis.pipeline.analyse_stocks", "classify"),
+        patch.object(
+            Subscription,
+            "save",
+            recorder.wrap("db_write", Subscription.save),
+        ),
+        wrapped("stocks.analysis.pipeline.mark_analysed", "db_write"),
+        wrapped("stocks.signals.signals.get_fig_buffer", "chart"),
+        patch.object(signals, "TelegramAPI", lambda *_: telegram),
+    ]
+
+
+def run_trigger_benchmark(
+    count: int,
+    batch_mode: bool = False,
+    lookback_precision: float | None = None,
+    replay_dir: str | None = None,
+    latency: float = 0.0,
+    fetch_workers: int = 0,
+) -> dict:
+    """Seed `count` subscriptions, run the analysis once and roll back.
+
+    Bars are replayed from `replay_dir`, or synthetic, after `latency`
+    seconds per request, by `fetch_workers` threads without rate limit and
+    with a fixed concurrency.
+    """
+    with transaction.atomic():
+        seed_rules()
+        seed_subscriptions(count)
+        user = User.objects.create_user(username="bench-api")
+        _, key = UserAPIKey.objects.create_key(name="bench", user=user)
+        request = APIRequestFactory().get(
+            "/api/analysis/", HTTP_AUTHORIZATION=f"Api-Key {key}"
+        )
+
+        telegram = FakeTelegramAPI()
+        with CaptureQueriesContext(
+            connection
+        ) as queries, ExitStack() as stack:
+            recorder = StageRecorder(queries)
+            stack.enter_context(
+                override_settings(
+                    STOCKS_HISTORY_DIR=None,
+                    ANALYSIS_BATCH_MODE=batch_mode,
+                    ANALYSIS_LOOKBACK_PRECISION=lookback_precision,
+                    MARKET_DATA_PROVIDER="replay",
+                    MARKET_DATA_REPLAY_DIR=replay_dir,
+                    MARKET_DATA_REPLAY_LATENCY=latency,
+                    ANALYSIS_FETCH_WORKERS=fetch_workers,
+                    MARKET_DATA_RATE_LIMIT=0,
+                    MARKET_DATA_MIN_CONCURRENCY=max(fetch_workers, 1),
+                    MARKET_DATA_MAX_CONCURRENCY=max(fetch_workers, 1),
+                )
+            )
+            for patcher in _patches(recorder, telegram):
+                stack.enter_context(patcher)
+
+            start = time.perf_counter()
+            response = TriggerAnalysis.as_view()(request)
+            job = AnalysisJob.objects.get(pk=response.data["job"])
+            start_job(job, "benchmark")
+            execute_job(job)
+            total = time.perf_counter() - start
+
+        subscriptions = Subscription.objects.count()
+        transaction.set_rollback(True)
+
+    stages = {stage: dict(recorder.stages[stage]) for stage in STAGES}
+    return {
+        "subscriptions": subscriptions,
+        "status": job.status,
+        "skipped": (job.result or {}).get("skipped", 0),
+        "created_at": timezone.now().isoformat(),
+        "seconds": total,
+        "queries": len(queries),
+        "messages": telegram.sent,
+        "stages": stages,
+        "other_seconds": total
+        - sum(stage["seconds"] for stage in stages.values()),
+    }
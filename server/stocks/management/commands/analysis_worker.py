@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stocks.analysis.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run the queued analysis jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=settings.ANALYSIS_JOB_POLL,
+            help="Seconds between two checks of an empty queue",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        runs = run_worker(options["poll"], once=options["once"])
+        self.stdout.write(self.style.SUCCESS(f"Ran {runs} analysis jobs."))
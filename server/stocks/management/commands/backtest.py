@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from stocks.analysis.backtest import backtest, summarize
+from stocks.analysis.batch import fetch_tickers
+from stocks.models import Stock
+
+
+class Command(BaseCommand):
+    help = "Replay the state rules over the history of stocks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tickers",
+            nargs="*",
+            help="Tickers to backtest, all stocks by default",
+        )
+        parser.add_argument("--period", default="5y")
+        parser.add_argument("--interval", default="1d")
+        parser.add_argument(
+            "--transitions",
+            action="store_true",
+            help="Print the state transitions of every ticker",
+        )
+
+    def handle(self, *args, **options):
+        tickers = options["tickers"] or list(
+            Stock.objects.values_list("ticker", flat=True)
+        )
+        histories = {
+            ticker: history
+            for ticker, history in fetch_tickers(
+                tickers, options["period"], options["interval"]
+            ).items()
+            if not history.empty
+        }
+        missing = sorted(set(tickers) - histories.keys())
+        if missing:
+            self.stderr.write(f"No history for {', '.join(missing)}")
+
+        transitions = backtest(histories)
+        if options["transitions"]:
+            for ticker, frame in transitions.items():
+                self.stdout.write(f"{ticker}\n{frame.to_string()}\n")
+
+        self.stdout.write(summarize(transitions).to_string())
+        self.stdout.write(
+            self.style.SUCCESS(f"Backtested {len(histories)} tickers.")
+        )
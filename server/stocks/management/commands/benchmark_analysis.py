@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from stocks.analysis.benchmark import (
+    BENCHMARKS,
+    SCENARIOS,
+    benchmark_report,
+    compare,
+    run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the analysis functions on synthetic histories"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--functions", nargs="+", choices=list(BENCHMARKS), default=None
+        )
+        parser.add_argument(
+            "--scenarios", nargs="+", choices=list(SCENARIOS), default=None
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="analysis_benchmark.json")
+        parser.add_argument(
+            "--baseline",
+            default=None,
+            help="Earlier output to compare the median timings with",
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            functions=options["functions"],
+            scenarios=options["scenarios"],
+            repeat=options["repeat"],
+            seed=options["seed"],
+        )
+        report = benchmark_report(results)
+        with open(options["output"], "w") as file:
+            json.dump(report, file, indent=2)
+
+        for result in results:
+            self.stdout.write(
+                f"{result.function:<28}{result.scenario:<10}"
+                f"{result.median * 1000:>10.3f} ms"
+                f"{result.peak_memory / 1024:>12.1f} KiB"
+            )
+
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+            for function, scenario, ratio in compare(report, baseline):
+                self.stdout.write(
+                    f"{function:<28}{scenario:<10}{ratio:>10.2f}x baseline"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results."))
@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from stocks.analysis.trigger_benchmark import STAGES, run_trigger_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark a whole TriggerAnalysis run with replayed market data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[100, 1000, 10000],
+            help="Numbers of subscriptions to seed",
+        )
+        parser.add_argument("--batch-mode", action="store_true")
+        parser.add_argument("--lookback-precision", type=float, default=None)
+        parser.add_argument(
+            "--replay-dir",
+            default=None,
+            help="Recorded bars to replay, synthetic ones otherwise",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds every market data request takes",
+        )
+        parser.add_argument(
+            "--fetch-workers",
+            type=int,
+            default=0,
+            help="Threads fetching one ticker each, batch downloads if 0",
+        )
+        parser.add_argument(
+            "--output", default="trigger_analysis_benchmark.json"
+        )
+
+    def handle(self, *args, **options):
+        runs = []
+        for size in options["sizes"]:
+            run = run_trigger_benchmark(
+                size,
+                batch_mode=options["batch_mode"],
+                lookback_precision=options["lookback_precision"],
+                replay_dir=options["replay_dir"],
+                latency=options["latency"],
+                fetch_workers=options["fetch_workers"],
+            )
+            runs.append(run)
+
+            stages = "  ".join(
+                f"{stage} {run['stages'][stage]['seconds']:.2f}s"
+                f"/{run['stages'][stage]['queries']}q"
+                for stage in STAGES
+            )
+            self.stdout.write(
+                f"{run['subscriptions']:>6} subscriptions: "
+                f"{run['seconds']:.2f}s, {run['queries']} queries, "
+                f"{run['messages']} messages  ({stages})"
+            )
+
+        with open(options["output"], "w") as file:
+            json.dump({"runs": runs}, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
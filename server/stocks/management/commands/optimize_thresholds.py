@@ -0,0 +1,155 @@
+import json
+import math
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.analysis.batch import fetch_tickers
+from stocks.analysis.optimize import (
+    MIN_SIGNALS,
+    Rule,
+    grid_candidates,
+    optimize_thresholds,
+    random_candidates,
+)
+from stocks.analysis.rules import get_rule_index
+from stocks.models import Stock, StateIndicator
+
+
+class Command(BaseCommand):
+    help = (
+        "Search the StateIndicator thresholds that would have signalled best"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tickers",
+            nargs="*",
+            help="Tickers to optimize over, all stocks by default",
+        )
+        parser.add_argument("--period", default="5y")
+        parser.add_argument("--interval", default="1d")
+        parser.add_argument(
+            "--mode", choices=["random", "grid"], default="random"
+        )
+        parser.add_argument(
+            "--candidates",
+            type=int,
+            default=1000,
+            help="Random candidates, or the most a grid may have",
+        )
+        parser.add_argument(
+            "--steps", type=int, default=3, help="Grid moves per threshold"
+        )
+        parser.add_argument(
+            "--span",
+            type=float,
+            default=0.5,
+            help="Largest move, relative to the width of a range",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--min-signals", type=int, default=MIN_SIGNALS)
+        parser.add_argument("--output", default="threshold_report.json")
+
+    def handle(self, *args, **options):
+        rows = list(
+            StateIndicator.objects.select_related(
+                "state", "indicator"
+            ).order_by("state_id", "indicator__name")
+        )
+        if not rows:
+            raise CommandError("There are no thresholds to optimize")
+        rules = [
+            Rule(row.state_id, row.state.name, row.indicator.name)
+            for row in rows
+        ]
+        base = np.array(
+            [[row.lower_threshold, row.upper_threshold] for row in rows]
+        )
+
+        if options["mode"] == "grid":
+            size = options["steps"] ** base.size
+            if size > options["candidates"]:
+                raise CommandError(
+                    f"The grid has {size} candidates, more than "
+                    f"--candidates {options['candidates']}"
+                )
+            candidates = grid_candidates(
+                base, options["steps"], options["span"]
+            )
+        else:
+            candidates = random_candidates(
+                base,
+                options["candidates"],
+                options["span"],
+                seed=options["seed"],
+            )
+
+        tickers = options["tickers"] or list(
+            Stock.objects.values_list("ticker", flat=True)
+        )
+        histories = {
+            ticker: history
+            for ticker, history in fetch_tickers(
+                tickers, options["period"], options["interval"]
+            ).items()
+            if not history.empty
+        }
+        if not histories:
+            raise CommandError("No history to optimize over")
+
+        results = optimize_thresholds(
+            histories,
+            rules,
+            [base, *candidates],
+            get_rule_index().default.id,
+            workers=options["workers"],
+            top=None,
+            min_signals=options["min_signals"],
+        )
+
+        report = {
+            "tickers": sorted(histories),
+            "period": options["period"],
+            "interval": options["interval"],
+            "baseline": next(
+                (
+                    self._describe(result, rules)
+                    for result in results
+                    if result[2] is base
+                ),
+                None,
+            ),
+            "top": [
+                self._describe(result, rules)
+                for result in results[: options["top"]]
+            ],
+        }
+        with open(options["output"], "w") as file:
+            json.dump(report, file, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote the top {len(report['top'])} thresholds to "
+                f"{options['output']}."
+            )
+        )
+
+    @staticmethod
+    def _describe(result, rules: list[Rule]) -> dict:
+        score, signals, candidate = result
+        return {
+            "score": score if math.isfinite(score) else None,
+            "signals": signals,
+            "thresholds": [
+                {
+                    "state": rule.state,
+                    "indicator": rule.indicator,
+                    "lower": float(lower),
+                    "upper": float(upper),
+                }
+                for rule, (lower, upper) in zip(rules, candidate)
+            ],
+        }
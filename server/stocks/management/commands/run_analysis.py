@@ -0,0 +1,109 @@
+import cProfile
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from stocks.analysis.due import due_at
+from stocks.analysis.periods import INTERVAL_DURATIONS
+from stocks.analysis.pipeline import Progress, run_analysis
+from stocks.models import Subscription
+
+
+class Command(BaseCommand):
+    help = "Run the analysis of the subscriptions in this process"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Threads fetching one ticker each, batch downloads if 0",
+        )
+        parser.add_argument(
+            "--tickers", nargs="+", default=None, help="Only these stocks"
+        )
+        parser.add_argument(
+            "--interval",
+            choices=list(INTERVAL_DURATIONS),
+            default=None,
+            help="Only the subscriptions of this interval",
+        )
+        parser.add_argument(
+            "--subscriptions",
+            nargs="+",
+            type=int,
+            default=None,
+            help="Only these subscription ids",
+        )
+        parser.add_argument(
+            "--profile",
+            default=None,
+            help="File to write the cProfile stats of the run to",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Write the result and when each subscription is due again "
+            "as JSON",
+        )
+
+    def handle(self, *args, **options):
+        subscriptions = Subscription.objects.select_related("stock", "state")
+        if options["tickers"] is not None:
+            subscriptions = subscriptions.filter(
+                stock__ticker__in=options["tickers"]
+            )
+        if options["interval"] is not None:
+            subscriptions = subscriptions.filter(interval=options["interval"])
+        if options["subscriptions"] is not None:
+            subscriptions = subscriptions.filter(
+                pk__in=options["subscriptions"]
+            )
+        subscriptions = list(subscriptions)
+
+        progress = Progress()
+        profiler = cProfile.Profile() if options["profile"] else None
+        if profiler:
+            profiler.enable()
+        try:
+            result = run_analysis(
+                subscriptions, progress, workers=options["workers"]
+            )
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(options["profile"])
+
+        if options["json"]:
+            now = timezone.now()
+            delay = timedelta(minutes=settings.ANALYSIS_BAR_DELAY)
+            self.stdout.write(
+                json.dumps(
+                    {
+                        "result": result,
+                        "timings": progress.timings,
+                        "due": {
+                            sub.pk: due_at(sub, now, delay).isoformat()
+                            for sub in subscriptions
+                        },
+                    }
+                )
+            )
+            return
+
+        timings = "  ".join(
+            f"{stage} {seconds:.2f}s"
+            for stage, seconds in progress.timings.items()
+        )
+        self.stdout.write(f"{len(subscriptions)} subscriptions  ({timings})")
+        if options["profile"]:
+            self.stdout.write(f"Wrote the profile to {options['profile']}.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Analysed {result['analysed']}, skipped {result['skipped']}, "
+                f"{result['changed']} changed."
+            )
+        )
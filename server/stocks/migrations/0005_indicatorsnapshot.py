@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0004_remove_stock_state_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndicatorSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_bar_at", models.DateTimeField()),
+                ("state", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "subscription",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="indicator_snapshot",
+                        to="stocks.subscription",
+                    ),
+                ),
+            ],
+        ),
+    ]
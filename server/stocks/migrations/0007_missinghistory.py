@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0006_cacheversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MissingHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ticker", models.CharField(max_length=10)),
+                ("interval", models.CharField(max_length=10)),
+                ("misses", models.PositiveIntegerField(default=0)),
+                ("recheck_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "unique_together": {("ticker", "interval")},
+            },
+        ),
+    ]
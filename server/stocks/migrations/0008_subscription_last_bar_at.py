@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0007_missinghistory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="last_bar_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="subscription",
+            name="last_trade_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0008_subscription_last_bar_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="analysed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0010_analysisjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="analysis_job",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="stocks.analysisjob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="subscription",
+            name="leased_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
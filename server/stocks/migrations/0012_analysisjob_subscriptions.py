@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0011_subscription_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisjob",
+            name="subscriptions",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0012_analysisjob_subscriptions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisjob",
+            name="fetch_stats",
+            field=models.JSONField(default=dict),
+        ),
+    ]
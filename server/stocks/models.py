@@ -3,8 +3,10 @@ from django.db import models
 
 
 def default_state():
-    state, _ = State.objects.get_or_create(name="Hold")
-    return state.id
+    # Imported here, the rules are built on these models
+    from stocks.analysis.rules import get_default_state_id
+
+    return get_default_state_id()
 
 
 class Indicator(models.Model):
@@ -67,9 +69,101 @@ class Subscription(models.Model):
     period = models.CharField(max_length=10, default="6mo")
     interval = models.CharField(max_length=10, default="1d")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Start of the last analysis, its last bar and the last trade known at
+    # that time
+    analysed_at = models.DateTimeField(null=True, blank=True)
+    last_bar_at = models.DateTimeField(null=True, blank=True)
+    last_trade_at = models.DateTimeField(null=True, blank=True)
+    # Last analysis job that leased it, and until when unless it is done
+    analysis_job = models.ForeignKey(
+        "AnalysisJob",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    leased_until = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = (("stock", "period", "interval"),)
 
     def __str__(self):
         return f"{self.stock} {self.interval}/{self.period}"
+
+
+class IndicatorSnapshot(models.Model):
+    subscription = models.OneToOneField(
+        Subscription,
+        on_delete=models.CASCADE,
+        related_name="indicator_snapshot",
+    )
+    last_bar_at = models.DateTimeField()
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.subscription} @ {self.last_bar_at}"
+
+
+class CacheVersion(models.Model):
+    """Version token of a cache held in the memory of each worker."""
+
+    name = models.CharField(max_length=50, unique=True)
+    version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} {self.version}"
+
+
+class MissingHistory(models.Model):
+    """A (ticker, interval) whose last fetches returned no bars."""
+
+    ticker = models.CharField(max_length=10)
+    interval = models.CharField(max_length=10)
+    misses = models.PositiveIntegerField(default=0)
+    # Not fetched again before this time
+    recheck_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (("ticker", "interval"),)
+
+    def __str__(self):
+        return f"{self.ticker} {self.interval} ({self.misses} misses)"
+
+
+class AnalysisJob(models.Model):
+    """One run of the analysis of the subscriptions, done by workers."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.QUEUED,
+        db_index=True,
+    )
+    # Stage being run, counts of the subscriptions done so far and seconds
+    # spent in each stage
+    stage = models.CharField(max_length=20, blank=True)
+    # Ids of the subscriptions to analyse, all of them when null
+    subscriptions = models.JSONField(null=True, blank=True)
+    progress = models.JSONField(default=dict)
+    timings = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Limiter snapshot of each worker, see `AdaptiveLimiter.snapshot`
+    fetch_stats = models.JSONField(default=dict)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Analysis job {self.pk} ({self.status})"
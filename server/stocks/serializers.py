@@ -2,7 +2,7 @@ from core.serializers import UserProfileForUserSerializer
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from stocks.models import Stock, Subscription
+from stocks.models import AnalysisJob, Stock, Subscription
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -42,3 +42,9 @@ class TelegramSubscriptionSerializerUnsubscribe(serializers.Serializer):
 
     class Meta:
         fields = ("ticker", "telegram_id")
+
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AnalysisJob
+        fields = "__all__"
@@ -2,9 +2,11 @@ import logging
 
 from pandas import DataFrame
 
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import Signal, receiver
 from stocks.analysis.functions import get_fig_buffer
-from stocks.models import Subscription, State
+from stocks.analysis.rules import invalidate_rules
+from stocks.models import Subscription, State, StateIndicator
 from stocks.signals.classes import TelegramAPI
 
 from server.settings import TELEGRAM_TOKEN
@@ -60,3 +62,11 @@ def send_telegram_notification(
         )
         telegram_api.send_photo_from_buffer(telegram_id, buffer, message)
         logger.info(f"Sent message to {telegram_id}")
+
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=StateIndicator)
+@receiver(post_delete, sender=StateIndicator)
+def invalidate_state_rules(**_):
+    invalidate_rules()
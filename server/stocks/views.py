@@ -1,7 +1,11 @@
 import logging
+from datetime import timedelta
 
 from pandas import DataFrame
 
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -10,12 +14,16 @@ from rest_framework.views import APIView
 from core.models import UserProfile
 from core.views import APIkeyViewSet, HasAPIKey
 
-from stocks.analysis.functions import (
-    analyse_stock,
-    get_stock_history,
-)
-from stocks.models import Stock, Subscription, State
+from stocks.analysis.backtest import backtest, summarize
+from stocks.analysis.batch import fetch_tickers
+from stocks.analysis.due import due_at
+from stocks.analysis.functions import analyse_stocks, get_stock_history
+from stocks.analysis.jobs import enqueue_analysis
+from stocks.analysis.periods import INTERVAL_DURATIONS, PERIOD_OFFSETS
+from stocks.analysis.rules import get_rule_index
+from stocks.models import AnalysisJob, Stock, Subscription
 from stocks.serializers import (
+    AnalysisJobSerializer,
     SubscriptionSerializer,
     TelegramSubscriptionSerializer,
     TelegramSubscriptionSerializerUnsubscribe,
@@ -162,41 +170,95 @@ class TelegramSubscriptionViewSet(
 
 
 class TriggerAnalysis(APIView):
+    """Queue an analysis of the subscriptions for the analysis workers.
+
+    A POST only queues the ids in its `subscriptions` list, a GET all of
+    them. The response tells when each of them is due again.
+    """
+
     permission_classes = [HasAPIKey]
 
-    # TODO: Make this async
-    def get(self, _, format=None):
-        active_subscriptions = Subscription.objects.all()
-        if active_subscriptions.count() == 0:
+    def get(self, request, format=None):
+        return self.trigger(None)
+
+    def post(self, request, format=None):
+        ids = request.data.get("subscriptions")
+        if not isinstance(ids, list) or not all(
+            isinstance(pk, int) for pk in ids
+        ):
+            return Response(
+                {"error": "Subscriptions must be a list of ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return self.trigger(ids)
+
+    def trigger(self, ids: list[int] | None) -> Response:
+        active_subscriptions = Subscription.objects.select_related("stock")
+        if ids is not None:
+            active_subscriptions = active_subscriptions.filter(pk__in=ids)
+        subscriptions = list(active_subscriptions)
+        if not subscriptions:
             logger.info("No active subscriptions")
             return Response(
                 status=status.HTTP_200_OK,
                 data={"message": "No active subscriptions"},
             )
 
-        for sub in active_subscriptions:
-            logger.info(f"Analyzing {sub.stock.ticker}")
-            history: DataFrame = get_stock_history(sub)
-            if history.empty:
-                logger.error(f"Failed to get history for {sub.stock.ticker}")
-                continue
+        job, created = enqueue_analysis(ids)
+        logger.info(
+            f"Queued analysis job {job.pk}"
+            if created
+            else f"Analysis job {job.pk} is already queued"
+        )
+        now = timezone.now()
+        delay = timedelta(minutes=settings.ANALYSIS_BAR_DELAY)
+        return Response(
+            status=status.HTTP_202_ACCEPTED,
+            data={
+                "message": "queued" if created else "already queued",
+                "job": job.pk,
+                "due": {
+                    sub.pk: due_at(sub, now, delay).isoformat()
+                    for sub in subscriptions
+                },
+            },
+        )
 
-            current_bbands_percent = history["BBands%"].iloc[-1]
-            new_state = analyse_stock(current_bbands_percent)
 
-            if new_state != sub.state:
-                sub.state = new_state
-                sub.save()
-                logger.info(
-                    f"{sub.stock} {sub.interval}/{sub.period} has new state: {new_state}"
-                )
-                analytics_done.send(
-                    sender=Subscription.__class__,
-                    instance=sub,
-                    history=history,
-                )
+class AnalysisSchedule(APIView):
+    """When each subscription is due, after the next bar since its last
+    analysis, now when it was never analysed."""
+
+    permission_classes = [HasAPIKey]
+
+    def get(self, request, format=None):
+        now = timezone.now()
+        delay = timedelta(minutes=settings.ANALYSIS_BAR_DELAY)
+        return Response(
+            status=status.HTTP_200_OK,
+            data={
+                "subscriptions": {
+                    sub.pk: (
+                        due_at(sub, sub.analysed_at, delay)
+                        if sub.analysed_at
+                        else now
+                    ).isoformat()
+                    for sub in Subscription.objects.select_related("stock")
+                }
+            },
+        )
 
-        return Response(status=status.HTTP_200_OK, data={"message": "success"})
+
+class AnalysisJobStatus(APIView):
+    """Status, progress and stage timings of an analysis job."""
+
+    permission_classes = [HasAPIKey]
+
+    def get(self, request, pk, format=None):
+        job = get_object_or_404(AnalysisJob, pk=pk)
+        return Response(
+            status=status.HTTP_200_OK, data=AnalysisJobSerializer(job).data
+        )
 
 
 class TriggerUserAnalysis(APIView):
@@ -216,6 +278,7 @@ class TriggerUserAnalysis(APIView):
                 data={"message": "No active subscriptions"},
             )
 
+        rules = get_rule_index()
         for sub in active_subscriptions:
             logger.info(f"Analyzing {sub.stock.ticker}")
             history: DataFrame = get_stock_history(sub)
@@ -223,10 +286,9 @@ class TriggerUserAnalysis(APIView):
                 logger.error(f"Failed to get history for {sub.stock.ticker}")
                 continue
 
-            current_bbands_percent = history["BBands%"].iloc[-1]
-            new_state = analyse_stock(current_bbands_percent)
+            new_state = analyse_stocks(history.iloc[[-1]], rules)[0]
 
-            if new_state != State.objects.get(name="Hold"):
+            if new_state != rules.default:
                 analytics_done.send(
                     sender=Subscription.__class__,
                     instance=sub,
@@ -236,3 +298,74 @@ class TriggerUserAnalysis(APIView):
                 )
 
         return Response(status=status.HTTP_200_OK, data={"message": "success"})
+
+
+class Backtest(APIView):
+    permission_classes = [HasAPIKey]
+
+    def get(self, request, format=None):
+        tickers = [
+            ticker.strip().upper()
+            for ticker in request.GET.get("tickers", "").split(",")
+            if ticker.strip()
+        ]
+        period = request.GET.get("period", "5y")
+        interval = request.GET.get("interval", "1d")
+        if not tickers:
+            return Response(
+                {"error": "Tickers are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if period not in PERIOD_OFFSETS or interval not in INTERVAL_DURATIONS:
+            return Response(
+                {"error": "Invalid period or interval"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        histories = {
+            ticker: history
+            for ticker, history in fetch_tickers(
+                tickers, period, interval
+            ).items()
+            if not history.empty
+        }
+        transitions = backtest(histories)
+
+        return Response(
+            status=status.HTTP_200_OK,
+            data={
+                "summary": summarize(transitions)
+                .rename_axis("State")
+                .reset_index()
+                .to_dict("records"),
+                "transitions": {
+                    ticker: [
+                        {"time": time.isoformat(), **row}
+                        for time, row in frame.to_dict("index").items()
+                    ]
+                    for ticker, frame in transitions.items()
+                },
+                "missing": sorted(set(tickers) - histories.keys()),
+            },
+        )
+
+
+class FetchStats(APIView):
+    """Concurrency limit and per-host statistics of the fetches of each
+    worker of the last analysis job, as they saved them with it."""
+
+    permission_classes = [HasAPIKey]
+
+    def get(self, request, format=None):
+        job = (
+            AnalysisJob.objects.exclude(fetch_stats={})
+            .order_by("-updated_at")
+            .first()
+        )
+        return Response(
+            status=status.HTTP_200_OK,
+            data={
+                "job": job.pk if job else None,
+                "workers": job.fetch_stats if job else {},
+            },
+        )
@@ -1,8 +1,40 @@
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, date_range
+
 from core.models import UserAPIKey, UserProfile
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 
 
+def make_bars(
+    bars: int = 0,
+    start: str = "2023-01-02",
+    seed: int = 0,
+    freq: str = "D",
+    tz: str | None = "UTC",
+    index: DatetimeIndex | None = None,
+) -> DataFrame:
+    """Seeded OHLCV bars following a geometric random walk.
+
+    There are `bars` of them every `freq` from `start`, or one on every
+    timestamp of `index` when it is given. The volume is 10 on every bar.
+    """
+    if index is None:
+        index = date_range(start, periods=bars, freq=freq, tz=tz)
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+    return DataFrame(
+        {
+            "Open": close,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": 10.0,
+        },
+        index=index,
+    )
+
+
 class APIBaseTest(APITestCase):
     def setUp(self):
         self.super_user = User.objects.create_user(
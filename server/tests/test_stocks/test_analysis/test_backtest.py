@@ -0,0 +1,89 @@
+import numpy as np
+from pandas import DataFrame, date_range
+
+from django.test import SimpleTestCase
+from stocks.analysis.backtest import (
+    backtest,
+    classify_histories,
+    state_transitions,
+    summarize,
+)
+from stocks.analysis.functions import add_indicators
+from stocks.analysis.rules import StateRuleIndex
+from stocks.models import State
+
+
+def make_history(close: list[float]) -> DataFrame:
+    index = date_range("2024-01-01", periods=len(close), freq="D")
+    return DataFrame({"Close": close}, index=index)
+
+
+class TestBacktest(SimpleTestCase):
+    def setUp(self):
+        self.hold = State(id=1, name="Hold")
+        self.buy = State(id=2, name="Buy")
+        self.sell = State(id=3, name="Sell")
+        self.rules = StateRuleIndex(
+            [
+                ("BBands%", -1.0, 0.2, 2),
+                ("BBands%", 0.8, 2.0, 3),
+            ],
+            {1: self.hold, 2: self.buy, 3: self.sell},
+            self.hold,
+        )
+
+    def test_classify_matches_last_bar_classification(self):
+        rng = np.random.default_rng(0)
+        history = make_history(list(100 + rng.normal(0, 1, 200).cumsum()))
+        short = make_history(list(100 + rng.normal(0, 1, 50).cumsum()))
+
+        state_ids = classify_histories(
+            {"LONG": history, "SHORT": short}, self.rules
+        )["LONG"]
+
+        with_indicators = add_indicators(history.copy())
+        for bar in (30, 100, 199):
+            self.assertEqual(
+                state_ids[bar],
+                self.rules.classify(with_indicators["BBands%"].iloc[bar]).id,
+            )
+        # No indicator values during the warm-up
+        self.assertTrue((state_ids[:19] == 1).all())
+
+    def test_transitions(self):
+        history = make_history([10, 11, 12, 12, 9, 10])
+        state_ids = np.array([1, 1, 2, 2, 3, 3])
+
+        transitions = state_transitions(history, state_ids, self.rules)
+
+        self.assertEqual(
+            transitions["State"].tolist(), ["Hold", "Buy", "Sell"]
+        )
+        self.assertEqual(transitions["Bars"].tolist(), [2, 2, 1])
+        np.testing.assert_allclose(
+            transitions["Return"], [12 / 10 - 1, 9 / 12 - 1, 10 / 9 - 1]
+        )
+        self.assertEqual(
+            list(transitions.index), list(history.index[[0, 2, 4]])
+        )
+
+    def test_backtest_and_summary(self):
+        rng = np.random.default_rng(1)
+        histories = {
+            ticker: make_history(list(100 + rng.normal(0, 1, 300).cumsum()))
+            for ticker in ("AAPL", "MSFT")
+        }
+        histories["EMPTY"] = make_history([])
+        empty_only = backtest({"EMPTY": make_history([])}, self.rules)
+        self.assertTrue(empty_only["EMPTY"].empty)
+
+        transitions = backtest(histories, self.rules)
+        summary = summarize(transitions)
+
+        self.assertTrue(transitions["EMPTY"].empty)
+        self.assertEqual(
+            summary["Signals"].sum(),
+            len(transitions["AAPL"]) + len(transitions["MSFT"]),
+        )
+        self.assertTrue(set(summary.index) <= {"Hold", "Buy", "Sell"})
+        self.assertTrue(summary["Hit rate"].between(0, 1).all())
@@ -0,0 +1,320 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from django.test import TestCase, override_settings
+from stocks.analysis.batch import (
+    download_batch,
+    fetch_histories,
+    fetch_tickers,
+    iter_histories,
+    plan_fetches,
+)
+from stocks.models import MissingHistory, Stock, Subscription
+from tests.base_case import make_bars
+
+
+def multi_ticker_frame(frames: dict[str, DataFrame]) -> DataFrame:
+    return concat(frames.values(), axis=1, keys=frames.keys(), sort=True)
+
+
+class TestDownloadBatch(TestCase):
+    @patch("stocks.analysis.providers.yf.download")
+    def test_splits_per_ticker(self, mock_download):
+        aapl = make_bars(10, "2024-01-01")
+        sap = make_bars(10, "2024-01-03")
+        mock_download.return_value = multi_ticker_frame(
+            {"AAPL": aapl, "SAP.DE": sap}
+        )
+
+        histories = download_batch(["AAPL", "SAP.DE"], "6mo", "1d")
+
+        self.assertTrue(histories["AAPL"].equals(aapl))
+        self.assertTrue(histories["SAP.DE"].equals(sap))
+
+    @patch("stocks.analysis.providers.yf.download")
+    def test_single_ticker(self, mock_download):
+        aapl = make_bars(10, "2024-01-01")
+        mock_download.return_value = aapl
+
+        histories = download_batch(["AAPL"], "6mo", "1d")
+
+        self.assertTrue(histories["AAPL"].equals(aapl))
+
+
+@override_settings(STOCKS_HISTORY_DIR=None, ANALYSIS_DOWNLOAD_BATCH_SIZE=2)
+class TestFetchHistories(TestCase):
+    @patch("stocks.analysis.batch.download_batch")
+    def test_groups_by_interval_and_period(self, mock_download_batch):
+        mock_download_batch.side_effect = lambda tickers, *_, **__: {
+            ticker: make_bars(5, "2024-01-01") for ticker in tickers
+        }
+        subscriptions = [
+            Subscription.objects.create(
+                stock=Stock.objects.create(ticker=ticker)
+            )
+            for ticker in ("AAPL", "MSFT", "TSLA")
+        ]
+        hourly = Subscription.objects.create(
+            stock=subscriptions[0].stock, interval="1h", period="1mo"
+        )
+
+        histories = fetch_histories([*subscriptions, hourly])
+
+        self.assertEqual(len(histories), 4)
+        self.assertEqual(
+            [call.args for call in mock_download_batch.call_args_list],
+            [
+                (["AAPL", "MSFT"], "6mo", "1d"),
+                (["TSLA"], "6mo", "1d"),
+                (["AAPL"], "1mo", "1h"),
+            ],
+        )
+
+    @patch("stocks.analysis.batch.download_batch", return_value={})
+    def test_missing_ticker_gets_empty_history(self, _):
+        sub = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="DEAD")
+        )
+
+        histories = fetch_histories([sub])
+
+        self.assertTrue(histories[sub].empty)
+
+    @patch(
+        "stocks.analysis.batch.timezone.now",
+        return_value=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+    @patch("stocks.analysis.batch.download_batch")
+    def test_same_ticker_fetched_once(self, mock_download_batch, _):
+        bars = make_bars(5 * 365, "2019-01-01")
+        mock_download_batch.return_value = {"AAPL": bars}
+        stock = Stock.objects.create(ticker="AAPL")
+        short = Subscription.objects.create(stock=stock, period="6mo")
+        long = Subscription.objects.create(stock=stock, period="5y")
+
+        histories = fetch_histories([short, long])
+
+        mock_download_batch.assert_called_once_with(
+            ["AAPL"], "5y", "1d", start=None
+        )
+        self.assertEqual(len(histories[long]), len(bars))
+        self.assertEqual(
+            histories[short].index[0],
+            datetime(2023, 7, 1, tzinfo=timezone.utc),
+        )
+        self.assertTrue(
+            np.shares_memory(
+                histories[short]["Close"].to_numpy(),
+                histories[long]["Close"].to_numpy(),
+            )
+        )
+
+    @patch(
+        "stocks.analysis.batch.timezone.now",
+        return_value=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+    @patch("stocks.analysis.batch.download_batch")
+    def test_coarser_interval_resampled(self, mock_download_batch, _):
+        mock_download_batch.return_value = {
+            "AAPL": make_bars(365, "2023-01-01")
+        }
+        stock = Stock.objects.create(ticker="AAPL")
+        daily = Subscription.objects.create(stock=stock, period="1y")
+        weekly = Subscription.objects.create(
+            stock=stock, interval="1wk", period="6mo"
+        )
+
+        histories = fetch_histories([daily, weekly])
+
+        mock_download_batch.assert_called_once_with(
+            ["AAPL"], "1y", "1d", start=None
+        )
+        self.assertTrue((histories[weekly].index.day_name() == "Monday").all())
+        self.assertEqual(
+            histories[weekly]["Close"].iloc[-1],
+            histories[daily]["Close"].iloc[-1],
+        )
+
+    @patch(
+        "stocks.analysis.batch.timezone.now",
+        return_value=datetime(2023, 3, 1, tzinfo=timezone.utc),
+    )
+    @patch("stocks.analysis.batch.download_batch")
+    def test_resampling_falls_back_to_download(self, mock_download_batch, _):
+        weekly_bars = make_bars(10, "2023-01-02")
+        mock_download_batch.side_effect = [{}, {"AAPL": weekly_bars}]
+        stock = Stock.objects.create(ticker="AAPL")
+        daily = Subscription.objects.create(stock=stock)
+        weekly = Subscription.objects.create(stock=stock, interval="1wk")
+
+        histories = fetch_histories([daily, weekly])
+
+        self.assertEqual(
+            mock_download_batch.call_args.args, (["AAPL"], "6mo", "1wk")
+        )
+        self.assertTrue(histories[daily].empty)
+        self.assertEqual(len(histories[weekly]), 10)
+
+    @patch("stocks.analysis.batch.download_batch", return_value={})
+    def test_tickers_without_bars_skipped(self, mock_download_batch):
+        sub = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="DEAD")
+        )
+
+        for _ in range(3):
+            histories = fetch_histories([sub])
+
+        # Fetched again after the first miss, then left out
+        self.assertEqual(mock_download_batch.call_count, 2)
+        self.assertEqual(histories, {})
+        miss = MissingHistory.objects.get(ticker="DEAD", interval="1d")
+        self.assertEqual(miss.misses, 2)
+
+    @patch("stocks.analysis.batch.download_batch")
+    def test_failed_download_not_a_miss(self, mock_download_batch):
+        mock_download_batch.side_effect = [
+            ConnectionError("reset"),
+            {},
+            {"AAPL": make_bars(5, "2024-01-01")},
+        ]
+        subscriptions = [
+            Subscription.objects.create(
+                stock=Stock.objects.create(ticker=ticker)
+            )
+            for ticker in ("AAPL", "MSFT")
+        ]
+
+        histories = fetch_histories(subscriptions)
+        self.assertTrue(histories[subscriptions[0]].empty)
+        # An empty answer for the whole batch is not trusted either
+        fetch_histories(subscriptions)
+        self.assertFalse(MissingHistory.objects.exists())
+
+        fetch_histories(subscriptions)
+        self.assertEqual(
+            list(MissingHistory.objects.values_list("ticker", flat=True)),
+            ["MSFT"],
+        )
+
+
+@override_settings(
+    STOCKS_HISTORY_DIR=None,
+    ANALYSIS_FETCH_WORKERS=4,
+    MARKET_DATA_RATE_LIMIT=0,
+    MARKET_DATA_TIMEOUT=5,
+)
+class TestFetchHistoriesConcurrently(TestCase):
+    @patch(
+        "stocks.analysis.batch.timezone.now",
+        return_value=datetime(2024, 2, 1, tzinfo=timezone.utc),
+    )
+    @patch("stocks.analysis.batch.get_provider")
+    def test_one_request_per_ticker(self, mock_get_provider, _):
+        def history(ticker, **_):
+            if ticker == "DEAD":
+                raise ValueError("delisted")
+            return make_bars(5, "2024-01-01")
+
+        provider = mock_get_provider.return_value
+        provider.history.side_effect = history
+        subscriptions = [
+            Subscription.objects.create(
+                stock=Stock.objects.create(ticker=ticker)
+            )
+            for ticker in ("AAPL", "MSFT", "DEAD")
+        ]
+
+        histories = fetch_histories(subscriptions)
+
+        self.assertEqual(len(histories[subscriptions[0]]), 5)
+        self.assertEqual(len(histories[subscriptions[1]]), 5)
+        self.assertTrue(histories[subscriptions[2]].empty)
+        self.assertEqual(
+            sorted(call.args[0] for call in provider.history.call_args_list),
+            ["AAPL", "DEAD", "MSFT"],
+        )
+        self.assertEqual(
+            provider.history.call_args.kwargs,
+            {"period": "6mo", "interval": "1d", "start": None, "timeout": 5},
+        )
+        provider.download.assert_not_called()
+
+    @override_settings(ANALYSIS_FETCH_WORKERS=0)
+    @patch("stocks.analysis.batch.get_provider")
+    def test_workers_argument(self, mock_get_provider):
+        provider = mock_get_provider.return_value
+        provider.history.return_value = make_bars(5, "2024-01-01")
+        sub = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
+
+        dict(iter_histories([sub], workers=2))
+
+        provider.history.assert_called_once()
+        provider.download.assert_not_called()
+
+
+@override_settings(STOCKS_HISTORY_DIR=None, ANALYSIS_DOWNLOAD_BATCH_SIZE=50)
+class TestFetchTickers(TestCase):
+    @patch("stocks.analysis.batch.download_batch")
+    def test_without_subscriptions(self, mock_download_batch):
+        mock_download_batch.return_value = {"AAPL": make_bars(5, "2024-01-01")}
+
+        histories = fetch_tickers(["AAPL", "DEAD", "AAPL"], "1y", "1d")
+
+        mock_download_batch.assert_called_once_with(
+            ["AAPL", "DEAD"], "1y", "1d", start=None
+        )
+        self.assertEqual(len(histories["AAPL"]), 5)
+        self.assertTrue(histories["DEAD"].empty)
+
+
+class TestPlanFetches(TestCase):
+    def test_longest_period_per_ticker_and_interval(self):
+        aapl = Stock.objects.create(ticker="AAPL")
+        msft = Stock.objects.create(ticker="MSFT")
+        subscriptions = [
+            Subscription.objects.create(stock=aapl, period="6mo"),
+            Subscription.objects.create(stock=aapl, period="1y"),
+            Subscription.objects.create(stock=aapl, period="5y"),
+            Subscription.objects.create(stock=aapl, interval="1h"),
+            Subscription.objects.create(stock=msft, period="1mo"),
+        ]
+
+        with self.assertLogs("stocks.analysis.batch") as logs:
+            plans = plan_fetches(subscriptions)
+
+        self.assertEqual(
+            [(plan.ticker, plan.interval, plan.period) for plan in plans],
+            [
+                ("AAPL", "1d", "5y"),
+                ("AAPL", "1h", "6mo"),
+                ("MSFT", "1d", "1mo"),
+            ],
+        )
+        self.assertIn("saved 2", logs.output[0])
+
+    @override_settings(ANALYSIS_LOOKBACK_PRECISION=1e-4)
+    @patch(
+        "stocks.analysis.batch.timezone.now",
+        return_value=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+    def test_lookback_window(self, _):
+        stock = Stock.objects.create(ticker="AAPL")
+        long = Subscription.objects.create(stock=stock, period="5y")
+        short = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="MSFT"), period="3mo"
+        )
+
+        aapl, msft = plan_fetches([long, short])
+
+        self.assertEqual(aapl.period, "5y")
+        self.assertGreater(
+            aapl.start, datetime(2023, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertLess(aapl.start, datetime(2023, 7, 1, tzinfo=timezone.utc))
+        # The period is already shorter than the warm-up window
+        self.assertIsNone(msft.start)
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+
+from pandas.testing import assert_frame_equal
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from stocks.analysis.benchmark import (
+    compare,
+    run_benchmarks,
+    synthetic_history,
+)
+from stocks.models import StateIndicator
+
+
+class TestSyntheticHistory(SimpleTestCase):
+    def test_seeded(self):
+        history = synthetic_history("1m", 500, seed=3)
+
+        assert_frame_equal(history, synthetic_history("1m", 500, seed=3))
+        self.assertEqual(len(history), 500)
+        self.assertTrue((history["High"] >= history["Close"]).all())
+        self.assertTrue((history["Low"] <= history["Open"]).all())
+
+
+class TestRunBenchmarks(TestCase):
+    def test_results_and_rollback(self):
+        results = run_benchmarks(
+            functions=["rsi", "analyse_stock"],
+            scenarios=["1d/6mo", "1h/1mo"],
+            repeat=2,
+        )
+
+        self.assertEqual(
+            [(result.function, result.scenario) for result in results],
+            [
+                ("rsi", "1d/6mo"),
+                ("analyse_stock", "1d/6mo"),
+                ("rsi", "1h/1mo"),
+                ("analyse_stock", "1h/1mo"),
+            ],
+        )
+        for result in results:
+            self.assertLessEqual(result.best, result.median)
+            self.assertGreater(result.peak_memory, 0)
+        self.assertFalse(StateIndicator.objects.exists())
+
+    def test_command_compares_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "bench.json")
+            options = {
+                "functions": ["compute_indicators", "get_fig_buffer"],
+                "scenarios": ["1d/6mo"],
+                "repeat": 1,
+                "output": output,
+                "stdout": open(os.devnull, "w"),
+            }
+            call_command("benchmark_analysis", **options)
+            with open(output) as file:
+                report = json.load(file)
+
+        self.assertEqual(len(report["results"]), 2)
+        ratios = compare(report, report)
+        self.assertEqual([ratio for *_, ratio in ratios], [1.0, 1.0])
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase, TestCase
+from stocks.analysis.due import bar_close, due_at
+from stocks.analysis.exchanges import NYSE
+from stocks.models import Stock, Subscription
+
+# Wednesday 10:07 in New York
+NOW = datetime(2024, 6, 5, 14, 7, tzinfo=timezone.utc)
+
+
+def ny(*args):
+    return datetime(*args, tzinfo=NYSE.tz)
+
+
+class TestBarClose(SimpleTestCase):
+    def test_exchange(self):
+        closes = {
+            interval: bar_close(NYSE, interval, NOW)
+            for interval in ["1m", "5m", "1h", "90m", "1d", "1wk", "1mo"]
+        }
+        self.assertEqual(
+            closes,
+            {
+                "1m": ny(2024, 6, 5, 10, 8),
+                "5m": ny(2024, 6, 5, 10, 10),
+                # Hourly bars start at the open
+                "1h": ny(2024, 6, 5, 10, 30),
+                "90m": ny(2024, 6, 5, 11),
+                "1d": ny(2024, 6, 5, 16),
+                "1wk": ny(2024, 6, 7, 16),
+                "1mo": ny(2024, 6, 28, 16),
+            },
+        )
+
+    def test_session_boundaries(self):
+        # The last hourly bar is cut by the close
+        self.assertEqual(
+            bar_close(NYSE, "1h", ny(2024, 6, 5, 15, 45)),
+            ny(2024, 6, 5, 16),
+        )
+        # After the close of Friday, the next ones are on Monday
+        self.assertEqual(
+            bar_close(NYSE, "5m", ny(2024, 6, 7, 16)),
+            ny(2024, 6, 10, 9, 35),
+        )
+        self.assertEqual(
+            bar_close(NYSE, "1d", ny(2024, 6, 7, 16)),
+            ny(2024, 6, 10, 16),
+        )
+        # Thanksgiving week ends with the early close of Friday
+        self.assertEqual(
+            bar_close(NYSE, "1wk", ny(2024, 11, 25, 12)),
+            ny(2024, 11, 29, 13),
+        )
+
+    def test_round_the_clock(self):
+        utc = timezone.utc
+        self.assertEqual(
+            bar_close(None, "1h", NOW), datetime(2024, 6, 5, 15, tzinfo=utc)
+        )
+        self.assertEqual(
+            bar_close(None, "1d", NOW), datetime(2024, 6, 6, tzinfo=utc)
+        )
+        self.assertEqual(
+            bar_close(None, "1wk", NOW), datetime(2024, 6, 10, tzinfo=utc)
+        )
+        self.assertEqual(
+            bar_close(None, "3mo", NOW), datetime(2024, 7, 1, tzinfo=utc)
+        )
+
+
+class TestDueAt(TestCase):
+    def test_after_bar_delay(self):
+        sub = Subscription(stock=Stock(ticker="AAPL"), interval="1h")
+        delay = timedelta(minutes=20)
+
+        # The bar of 10:30 is served at 10:50
+        self.assertEqual(due_at(sub, NOW, delay), ny(2024, 6, 5, 10, 50))
+        self.assertEqual(
+            due_at(sub, ny(2024, 6, 5, 10, 50), delay),
+            ny(2024, 6, 5, 11, 50),
+        )
+        # Analysed before its bar was served
+        self.assertEqual(
+            due_at(sub, ny(2024, 6, 5, 10, 40), delay),
+            ny(2024, 6, 5, 10, 50),
+        )
@@ -0,0 +1,109 @@
+from datetime import date, datetime, time, timezone
+
+from django.test import SimpleTestCase
+from stocks.analysis.exchanges import (
+    FRANKFURT,
+    LSE,
+    NYSE,
+    XETRA,
+    easter,
+    exchange_for,
+    lse_holidays,
+    nyse_early_closes,
+    nyse_holidays,
+)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestHolidays(SimpleTestCase):
+    def test_easter(self):
+        self.assertEqual(easter(2024), date(2024, 3, 31))
+        self.assertEqual(easter(2025), date(2025, 4, 20))
+        self.assertEqual(easter(2038), date(2038, 4, 25))
+
+    def test_nyse(self):
+        self.assertEqual(
+            sorted(nyse_holidays(2024)),
+            [
+                date(2024, 1, 1),
+                date(2024, 1, 15),
+                date(2024, 2, 19),
+                date(2024, 3, 29),
+                date(2024, 5, 27),
+                date(2024, 6, 19),
+                date(2024, 7, 4),
+                date(2024, 9, 2),
+                date(2024, 11, 28),
+                date(2024, 12, 25),
+            ],
+        )
+        self.assertEqual(
+            nyse_early_closes(2024),
+            {
+                date(2024, 7, 3): time(13),
+                date(2024, 11, 29): time(13),
+                date(2024, 12, 24): time(13),
+            },
+        )
+
+    def test_nyse_observed(self):
+        # New Year's Day on a Saturday is not observed the Friday before
+        self.assertNotIn(date(2021, 12, 31), nyse_holidays(2022))
+        self.assertIn(date(2021, 12, 24), nyse_holidays(2021))
+        self.assertIn(date(2021, 7, 5), nyse_holidays(2021))
+
+    def test_lse_substitutes(self):
+        holidays = lse_holidays(2021)
+        self.assertIn(date(2021, 12, 27), holidays)
+        self.assertIn(date(2021, 12, 28), holidays)
+        self.assertIn(date(2021, 5, 3), holidays)
+        self.assertIn(date(2021, 8, 30), holidays)
+
+
+class TestExchange(SimpleTestCase):
+    def test_session(self):
+        self.assertEqual(
+            NYSE.session(date(2024, 11, 29)),
+            (
+                datetime(2024, 11, 29, 9, 30, tzinfo=NYSE.tz),
+                datetime(2024, 11, 29, 13, tzinfo=NYSE.tz),
+            ),
+        )
+        self.assertIsNone(NYSE.session(date(2024, 11, 28)))
+        self.assertIsNone(XETRA.session(date(2024, 6, 8)))
+
+    def test_is_open(self):
+        self.assertTrue(NYSE.is_open(utc(2024, 6, 4, 14)))
+        self.assertFalse(NYSE.is_open(utc(2024, 6, 4, 20)))
+        # Summer time in London
+        self.assertTrue(LSE.is_open(utc(2024, 6, 4, 7, 30)))
+        self.assertFalse(LSE.is_open(utc(2024, 12, 4, 7, 30)))
+        # Frankfurt trades after XETRA closed
+        self.assertFalse(XETRA.is_open(utc(2024, 6, 4, 18)))
+        self.assertTrue(FRANKFURT.is_open(utc(2024, 6, 4, 18)))
+
+    def test_traded_between(self):
+        friday_close = utc(2024, 6, 7, 20)
+        self.assertFalse(
+            NYSE.traded_between(friday_close, utc(2024, 6, 10, 13))
+        )
+        self.assertTrue(
+            NYSE.traded_between(friday_close, utc(2024, 6, 10, 14))
+        )
+        self.assertTrue(NYSE.traded_between(utc(2024, 6, 7, 19), friday_close))
+
+
+class TestExchangeFor(SimpleTestCase):
+    def test_suffixes(self):
+        self.assertIs(exchange_for("AAPL"), NYSE)
+        self.assertIs(exchange_for("BRK-B"), NYSE)
+        self.assertIs(exchange_for("SAP.DE"), XETRA)
+        self.assertIs(exchange_for("SAP.F"), FRANKFURT)
+        self.assertIs(exchange_for("VOD.L"), LSE)
+        self.assertIsNone(exchange_for("BTC-USD"))
+        self.assertIsNone(exchange_for("^GSPC"))
+        self.assertIsNone(exchange_for("EURUSD=X"))
+        self.assertIsNone(exchange_for("7203.T"))
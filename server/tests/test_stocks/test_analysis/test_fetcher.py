@@ -0,0 +1,195 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from stocks.analysis.fetcher import (
+    AdaptiveLimiter,
+    FetchTimeout,
+    RateLimiter,
+    fetch_concurrently,
+    get_limiter,
+)
+
+
+class TestRateLimiter(SimpleTestCase):
+    @patch("stocks.analysis.fetcher.time")
+    def test_token_bucket(self, mock_time):
+        clock = [100.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        mock_time.sleep.side_effect = sleep
+        limiter = RateLimiter(rate=2, max_concurrent=10)
+
+        for _ in range(4):
+            with limiter:
+                pass
+
+        # The burst of 2 is free, then one request every half second
+        self.assertEqual(
+            [call.args for call in mock_time.sleep.call_args_list],
+            [(0.5,), (0.5,)],
+        )
+        self.assertEqual(limiter.active, 0)
+
+    def test_concurrency_cap(self):
+        limiter = RateLimiter(rate=0, max_concurrent=2)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def request():
+            with limiter:
+                with lock:
+                    running[0] += 1
+                    running[1] = max(running)
+                time.sleep(0.01)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(running[1], 2)
+
+    def test_get_limiter(self):
+        with override_settings(
+            MARKET_DATA_RATE_LIMIT=5,
+            MARKET_DATA_MIN_CONCURRENCY=2,
+            MARKET_DATA_MAX_CONCURRENCY=3,
+        ):
+            limiter = get_limiter()
+            self.assertIs(limiter, get_limiter())
+            self.assertEqual(
+                (limiter.rate, limiter.limit, limiter.max_limit), (5, 2, 3)
+            )
+        with override_settings(MARKET_DATA_MIN_CONCURRENCY=1):
+            self.assertEqual(get_limiter().limit, 1)
+
+
+@patch("stocks.analysis.fetcher.time.monotonic")
+class TestAdaptiveLimiter(SimpleTestCase):
+    def setUp(self):
+        self.limiter = AdaptiveLimiter(
+            rate=0, max_concurrent=8, min_concurrent=1
+        )
+
+    def healthy(self, responses):
+        for _ in range(responses):
+            self.limiter.record("query2.finance.yahoo.com", 200, 0.1)
+
+    def test_additive_increase(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        self.healthy(1)
+        self.assertEqual(self.limiter.limit, 2)
+        # About one more per round of `limit` responses
+        self.healthy(2)
+        self.assertEqual(self.limiter.limit, 2)
+        self.healthy(1)
+        self.assertEqual(self.limiter.limit, 3)
+
+        self.healthy(100)
+        self.assertEqual(self.limiter.limit, 8)
+
+    def test_multiplicative_decrease_once_per_round_trip(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        self.healthy(100)
+
+        mock_monotonic.return_value = 10
+        self.limiter.record("query2.finance.yahoo.com", 429, 0.1)
+        self.limiter.record("query2.finance.yahoo.com", 503, 0.1)
+        self.assertEqual(self.limiter.limit, 4)
+
+        mock_monotonic.return_value = 10.2
+        self.limiter.record("query2.finance.yahoo.com", None, 0)
+        self.assertEqual(self.limiter.limit, 2)
+        self.assertEqual(self.limiter.decreases, 2)
+
+        stats = self.limiter.snapshot()["hosts"]["query2.finance.yahoo.com"]
+        self.assertEqual(stats["requests"], 103)
+        self.assertEqual(
+            (stats["throttled"], stats["server_errors"], stats["failures"]),
+            (1, 1, 1),
+        )
+        self.assertAlmostEqual(stats["latency"], 0.1)
+
+    def test_latency_decrease(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        self.healthy(20)
+        self.assertEqual(self.limiter.limit, 6)
+
+        mock_monotonic.return_value = 10
+        for _ in range(3):
+            self.limiter.record("query2.finance.yahoo.com", 200, 2.0)
+
+        self.assertEqual(self.limiter.limit, 3)
+        self.assertEqual(
+            self.limiter.snapshot()["hosts"]["query2.finance.yahoo.com"][
+                "baseline"
+            ],
+            0.1,
+        )
+
+    def test_wakes_waiting_requests(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        acquired = threading.Event()
+
+        def request():
+            with self.limiter:
+                acquired.set()
+
+        with self.limiter:
+            thread = threading.Thread(target=request)
+            thread.start()
+            self.assertFalse(acquired.wait(0.05))
+            self.healthy(1)
+            self.assertTrue(acquired.wait(1))
+        thread.join()
+
+
+class TestFetchConcurrently(SimpleTestCase):
+    def test_results_errors_and_timeouts(self):
+        release = threading.Event()
+        error = ValueError("no data")
+
+        def fail():
+            raise error
+
+        tasks = {
+            "AAPL": lambda: "bars",
+            "DEAD": fail,
+            "SLOW": release.wait,
+        }
+
+        start = time.monotonic()
+        results = dict(
+            fetch_concurrently(
+                tasks,
+                workers=3,
+                timeout=0.1,
+                limiter=RateLimiter(rate=0, max_concurrent=3),
+            )
+        )
+        release.set()
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(results["AAPL"], "bars")
+        self.assertIs(results["DEAD"], error)
+        self.assertIsInstance(results["SLOW"], FetchTimeout)
+
+    def test_yields_as_completed(self):
+        release = threading.Event()
+        tasks = {"SLOW": lambda: release.wait(1) and "slow", "FAST": str}
+
+        results = fetch_concurrently(
+            tasks, workers=2, limiter=RateLimiter(rate=0, max_concurrent=2)
+        )
+
+        self.assertEqual(next(results), ("FAST", ""))
+        release.set()
+        self.assertEqual(next(results), ("SLOW", "slow"))
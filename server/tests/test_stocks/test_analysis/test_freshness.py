@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from pandas import DataFrame, Timedelta, Timestamp, date_range
+
+from django.test import TestCase, override_settings
+from stocks.analysis.freshness import last_trades, mark_analysed, split_due
+from stocks.models import Stock, Subscription
+
+LAST_TRADE = Timestamp(datetime(2024, 6, 3, 20, tzinfo=timezone.utc))
+# Tuesday 10:00 in New York
+NOW = datetime(2024, 6, 4, 14, tzinfo=timezone.utc)
+
+
+@override_settings(ANALYSIS_DOWNLOAD_BATCH_SIZE=2)
+class TestLastTrades(TestCase):
+    @patch("stocks.analysis.freshness.get_provider")
+    def test_batches_and_failures(self, mock_get_provider):
+        provider = mock_get_provider.return_value
+        provider.last_trades.side_effect = [
+            {"AAPL": LAST_TRADE, "MSFT": LAST_TRADE},
+            ConnectionError("reset"),
+        ]
+
+        trades = last_trades(["MSFT", "TSLA", "AAPL", "MSFT"])
+
+        self.assertEqual(trades, {"AAPL": LAST_TRADE, "MSFT": LAST_TRADE})
+        self.assertEqual(
+            [call.args for call in provider.last_trades.call_args_list],
+            [(["AAPL", "MSFT"],), (["TSLA"],)],
+        )
+
+
+@patch("stocks.analysis.freshness.last_trades")
+class TestSplitDue(TestCase):
+    def subscribe(self, ticker, last_trade_at=None, analysed_at=None):
+        return Subscription.objects.create(
+            stock=Stock.objects.create(ticker=ticker),
+            last_trade_at=last_trade_at,
+            analysed_at=analysed_at,
+        )
+
+    def test_skips_without_new_trade(self, mock_last_trades):
+        closed = self.subscribe("AAPL", LAST_TRADE)
+        traded = self.subscribe("MSFT", LAST_TRADE)
+        new = self.subscribe("TSLA")
+        unknown = self.subscribe("DEAD", LAST_TRADE)
+        mock_last_trades.return_value = {
+            "AAPL": LAST_TRADE,
+            "MSFT": LAST_TRADE + Timedelta(minutes=1),
+            "TSLA": LAST_TRADE,
+        }
+
+        due, skipped, trades = split_due(Subscription.objects.all(), NOW)
+
+        self.assertEqual(due, [traded, new, unknown])
+        self.assertEqual(skipped, [closed])
+        self.assertIs(trades, mock_last_trades.return_value)
+
+    @override_settings(ANALYSIS_BAR_DELAY=20)
+    def test_skips_closed_markets(self, mock_last_trades):
+        mock_last_trades.return_value = {}
+        # Saturday noon UTC, XETRA closed Friday at 15:30 UTC
+        now = datetime(2024, 6, 8, 12, tzinfo=timezone.utc)
+        friday = datetime(2024, 6, 7, 15, tzinfo=timezone.utc)
+        closed = self.subscribe("SAP.DE", analysed_at=friday.replace(hour=16))
+        delayed = self.subscribe(
+            "BMW.DE", analysed_at=friday.replace(minute=20)
+        )
+        never = self.subscribe("AAPL")
+        crypto = self.subscribe("BTC-USD", analysed_at=friday)
+
+        due, skipped, _ = split_due(Subscription.objects.all(), now)
+
+        self.assertEqual(due, [delayed, never, crypto])
+        self.assertEqual(skipped, [closed])
+        self.assertEqual(
+            sorted(mock_last_trades.call_args.args[0]),
+            ["AAPL", "BMW.DE", "BTC-USD"],
+        )
+
+
+class TestMarkAnalysed(TestCase):
+    def test_records_last_bar_and_trade(self):
+        aapl = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
+        dead = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="DEAD"),
+            last_trade_at=LAST_TRADE,
+        )
+        index = date_range("2024-06-01", periods=3, freq="D", tz="UTC")
+        history = DataFrame({"Close": [1.0, 2.0, 3.0]}, index=index)
+
+        with self.assertNumQueries(1):
+            mark_analysed(
+                {aapl: history, dead: history}, {"AAPL": LAST_TRADE}, NOW
+            )
+
+        aapl.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual(aapl.analysed_at, NOW)
+        self.assertEqual(aapl.last_bar_at, index[-1])
+        self.assertEqual(aapl.last_trade_at, LAST_TRADE)
+        self.assertIsNone(dead.last_trade_at)
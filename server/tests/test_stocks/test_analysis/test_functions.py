@@ -1,5 +1,6 @@
 from django.test import TestCase
-from stocks.analysis.functions import analyse_stock
+from pandas import DataFrame
+from stocks.analysis.functions import analyse_stock, analyse_stocks
 from stocks.models import Indicator, State, StateIndicator
 
 
@@ -87,3 +88,27 @@ class TestAnalyseStock(TestCase):
     def test_strong_sell(self):
         result = analyse_stock(1.0)
         self.assertEqual(result, self.strong_sell)
+
+
+class TestAnalyseStocks(TestAnalyseStock):
+    def test_all_indicators_within_range(self):
+        latest = DataFrame(
+            {
+                "RSI": [30, 50, 80, 65, 30],
+                "BBands%": [-0.1, -0.1, 1.5, 0.9, 0.1],
+            }
+        )
+        self.assertEqual(
+            [state.name for state in analyse_stocks(latest)],
+            ["Strong Buy", "Hold", "Strong Sell", "Sell", "Buy"],
+        )
+
+    def test_only_given_indicators_checked(self):
+        latest = DataFrame({"BBands%": [-0.1, 1.0, 0.5]})
+        self.assertEqual(
+            analyse_stocks(latest),
+            [self.strong_buy, self.strong_sell, analyse_stock(0.5)],
+        )
+
+    def test_no_stocks(self):
+        self.assertEqual(analyse_stocks(DataFrame()), [])
@@ -0,0 +1,91 @@
+import numpy as np
+from pandas import DataFrame
+
+from django.test import TestCase
+from stocks.analysis.functions import add_indicators
+from stocks.analysis.incremental import IndicatorEngine, latest_indicators
+from stocks.models import IndicatorSnapshot, Stock, Subscription
+from tests.base_case import make_bars
+
+COLUMNS = ["RSI", "RSI_SMA14", "SMA20", "BB_lower", "BB_upper", "BBands%"]
+
+
+class TestIndicatorEngine(TestCase):
+    def test_matches_full_recompute(self):
+        history = make_bars(300)
+        expected = add_indicators(history.copy())
+
+        engine = IndicatorEngine()
+        for bar_at, close in history["Close"].items():
+            current = engine.update(close, bar_at)
+            for column in COLUMNS:
+                self.assertTrue(
+                    np.isclose(
+                        current[column],
+                        expected.loc[bar_at, column],
+                        rtol=1e-9,
+                        equal_nan=True,
+                    ),
+                    f"{column} differs at {bar_at}",
+                )
+
+    def test_round_trip(self):
+        history = make_bars(40)
+        engine = IndicatorEngine()
+        for bar_at, close in history["Close"].iloc[:-1].items():
+            engine.update(close, bar_at)
+
+        restored = IndicatorEngine.from_dict(
+            engine.to_dict(), engine.last_bar_at
+        )
+        last_close = history["Close"].iloc[-1]
+        expected = engine.update(last_close)
+        for column, value in restored.update(last_close).items():
+            self.assertAlmostEqual(value, expected[column])
+
+
+class TestLatestIndicators(TestCase):
+    def setUp(self):
+        self.subscription = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
+
+    def assert_matches(self, history: DataFrame, current: dict):
+        expected = add_indicators(history.copy()).iloc[-1]
+        for column in COLUMNS:
+            self.assertAlmostEqual(current[column], expected[column])
+
+    def test_first_run_commits_all_but_last_bar(self):
+        history = make_bars(100)
+
+        current = latest_indicators(self.subscription, history)
+
+        self.assert_matches(history, current)
+        snapshot = IndicatorSnapshot.objects.get(
+            subscription=self.subscription
+        )
+        self.assertEqual(snapshot.last_bar_at, history.index[-2])
+
+    def test_forming_bar_is_reconciled(self):
+        history = make_bars(101)
+        forming = history.iloc[:100].copy()
+        forming.loc[forming.index[-1], "Close"] *= 1.05
+        latest_indicators(self.subscription, forming)
+
+        current = latest_indicators(self.subscription, history)
+
+        self.assert_matches(history, current)
+        snapshot = IndicatorSnapshot.objects.get(
+            subscription=self.subscription
+        )
+        self.assertEqual(snapshot.last_bar_at, history.index[-2])
+
+    def test_adjusted_history_is_rebuilt(self):
+        history = make_bars(100)
+        latest_indicators(self.subscription, history)
+
+        adjusted = history.copy()
+        adjusted["Close"] *= 0.5
+        current = latest_indicators(self.subscription, adjusted)
+
+        self.assert_matches(adjusted, current)
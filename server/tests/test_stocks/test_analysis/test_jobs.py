@@ -0,0 +1,229 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from pandas import DataFrame
+from stocks.analysis.jobs import (
+    JobProgress,
+    active_job,
+    analyse_leased,
+    enqueue_analysis,
+    execute_job,
+    fail_lost_jobs,
+    finish_job,
+    lease_subscriptions,
+    run_worker,
+    worker_name,
+)
+from stocks.models import AnalysisJob, State, Stock, Subscription
+
+
+def subscribe(*tickers):
+    return [
+        Subscription.objects.create(stock=Stock.objects.create(ticker=ticker))
+        for ticker in tickers
+    ]
+
+
+class TestEnqueue(TestCase):
+    def test_one_queued_job(self):
+        first, created = enqueue_analysis()
+        same, created_again = enqueue_analysis()
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(same, first)
+
+        job = active_job("worker-1")
+        self.assertEqual(job, first)
+        self.assertEqual(job.status, AnalysisJob.Status.RUNNING)
+        self.assertEqual(job.worker, "worker-1")
+        self.assertIsNotNone(job.started_at)
+        # Joined, not started again
+        self.assertEqual(active_job("worker-2").worker, "worker-1")
+
+        second, created = enqueue_analysis()
+        self.assertTrue(created)
+        self.assertNotEqual(second, first)
+
+    def test_subscriptions_added_to_queued_job(self):
+        job, _ = enqueue_analysis([3, 1])
+        enqueue_analysis([2, 3])
+        self.assertEqual(
+            AnalysisJob.objects.get(pk=job.pk).subscriptions, [1, 2, 3]
+        )
+
+        enqueue_analysis()
+        self.assertIsNone(AnalysisJob.objects.get(pk=job.pk).subscriptions)
+        enqueue_analysis([4])
+        self.assertIsNone(AnalysisJob.objects.get(pk=job.pk).subscriptions)
+
+    @override_settings(ANALYSIS_JOB_TIMEOUT=60)
+    def test_fail_lost_jobs(self):
+        lost = AnalysisJob.objects.create(status=AnalysisJob.Status.RUNNING)
+        alive = AnalysisJob.objects.create(status=AnalysisJob.Status.RUNNING)
+        AnalysisJob.objects.filter(pk=lost.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=2)
+        )
+
+        self.assertEqual(fail_lost_jobs(), 1)
+
+        lost.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual(lost.status, AnalysisJob.Status.FAILED)
+        self.assertEqual(lost.error, "Worker lost")
+        self.assertEqual(alive.status, AnalysisJob.Status.RUNNING)
+
+
+class TestLeases(TestCase):
+    def setUp(self):
+        self.subs = subscribe("AAPL", "MSFT", "TSLA")
+        enqueue_analysis()
+        self.job = active_job("worker")
+
+    def test_leases_are_disjoint(self):
+        first, _ = lease_subscriptions(self.job, 2)
+        second, _ = lease_subscriptions(self.job, 2)
+        third, _ = lease_subscriptions(self.job, 2)
+
+        self.assertEqual(first, [self.subs[0].pk, self.subs[1].pk])
+        self.assertEqual(second, [self.subs[2].pk])
+        self.assertEqual(third, [])
+        self.assertFalse(finish_job(self.job))
+
+    def test_leases_subscriptions_of_job(self):
+        job, _ = enqueue_analysis([self.subs[1].pk])
+        job.status = AnalysisJob.Status.RUNNING
+
+        leased, _ = lease_subscriptions(job, 3)
+
+        self.assertEqual(leased, [self.subs[1].pk])
+
+    def test_expired_lease_taken_over(self):
+        leased, _ = lease_subscriptions(self.job, 1)
+        Subscription.objects.filter(pk__in=leased).update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        taken, _ = lease_subscriptions(self.job, 3)
+
+        self.assertEqual(taken, [sub.pk for sub in self.subs])
+
+    def test_next_job_leases_again(self):
+        leased, until = lease_subscriptions(self.job, 3)
+        with patch("stocks.analysis.jobs.run_analysis", return_value={}):
+            analyse_leased(self.job, leased, until)
+        self.assertTrue(finish_job(self.job))
+
+        enqueue_analysis()
+        job = active_job("worker")
+        self.assertNotEqual(job, self.job)
+        self.assertEqual(len(lease_subscriptions(job, 3)[0]), 3)
+
+    def test_taken_over_lease_is_kept(self):
+        leased, until = lease_subscriptions(self.job, 1)
+        # Another worker took it over after it expired
+        Subscription.objects.filter(pk__in=leased).update(
+            leased_until=until + timedelta(minutes=1)
+        )
+
+        with patch("stocks.analysis.jobs.run_analysis", return_value={}):
+            analyse_leased(self.job, leased, until)
+
+        self.assertIsNotNone(
+            Subscription.objects.get(pk=leased[0]).leased_until
+        )
+
+    @override_settings(ANALYSIS_LEASE_SECONDS=0)
+    def test_progress_renews_lease(self):
+        leased, until = lease_subscriptions(self.job, 1)
+        progress = JobProgress(self.job, leased, until)
+
+        progress.update(fetched=1)
+
+        renewed = Subscription.objects.get(pk=leased[0]).leased_until
+        self.assertGreater(renewed, until)
+        self.assertEqual(progress.until, renewed)
+
+    @override_settings(ANALYSIS_LEASE_SECONDS=0)
+    def test_state_change_keeps_renewed_lease(self):
+        leased, until = lease_subscriptions(self.job, 1)
+        sub = Subscription.objects.get(pk=leased[0])
+        history = DataFrame([[100]], columns=["Close"])
+        buy = State.objects.create(name="Buy")
+        for target, value in (
+            ("iter_histories", [(sub, history)]),
+            ("latest_indicators", {"BBands%": 0.1}),
+            ("analyse_stocks", [buy]),
+            ("analytics_done", None),
+            ("add_indicators", history),
+            ("mark_analysed", None),
+        ):
+            patch(
+                f"stocks.analysis.pipeline.{target}", return_value=value
+            ).start()
+        patch("stocks.analysis.freshness.last_trades", return_value={}).start()
+        self.addCleanup(patch.stopall)
+
+        # Each stage renews the lease, the notify one before the save
+        analyse_leased(self.job, leased, until)
+
+        sub.refresh_from_db()
+        self.assertEqual(sub.state, buy)
+        self.assertIsNone(sub.leased_until)
+        self.assertTrue(finish_job(self.job))
+
+
+@override_settings(ANALYSIS_LEASE_SIZE=2)
+@patch("stocks.analysis.jobs.run_analysis")
+class TestExecuteJob(TestCase):
+    def setUp(self):
+        subscribe("AAPL", "MSFT", "TSLA")
+        enqueue_analysis()
+        self.job = active_job("worker")
+
+    def test_succeeded(self, mock_run_analysis):
+        def run(subscriptions, progress):
+            count = len(subscriptions)
+            with progress.stage("fetch"):
+                progress.update(subscriptions=count, fetched=count)
+            return {"analysed": count, "skipped": 0, "changed": 1}
+
+        mock_run_analysis.side_effect = run
+
+        self.assertTrue(execute_job(self.job))
+
+        self.assertEqual(mock_run_analysis.call_count, 2)
+        self.assertEqual(self.job.status, AnalysisJob.Status.SUCCEEDED)
+        self.assertEqual(
+            self.job.result, {"analysed": 3, "skipped": 0, "changed": 2}
+        )
+        self.assertEqual(self.job.progress, {"subscriptions": 3, "fetched": 3})
+        self.assertEqual(list(self.job.timings), ["fetch"])
+        self.assertIn("limit", self.job.fetch_stats[worker_name()])
+        self.assertIsNotNone(self.job.finished_at)
+        self.assertFalse(
+            Subscription.objects.filter(leased_until__isnull=False).exists()
+        )
+
+    def test_failed(self, mock_run_analysis):
+        mock_run_analysis.side_effect = [ValueError("no rules"), {}]
+
+        self.assertTrue(execute_job(self.job))
+
+        self.assertEqual(self.job.status, AnalysisJob.Status.FAILED)
+        self.assertEqual(self.job.error, "ValueError: no rules")
+        # The other subscriptions were analysed all the same
+        self.assertEqual(mock_run_analysis.call_count, 2)
+
+    def test_run_worker_once(self, mock_run_analysis):
+        mock_run_analysis.return_value = {}
+        enqueue_analysis()
+
+        self.assertEqual(run_worker(poll=0, once=True), 2)
+        self.assertFalse(
+            AnalysisJob.objects.exclude(
+                status=AnalysisJob.Status.SUCCEEDED
+            ).exists()
+        )
@@ -0,0 +1,64 @@
+import numpy as np
+from pandas import DataFrame, Series
+
+from django.test import SimpleTestCase
+from stocks.analysis.functions import calculate_bollinger_bands, rsi
+from stocks.analysis.kernel import (
+    INDICATOR_COLUMNS,
+    compute_indicators,
+    fused_kernel,
+    numpy_kernel,
+)
+from technical_analysis import moving_average
+
+
+def reference_indicators(close: Series) -> DataFrame:
+    """The indicator columns as get_stock_history used to compute them."""
+    history = DataFrame({"Close": close})
+    history["RSI"] = rsi(history["Close"], 14)
+    history["RSI_SMA14"] = moving_average.sma(history["RSI"], 14)
+    (
+        history["BB_lower"],
+        history["SMA20"],
+        history["BB_upper"],
+    ) = calculate_bollinger_bands(history["Close"])
+    history["BBands%"] = (history["Close"] - history["BB_lower"]) / (
+        history["BB_upper"] - history["BB_lower"]
+    )
+    return history[INDICATOR_COLUMNS]
+
+
+class TestKernelParity(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.closes = {
+            "random walk": 150 * np.exp(np.cumsum(rng.normal(0, 0.02, 1260))),
+            "large prices": 5e4 + np.cumsum(rng.normal(0, 1, 500)),
+            "short": np.array([10.0, 10.5, 10.2, 10.8]),
+            "flat start": np.r_[np.full(30, 20.0), 20 + rng.random(30)],
+            "empty": np.array([]),
+        }
+
+    def assert_parity(self, kernel):
+        for name, close in self.closes.items():
+            expected = reference_indicators(Series(close)).to_numpy()
+            out = np.empty((len(close), len(INDICATOR_COLUMNS)))
+            kernel(close, out)
+            np.testing.assert_allclose(
+                out, expected, rtol=1e-8, atol=1e-8, err_msg=name
+            )
+
+    def test_fused_kernel(self):
+        self.assert_parity(fused_kernel)
+
+    def test_numpy_kernel(self):
+        self.assert_parity(numpy_kernel)
+
+    def test_compute_indicators(self):
+        close = self.closes["random walk"]
+        np.testing.assert_allclose(
+            compute_indicators(close),
+            reference_indicators(Series(close)).to_numpy(),
+            rtol=1e-8,
+            atol=1e-8,
+        )
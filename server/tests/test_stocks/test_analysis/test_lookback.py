@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from django.test import SimpleTestCase
+from pandas import Timestamp
+from stocks.analysis.exchanges import NYSE
+from stocks.analysis.kernel import compute_indicators
+from stocks.analysis.lookback import lookback_start, warmup_bars
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+class TestWarmupBars(SimpleTestCase):
+    def test_indicators_converge_within_precision(self):
+        rng = np.random.default_rng(7)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 1260)))
+        full = compute_indicators(close)[-1]
+
+        for precision in (1e-2, 1e-4, 1e-6):
+            bars = warmup_bars(precision)
+            window = compute_indicators(close[-bars:])[-1]
+            # RSI is bounded by 100, so the seed error scales with it
+            np.testing.assert_allclose(
+                window, full, rtol=0, atol=100 * precision
+            )
+
+    def test_at_least_bollinger_window(self):
+        self.assertGreaterEqual(warmup_bars(0.9), 20)
+
+
+class TestLookbackStart(SimpleTestCase):
+    def count_bars(self, start, now, duration):
+        return sum(
+            -(-(min(close, now) - open_) // duration)
+            for open_, close in NYSE.sessions(start, now)
+            if open_ >= start and open_ < now
+        )
+
+    def test_monday_open_reaches_back_to_friday(self):
+        now = datetime(2024, 6, 10, 9, 45, tzinfo=NEW_YORK)
+
+        start = lookback_start("1m", 1e-3, now, NYSE)
+
+        self.assertEqual(start, Timestamp("2024-06-07", tz=NEW_YORK))
+        self.assertGreaterEqual(
+            self.count_bars(start, now, timedelta(minutes=1)),
+            warmup_bars(1e-3),
+        )
+
+    def test_daily_bars_skip_holidays(self):
+        now = datetime(2024, 7, 10, 12, tzinfo=NEW_YORK)
+
+        start = lookback_start("1d", 1e-3, now, NYSE)
+
+        sessions = [
+            open_ for open_, _ in NYSE.sessions(start, now) if open_ < now
+        ]
+        self.assertEqual(len(sessions), warmup_bars(1e-3))
+
+    def test_unknown_exchange_uses_calendar_factor(self):
+        now = datetime(2024, 6, 10, 9, 45, tzinfo=NEW_YORK)
+
+        self.assertLess(
+            lookback_start("1m", 1e-3, now),
+            now - warmup_bars(1e-3) * timedelta(minutes=1),
+        )
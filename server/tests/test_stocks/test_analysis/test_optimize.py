@@ -0,0 +1,172 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from pandas import DataFrame
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from stocks.analysis.backtest import backtest, classify_histories
+from stocks.analysis.optimize import (
+    Rule,
+    grid_candidates,
+    optimize_thresholds,
+    random_candidates,
+    score_states,
+)
+from stocks.analysis.panel import align_closes
+from stocks.analysis.rules import StateRuleIndex
+from stocks.models import Indicator, State, StateIndicator
+from tests.base_case import make_bars
+
+
+def make_histories(
+    count: int, bars: int, seed: int = 0
+) -> dict[str, DataFrame]:
+    return {
+        f"T{i}": make_bars(bars - i, "2020-01-01", seed=seed + i, tz=None)
+        for i in range(count)
+    }
+
+
+RULES = [
+    Rule(2, "Buy", "BBands%"),
+    Rule(2, "Buy", "RSI"),
+    Rule(3, "Sell", "BBands%"),
+]
+
+
+def rule_index(candidate: np.ndarray) -> StateRuleIndex:
+    states = {1: State(id=1, name="Hold")}
+    states.update(
+        {
+            rule.state_id: State(id=rule.state_id, name=rule.state)
+            for rule in RULES
+        }
+    )
+    return StateRuleIndex(
+        [
+            (rule.indicator, lower, upper, rule.state_id)
+            for rule, (lower, upper) in zip(RULES, candidate)
+        ],
+        states,
+        states[1],
+    )
+
+
+def expected_score(
+    histories: dict[str, DataFrame], candidate: np.ndarray
+) -> float:
+    returns: list[float] = []
+    for frame in backtest(histories, rule_index(candidate)).values():
+        sign = frame["State"].map({"Buy": 1, "Sell": -1, "Hold": 0})
+        returns.extend((frame["Return"] * sign)[sign != 0])
+    return float(np.mean(returns))
+
+
+BASE = np.array([[-1.0, 0.2], [0.0, 50.0], [0.8, 2.0]])
+
+
+class TestScoreStates(SimpleTestCase):
+    def test_matches_backtest(self):
+        histories = make_histories(5, 300)
+        index = rule_index(BASE)
+        state_ids = classify_histories(histories, index)
+        closes = align_closes(histories)
+        aligned = np.full(closes.shape, 1)
+        for column, ticker in enumerate(histories):
+            aligned[len(closes) - len(state_ids[ticker]) :, column] = (
+                state_ids[ticker]
+            )
+
+        score, signals = score_states(
+            aligned, closes, {2: 1, 3: -1}, min_signals=1
+        )
+
+        self.assertAlmostEqual(score, expected_score(histories, BASE))
+        self.assertGreater(signals, 0)
+
+    def test_too_few_signals(self):
+        closes = np.array([[1.0], [2.0]])
+        score, signals = score_states(
+            np.array([[2], [2]]), closes, {2: 1}, min_signals=2
+        )
+        self.assertEqual((score, signals), (-np.inf, 1))
+
+
+class TestCandidates(SimpleTestCase):
+    def test_random_candidates_are_valid(self):
+        candidates = list(random_candidates(BASE, 50, span=0.8, seed=1))
+        self.assertTrue(0 < len(candidates) <= 50)
+        for candidate in candidates:
+            self.assertTrue((candidate[:, 0] < candidate[:, 1]).all())
+
+    def test_grid_candidates(self):
+        base = np.array([[0.0, 1.0]])
+        candidates = list(grid_candidates(base, steps=3, span=0.5))
+        # Moving both thresholds by -0.5, 0 or +0.5 of the range width,
+        # without the lower one reaching the upper one
+        self.assertEqual(len(candidates), 8)
+
+
+class TestOptimizeThresholds(SimpleTestCase):
+    def test_ranks_candidates(self):
+        histories = make_histories(4, 250)
+        candidates = [BASE, *random_candidates(BASE, 7, span=0.5, seed=2)]
+
+        results = optimize_thresholds(
+            histories, RULES, candidates, 1, workers=2, top=3, min_signals=1
+        )
+
+        self.assertEqual(len(results), 3)
+        scores = [score for score, _, _ in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        score, _, candidate = results[0]
+        self.assertAlmostEqual(score, expected_score(histories, candidate))
+
+
+class TestOptimizeThresholdsCommand(TestCase):
+    def setUp(self):
+        bbands = Indicator.objects.create(name="BBands%")
+        for name, lower, upper in (("Buy", -1.0, 0.2), ("Sell", 0.8, 2.0)):
+            StateIndicator.objects.create(
+                state=State.objects.create(name=name),
+                indicator=bbands,
+                lower_threshold=lower,
+                upper_threshold=upper,
+            )
+
+    @patch("stocks.management.commands.optimize_thresholds.fetch_tickers")
+    def test_writes_report(self, mock_fetch_tickers):
+        mock_fetch_tickers.return_value = make_histories(3, 200)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command(
+                "optimize_thresholds",
+                "T0",
+                "T1",
+                "T2",
+                candidates=5,
+                seed=0,
+                workers=1,
+                top=2,
+                min_signals=1,
+                output=output,
+                stdout=open(os.devnull, "w"),
+            )
+            with open(output) as file:
+                report = json.load(file)
+
+        self.assertEqual(report["tickers"], ["T0", "T1", "T2"])
+        self.assertEqual(len(report["top"]), 2)
+        self.assertEqual(
+            report["baseline"]["thresholds"][0],
+            {
+                "state": "Buy",
+                "indicator": "BBands%",
+                "lower": -1.0,
+                "upper": 0.2,
+            },
+        )
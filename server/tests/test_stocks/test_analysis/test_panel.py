@@ -0,0 +1,88 @@
+import numpy as np
+
+from django.test import TestCase
+from stocks.analysis.functions import add_indicators
+from stocks.analysis.kernel import (
+    BB_PERCENT,
+    INDICATOR_COLUMNS,
+    compute_indicators,
+)
+from stocks.analysis.panel import (
+    LATEST_COLUMNS,
+    align_closes,
+    batch_latest_indicators,
+    compute_panel,
+    latest_panel,
+)
+from stocks.models import Stock, Subscription
+from tests.base_case import make_bars
+
+
+class TestLatestPanel(TestCase):
+    def test_matches_per_history_computation(self):
+        histories = {
+            f"T{bars}": make_bars(bars, seed=bars)
+            for bars in (10, 15, 19, 20, 35, 126, 252)
+        }
+
+        panel = latest_panel(histories)
+
+        for key, history in histories.items():
+            expected = add_indicators(history.copy()).iloc[-1]
+            np.testing.assert_allclose(
+                panel.loc[key, LATEST_COLUMNS].to_numpy(dtype=float),
+                expected[LATEST_COLUMNS].to_numpy(dtype=float),
+                rtol=1e-9,
+                err_msg=key,
+            )
+
+    def test_flat_window_has_no_band(self):
+        history = make_bars(40)
+        history["Close"] = 100.0
+        closes = align_closes({"FLAT": history})
+
+        with np.errstate(all="raise"):
+            panel = latest_panel({"FLAT": history})
+
+        self.assertTrue(np.isnan(panel.loc["FLAT", "BBands%"]))
+        self.assertTrue(np.isnan(compute_panel(closes)[-1, 0, BB_PERCENT]))
+
+
+class TestBatchLatestIndicators(TestCase):
+    def test_groups_by_interval(self):
+        stock = Stock.objects.create(ticker="AAPL")
+        daily = Subscription.objects.create(stock=stock, interval="1d")
+        hourly = Subscription.objects.create(stock=stock, interval="1h")
+        histories = {
+            daily: make_bars(60, seed=1),
+            hourly: make_bars(90, seed=2),
+        }
+
+        latest = batch_latest_indicators(histories)
+
+        for sub, history in histories.items():
+            expected = add_indicators(history.copy()).iloc[-1]
+            self.assertAlmostEqual(latest[sub]["BBands%"], expected["BBands%"])
+
+
+class TestComputePanel(TestCase):
+    def test_matches_kernel(self):
+        histories = {
+            f"T{bars}": make_bars(bars, seed=bars) for bars in (5, 19, 20, 300)
+        }
+        closes = align_closes(histories)
+        closes[150, 3] = closes[149, 3]
+        closes[200:220, 3] = closes[199, 3]
+
+        block = compute_panel(closes)
+
+        self.assertEqual(
+            block.shape, (300, len(histories), len(INDICATOR_COLUMNS))
+        )
+        for column, history in enumerate(histories.values()):
+            bars = len(history)
+            expected = compute_indicators(closes[300 - bars :, column])
+            np.testing.assert_allclose(
+                block[300 - bars :, column], expected, rtol=1e-9, atol=1e-9
+            )
+            self.assertTrue(np.isnan(block[: 300 - bars, column]).all())
@@ -0,0 +1,181 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from pandas import DataFrame, Timedelta, Timestamp
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from stocks.analysis.pipeline import Progress, run_analysis
+from stocks.models import State, Stock, Subscription
+
+
+class TestRunAnalysis(TestCase):
+    def setUp(self):
+        self.mock_analytics_done = patch(
+            "stocks.analysis.pipeline.analytics_done"
+        ).start()
+        self.mock_iter_histories = patch(
+            "stocks.analysis.pipeline.iter_histories"
+        ).start()
+        self.mock_add_indicators = patch(
+            "stocks.analysis.pipeline.add_indicators"
+        ).start()
+        self.mock_latest_indicators = patch(
+            "stocks.analysis.pipeline.latest_indicators"
+        ).start()
+        self.mock_analyse_stocks = patch(
+            "stocks.analysis.pipeline.analyse_stocks"
+        ).start()
+        self.mock_last_trades = patch(
+            "stocks.analysis.freshness.last_trades", return_value={}
+        ).start()
+        self.mock_mark_analysed = patch(
+            "stocks.analysis.pipeline.mark_analysed"
+        ).start()
+        self.addCleanup(patch.stopall)
+
+        self.user = User.objects.create(username="test_user", password="1234")
+
+    def subscribe(self, ticker="AAPL", **fields):
+        sub = Subscription.objects.create(
+            stock=Stock.objects.create(ticker=ticker), **fields
+        )
+        sub.users.add(self.user)
+        return sub
+
+    def run_analysis(self, progress=None):
+        return run_analysis(
+            Subscription.objects.select_related("stock", "state"), progress
+        )
+
+    def test_current_state_not_changed(self):
+        sub = self.subscribe()
+        data = [[70, 0.8, 70, 100]]
+        mock_history = DataFrame(
+            data, columns=["RSI", "BBands%", "RSI_SMA14", "Close"]
+        )
+        self.mock_iter_histories.return_value = [(sub, mock_history)]
+        self.mock_latest_indicators.return_value = {"BBands%": 0.8}
+        self.mock_analyse_stocks.return_value = [sub.state]
+
+        result = self.run_analysis()
+
+        self.mock_analytics_done.send.assert_not_called()
+        latest = self.mock_analyse_stocks.call_args.args[0]
+        self.assertEqual(latest["BBands%"].tolist(), [0.8])
+        self.assertEqual(result, {"analysed": 1, "skipped": 0, "changed": 0})
+
+    def test_current_state_changed(self):
+        new_state = State.objects.create(name="Buy")
+        sub = self.subscribe()
+        data = [[70, 0.8, 70, 100]]
+        mock_history = DataFrame(
+            data, columns=["RSI", "BBands%", "RSI_SMA14", "Close"]
+        )
+        self.mock_iter_histories.return_value = [(sub, mock_history)]
+        self.mock_add_indicators.return_value = mock_history
+        self.mock_latest_indicators.return_value = {"BBands%": 0.8}
+        self.mock_analyse_stocks.return_value = [new_state]
+
+        result = self.run_analysis()
+
+        self.mock_analytics_done.send.assert_called_once_with(
+            sender=Subscription.__class__,
+            instance=sub,
+            history=mock_history,
+        )
+        self.assertEqual(result, {"analysed": 1, "skipped": 0, "changed": 1})
+        sub.refresh_from_db()
+        self.assertEqual(sub.state, new_state)
+
+    def test_empty_history_skipped(self):
+        sub = self.subscribe()
+        self.mock_iter_histories.return_value = [(sub, DataFrame())]
+        self.mock_analyse_stocks.return_value = []
+
+        result = self.run_analysis()
+
+        self.assertEqual(result["analysed"], 0)
+        self.mock_latest_indicators.assert_not_called()
+        self.mock_analytics_done.send.assert_not_called()
+
+    @override_settings(ANALYSIS_LOOKBACK_PRECISION=1e-4)
+    @patch("stocks.analysis.pipeline.fetch_history")
+    def test_lookback_fetches_period_for_chart(self, mock_fetch_history):
+        new_state = State.objects.create(name="Buy")
+        sub = self.subscribe()
+        full_history = DataFrame([[100], [101]], columns=["Close"])
+        self.mock_iter_histories.return_value = [
+            (sub, DataFrame([[101]], columns=["Close"]))
+        ]
+        self.mock_latest_indicators.return_value = {"BBands%": 0.1}
+        mock_fetch_history.return_value = full_history
+        self.mock_analyse_stocks.return_value = [new_state]
+
+        self.run_analysis()
+
+        mock_fetch_history.assert_called_once_with(sub)
+        self.mock_add_indicators.assert_called_once_with(full_history)
+
+    @override_settings(ANALYSIS_BATCH_MODE=True)
+    @patch("stocks.analysis.pipeline.batch_latest_indicators")
+    def test_batch_mode(self, mock_batch):
+        sub = self.subscribe()
+        mock_history = DataFrame([[100]], columns=["Close"])
+        self.mock_iter_histories.return_value = [(sub, mock_history)]
+        mock_batch.return_value = {sub: {"BBands%": 0.3}}
+        self.mock_analyse_stocks.return_value = [sub.state]
+
+        self.run_analysis()
+
+        mock_batch.assert_called_once_with({sub: mock_history})
+        self.mock_latest_indicators.assert_not_called()
+        latest = self.mock_analyse_stocks.call_args.args[0]
+        self.assertEqual(latest["BBands%"].tolist(), [0.3])
+
+    @patch("stocks.analysis.pipeline.timezone")
+    def test_skips_subscriptions_without_trades(self, mock_timezone):
+        last_trade = datetime(2024, 6, 3, 20, tzinfo=timezone.utc)
+        # A Tuesday, during both sessions
+        now = datetime(2024, 6, 4, 14, tzinfo=timezone.utc)
+        mock_timezone.now.return_value = now
+        self.subscribe("AAPL", last_trade_at=last_trade)
+        traded = self.subscribe("SAP.DE", last_trade_at=last_trade)
+        self.mock_last_trades.return_value = {
+            "AAPL": Timestamp(last_trade),
+            "SAP.DE": Timestamp(last_trade) + Timedelta(minutes=1),
+        }
+        history = DataFrame([[100]], columns=["Close"])
+        self.mock_iter_histories.return_value = [(traded, history)]
+        self.mock_latest_indicators.return_value = {"BBands%": 0.5}
+        self.mock_analyse_stocks.return_value = [traded.state]
+
+        result = self.run_analysis()
+
+        self.assertEqual(result, {"analysed": 1, "skipped": 1, "changed": 0})
+        self.assertEqual(self.mock_iter_histories.call_args.args[0], [traded])
+        self.mock_mark_analysed.assert_called_once_with(
+            {traded: history}, self.mock_last_trades.return_value, now
+        )
+
+    def test_progress(self):
+        subs = [self.subscribe("AAPL"), self.subscribe("MSFT")]
+        history = DataFrame([[100]], columns=["Close"])
+        self.mock_iter_histories.return_value = [
+            (sub, history) for sub in subs
+        ]
+        self.mock_latest_indicators.return_value = {"BBands%": 0.5}
+        self.mock_analyse_stocks.return_value = [sub.state for sub in subs]
+        progress = Progress()
+
+        self.run_analysis(progress)
+
+        self.assertEqual(progress.current, "db_write")
+        self.assertEqual(
+            progress.counts,
+            {"subscriptions": 2, "due": 2, "skipped": 0, "fetched": 2},
+        )
+        self.assertEqual(
+            list(progress.timings),
+            ["filter", "fetch", "classify", "notify", "db_write"],
+        )
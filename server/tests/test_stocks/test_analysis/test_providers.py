@@ -0,0 +1,241 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from pandas import DataFrame, Timedelta, Timestamp
+
+from django.test import SimpleTestCase, override_settings
+from stocks.analysis.providers import (
+    ReplayProvider,
+    ResilientProvider,
+    YFinanceProvider,
+    get_provider,
+    synthetic_history,
+)
+from stocks.analysis.resilience import CircuitOpen, UpstreamError
+
+NOW = datetime(2024, 6, 3, 20, tzinfo=timezone.utc)
+
+
+@patch("stocks.analysis.providers.timezone.now", return_value=NOW)
+class TestReplayProvider(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.directory.name, "1d"))
+        self.recorded = synthetic_history("1d", 300, seed=1)
+        self.recorded.to_csv(
+            os.path.join(self.directory.name, "1d", "AAPL.csv")
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_recorded_bars_shifted_to_now(self, _):
+        provider = ReplayProvider(self.directory.name, synthetic=False)
+
+        history = provider.history("AAPL", period="6mo", interval="1d")
+
+        self.assertLessEqual(history.index[-1], Timestamp(NOW))
+        self.assertGreater(
+            history.index[-1], Timestamp(NOW) - Timedelta(days=1)
+        )
+        self.assertGreaterEqual(
+            history.index[0], Timestamp(NOW) - Timedelta(days=184)
+        )
+        self.assertEqual(
+            history["Close"].iloc[-1], self.recorded["Close"].iloc[-1]
+        )
+
+    def test_missing_ticker(self, _):
+        recorded_only = ReplayProvider(self.directory.name, synthetic=False)
+        self.assertTrue(recorded_only.history("DEAD", period="1mo").empty)
+        with self.assertRaises(ValueError):
+            recorded_only.history("DEAD", period="1mo", raise_errors=True)
+        self.assertEqual(
+            recorded_only.download(["AAPL", "DEAD"], "1mo", "1d").keys(),
+            {"AAPL"},
+        )
+
+        synthetic = ReplayProvider(self.directory.name)
+        history = synthetic.history("MSFT", period="1mo", interval="1d")
+        self.assertGreater(len(history), 15)
+        self.assertTrue(
+            history.equals(synthetic.history("MSFT", period="1mo"))
+        )
+
+    def test_last_trades(self, _):
+        recorded_only = ReplayProvider(self.directory.name, synthetic=False)
+
+        self.assertEqual(
+            recorded_only.last_trades(["AAPL", "DEAD"]),
+            {"AAPL": Timestamp(NOW)},
+        )
+        self.assertEqual(
+            ReplayProvider().last_trades(["DEAD"]), {"DEAD": Timestamp(NOW)}
+        )
+
+    @patch("stocks.analysis.providers.time.sleep")
+    def test_latency(self, mock_sleep, _):
+        provider = ReplayProvider(latency=0.25)
+
+        provider.download(["AAPL", "MSFT"], "1mo", "1d")
+        provider.history("AAPL", period="1mo")
+
+        self.assertEqual(
+            [call.args for call in mock_sleep.call_args_list],
+            [(0.25,), (0.25,)],
+        )
+
+
+class TestGetProvider(SimpleTestCase):
+    @override_settings(MARKET_DATA_PROVIDER="yfinance")
+    def test_yfinance_default(self):
+        provider = get_provider()
+        self.assertIsInstance(provider, ResilientProvider)
+        self.assertIsInstance(provider.provider, YFinanceProvider)
+        self.assertIs(provider, get_provider())
+
+    @override_settings(
+        MARKET_DATA_PROVIDER="replay",
+        MARKET_DATA_REPLAY_DIR="/data/replay",
+        MARKET_DATA_REPLAY_LATENCY=0.1,
+    )
+    def test_replay(self):
+        provider = get_provider().provider
+        self.assertIsInstance(provider, ReplayProvider)
+        self.assertEqual(str(provider.root), "/data/replay")
+        self.assertEqual(provider.latency, 0.1)
+
+    @override_settings(MARKET_DATA_PROVIDER="bloomberg")
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_provider()
+
+
+class TestYFinanceProvider(SimpleTestCase):
+    @patch("stocks.analysis.providers.yf.Ticker")
+    def test_history_arguments(self, mock_ticker):
+        provider = YFinanceProvider()
+
+        provider.history("AAPL", period="6mo", interval="1h")
+        provider.history("AAPL", start=NOW, raise_errors=True)
+
+        self.assertEqual(
+            [
+                call.kwargs
+                for call in mock_ticker.return_value.history.call_args_list
+            ],
+            [
+                {"interval": "1h", "period": "6mo"},
+                {"interval": "1d", "start": NOW, "raise_errors": True},
+            ],
+        )
+
+    @patch("stocks.analysis.providers.YfData")
+    def test_last_trades(self, mock_data):
+        mock_data.return_value.get_raw_json.return_value = {
+            "quoteResponse": {
+                "result": [
+                    {"symbol": "AAPL", "regularMarketTime": 1717444800},
+                    {"symbol": "DEAD"},
+                ]
+            }
+        }
+
+        trades = YFinanceProvider().last_trades(["AAPL", "DEAD"])
+
+        self.assertEqual(
+            trades, {"AAPL": Timestamp("2024-06-03 20:00", tz="UTC")}
+        )
+        self.assertEqual(
+            mock_data.return_value.get_raw_json.call_args.kwargs["params"][
+                "symbols"
+            ],
+            "AAPL,DEAD",
+        )
+
+    @patch("stocks.analysis.providers.record_response")
+    def test_reports_responses(self, mock_record):
+        provider = YFinanceProvider()
+        response = requests.Response()
+        response.url = "https://query2.finance.yahoo.com/v8/finance/chart/X"
+        response.status_code = 429
+        response.elapsed = timedelta(milliseconds=250)
+
+        for hook in provider.session.hooks["response"]:
+            hook(response)
+
+        mock_record.assert_called_once_with(
+            "query2.finance.yahoo.com", 429, 0.25
+        )
+
+    @patch("stocks.analysis.providers.record_response")
+    @patch("stocks.analysis.providers.yf.Ticker")
+    def test_reports_failures(self, mock_ticker, mock_record):
+        error = requests.ConnectionError(
+            request=requests.Request(
+                "GET", "https://query2.finance.yahoo.com/"
+            ).prepare()
+        )
+        mock_ticker.return_value.history.side_effect = error
+
+        with self.assertRaises(requests.ConnectionError):
+            YFinanceProvider().history("AAPL")
+
+        mock_record.assert_called_once_with(
+            "query2.finance.yahoo.com", None, 0
+        )
+
+    @patch("stocks.analysis.providers.record_response")
+    @patch("stocks.analysis.providers.yf.Ticker")
+    def test_throttled_without_bars(self, mock_ticker, _):
+        provider = YFinanceProvider()
+        response = requests.Response()
+        response.url = "https://query2.finance.yahoo.com/"
+        response.status_code = 429
+        response.elapsed = timedelta(0)
+
+        def history(**_):
+            provider._report(response)
+            return DataFrame()
+
+        mock_ticker.return_value.history.side_effect = history
+
+        with self.assertRaises(UpstreamError):
+            provider.history("AAPL")
+
+        response.status_code = 404
+        self.assertTrue(provider.history("DEAD").empty)
+
+
+@override_settings(MARKET_DATA_RETRIES=2, MARKET_DATA_BREAKER_THRESHOLD=1)
+@patch("stocks.analysis.resilience.time.sleep")
+class TestResilientProvider(SimpleTestCase):
+    def test_retries_transient_errors(self, mock_sleep):
+        inner = MagicMock()
+        inner.history.side_effect = [
+            requests.ConnectionError(),
+            UpstreamError(503),
+            DataFrame({"Close": [1.0]}),
+        ]
+        provider = ResilientProvider(inner, "yfinance")
+
+        history = provider.history("AAPL", period="1mo")
+
+        self.assertEqual(len(history), 1)
+        self.assertEqual(mock_sleep.call_count, 2)
+        inner.history.assert_called_with("AAPL", period="1mo")
+
+    def test_opens_circuit(self, _):
+        inner = MagicMock()
+        inner.download.side_effect = requests.Timeout()
+        provider = ResilientProvider(inner, "yfinance")
+
+        with self.assertRaises(requests.Timeout):
+            provider.download(["AAPL"], "1mo", "1d")
+        with self.assertRaises(CircuitOpen):
+            provider.download(["AAPL"], "1mo", "1d")
+        self.assertEqual(inner.download.call_count, 3)
@@ -0,0 +1,66 @@
+from pandas import Timestamp, date_range
+
+from django.test import SimpleTestCase
+from stocks.analysis.resample import resample_history
+from tests.base_case import make_bars
+
+
+class TestResampleHistory(SimpleTestCase):
+    def test_hourly_from_five_minutes(self):
+        days = [
+            date_range(
+                f"2024-03-{day} 09:30",
+                f"2024-03-{day} 15:55",
+                freq="5min",
+                tz="America/New_York",
+            )
+            for day in (27, 28)
+        ]
+        bars = make_bars(index=days[0].append(days[1]))
+
+        hourly = resample_history(bars, "1h")
+
+        self.assertEqual(len(hourly), 14)
+        self.assertEqual(
+            hourly.index[0],
+            Timestamp("2024-03-27 09:30", tz="America/New_York"),
+        )
+        self.assertEqual(
+            hourly.index[7],
+            Timestamp("2024-03-28 09:30", tz="America/New_York"),
+        )
+        first_hour = bars.iloc[:12]
+        self.assertEqual(hourly["Open"].iloc[0], first_hour["Open"].iloc[0])
+        self.assertEqual(hourly["High"].iloc[0], first_hour["High"].max())
+        self.assertEqual(hourly["Low"].iloc[0], first_hour["Low"].min())
+        self.assertEqual(hourly["Close"].iloc[0], first_hour["Close"].iloc[-1])
+        self.assertEqual(hourly["Volume"].iloc[0], 120)
+        # The last bucket of the session is the half hour before the close
+        self.assertEqual(hourly["Volume"].iloc[6], 60)
+
+    def test_weekly_from_daily(self):
+        bars = make_bars(
+            index=date_range("2024-03-04", "2024-03-22", freq="B", tz="UTC")
+        )
+
+        weekly = resample_history(bars, "1wk")
+
+        self.assertEqual(
+            list(weekly.index.day_name()), ["Monday", "Monday", "Monday"]
+        )
+        self.assertEqual(weekly["Close"].iloc[0], bars["Close"].iloc[4])
+
+    def test_monthly_from_daily(self):
+        bars = make_bars(
+            index=date_range("2024-01-02", "2024-03-22", freq="B", tz="UTC")
+        )
+
+        monthly = resample_history(bars, "1mo")
+
+        self.assertEqual(list(monthly.index.month), [1, 2, 3])
+        self.assertTrue((monthly.index.day == 1).all())
+
+    def test_not_derivable(self):
+        bars = make_bars(index=date_range("2024-01-02", periods=5, tz="UTC"))
+        with self.assertRaises(ValueError):
+            resample_history(bars, "5d")
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from stocks.analysis.resilience import (
+    RETRY_BACKOFF_CAP,
+    CircuitBreaker,
+    CircuitOpen,
+    UpstreamError,
+    backoff_delay,
+    cached_misses,
+    call_with_retries,
+    recheck_delay,
+    record_fetches,
+)
+from stocks.models import MissingHistory
+
+NOW = datetime(2024, 6, 3, 20, tzinfo=timezone.utc)
+
+
+class TestBackoffDelay(SimpleTestCase):
+    @patch("stocks.analysis.resilience.random.uniform")
+    def test_doubles_up_to_cap(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: high
+
+        self.assertEqual(
+            [backoff_delay(attempt, 0.5) for attempt in range(6)],
+            [0.5, 1.0, 2.0, 4.0, RETRY_BACKOFF_CAP, RETRY_BACKOFF_CAP],
+        )
+        self.assertEqual(mock_uniform.call_args.args[0], 0)
+
+
+@patch("stocks.analysis.resilience.time.monotonic", return_value=0)
+class TestCircuitBreaker(SimpleTestCase):
+    def test_opens_and_recovers(self, mock_monotonic):
+        breaker = CircuitBreaker("yfinance", threshold=2, reset_timeout=60)
+        breaker.failure()
+        breaker.allow()
+        breaker.failure()
+
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpen):
+            breaker.allow()
+
+        mock_monotonic.return_value = 60
+        breaker.allow()
+        # Only one trial call at a time
+        with self.assertRaises(CircuitOpen):
+            breaker.allow()
+        breaker.success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self, mock_monotonic):
+        breaker = CircuitBreaker("yfinance", threshold=1, reset_timeout=60)
+        breaker.failure()
+
+        mock_monotonic.return_value = 60
+        breaker.allow()
+        breaker.failure()
+
+        self.assertEqual(breaker.state, "open")
+        mock_monotonic.return_value = 119
+        self.assertEqual(breaker.state, "open")
+        mock_monotonic.return_value = 120
+        self.assertEqual(breaker.state, "half-open")
+
+
+@patch("stocks.analysis.resilience.time.sleep")
+class TestCallWithRetries(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker("yfinance", 5, 60)
+
+    def test_gives_up_after_retries(self, mock_sleep):
+        call = MagicMock(side_effect=UpstreamError(429))
+
+        with self.assertRaises(UpstreamError):
+            call_with_retries(call, self.breaker, retries=2, backoff=0.1)
+
+        self.assertEqual(call.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_other_errors_not_retried(self, mock_sleep):
+        call = MagicMock(side_effect=ValueError("no data"))
+        self.breaker.failures = 3
+
+        with self.assertRaises(ValueError):
+            call_with_retries(call, self.breaker, retries=2, backoff=0.1)
+
+        self.assertEqual(call.call_count, 1)
+        mock_sleep.assert_not_called()
+        self.assertEqual(self.breaker.failures, 0)
+
+
+@override_settings(
+    MARKET_DATA_MISS_RECHECK=3600, MARKET_DATA_MISS_MAX_RECHECK=4 * 3600
+)
+class TestNegativeCache(TestCase):
+    def test_recheck_delay_escalates(self):
+        self.assertEqual(
+            [
+                recheck_delay(misses).total_seconds() / 3600
+                for misses in (1, 2, 3, 4, 5)
+            ],
+            [0, 1, 2, 4, 4],
+        )
+
+    def test_record_and_skip(self):
+        record_fetches({("DEAD", "1d"): False, ("AAPL", "1d"): True}, NOW)
+        self.assertEqual(
+            list(MissingHistory.objects.values_list("ticker", "misses")),
+            [("DEAD", 1)],
+        )
+        # The first miss is checked again on the next run
+        self.assertEqual(cached_misses([("DEAD", "1d")], NOW), set())
+
+        record_fetches({("DEAD", "1d"): False}, NOW)
+        keys = [("DEAD", "1d"), ("DEAD", "1h"), ("AAPL", "1d")]
+        self.assertEqual(cached_misses(keys, NOW), {("DEAD", "1d")})
+        self.assertEqual(cached_misses(keys, NOW + timedelta(hours=1)), set())
+
+        record_fetches({("DEAD", "1d"): True}, NOW)
+        self.assertFalse(MissingHistory.objects.exists())
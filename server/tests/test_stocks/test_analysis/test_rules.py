@@ -0,0 +1,136 @@
+import math
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from pandas import DataFrame
+
+from stocks.analysis.rules import (
+    RULES_CACHE,
+    CompiledRules,
+    IntervalIndex,
+    get_rule_index,
+)
+from stocks.models import (
+    CacheVersion,
+    Indicator,
+    State,
+    StateIndicator,
+    default_state,
+)
+
+
+class TestIntervalIndex(SimpleTestCase):
+    def test_half_open_ranges(self):
+        index = IntervalIndex([(0.0, 0.2, 1), (0.8, 1.0, 2), (1.0, 2.0, 3)])
+        self.assertEqual(index.lookup(0.0), 1)
+        self.assertEqual(index.lookup(0.1), 1)
+        self.assertIsNone(index.lookup(0.2))
+        self.assertIsNone(index.lookup(0.5))
+        self.assertEqual(index.lookup(0.9), 2)
+        self.assertEqual(index.lookup(1.0), 3)
+        self.assertIsNone(index.lookup(2.0))
+        self.assertIsNone(index.lookup(-0.1))
+
+    def test_overlap_prefers_lowest_state(self):
+        index = IntervalIndex([(0.0, 1.0, 5), (0.5, 2.0, 3)])
+        self.assertEqual(index.lookup(0.2), 5)
+        self.assertEqual(index.lookup(0.7), 3)
+        self.assertEqual(index.lookup(1.5), 3)
+
+    def test_nan_and_empty(self):
+        self.assertIsNone(IntervalIndex([(0.0, 1.0, 1)]).lookup(math.nan))
+        self.assertIsNone(IntervalIndex([]).lookup(0.5))
+
+
+class TestCompiledRules(SimpleTestCase):
+    def setUp(self):
+        self.rules = CompiledRules(
+            [
+                ("BBands%", 0.0, 0.2, 2),
+                ("RSI", 0.0, 40.0, 2),
+                ("BBands%", 0.0, 1.0, 3),
+                ("RSI_SMA14", 50.0, 100.0, 4),
+            ],
+            default_id=1,
+        )
+
+    def test_conjunction_and_first_match(self):
+        latest = DataFrame(
+            {
+                "BBands%": [0.1, 0.1, 0.5, 2.0, np.nan],
+                "RSI": [30.0, 50.0, 50.0, 50.0, 30.0],
+                "RSI_SMA14": [0.0, 0.0, 0.0, 60.0, 0.0],
+            }
+        )
+        np.testing.assert_array_equal(
+            self.rules.classify(latest), [2, 3, 3, 4, 1]
+        )
+
+    def test_unchecked_indicators(self):
+        latest = DataFrame({"BBands%": [0.1, 0.5, 2.0]})
+        np.testing.assert_array_equal(self.rules.classify(latest), [2, 3, 1])
+        np.testing.assert_array_equal(
+            self.rules.classify(DataFrame({"Close": [1.0]})), [1]
+        )
+
+    def test_no_rules(self):
+        rules = CompiledRules([], default_id=1)
+        latest = DataFrame({"BBands%": [0.1]})
+        np.testing.assert_array_equal(rules.classify(latest), [1])
+
+
+class TestRuleIndex(TestCase):
+    def setUp(self):
+        self.bbands = Indicator.objects.create(name="BBands%")
+        self.buy = State.objects.create(name="Buy")
+        StateIndicator.objects.create(
+            state=self.buy,
+            indicator=self.bbands,
+            lower_threshold=0.0,
+            upper_threshold=0.2,
+        )
+
+    def test_classify(self):
+        index = get_rule_index()
+        self.assertEqual(index.classify(0.1), self.buy)
+        self.assertEqual(index.classify(0.5), State.objects.get(name="Hold"))
+
+    def test_cached_until_version_changes(self):
+        index = get_rule_index()
+        with self.assertNumQueries(1):
+            self.assertIs(get_rule_index(), index)
+
+        # Another worker changed the rules
+        CacheVersion.objects.filter(name=RULES_CACHE).update(version="other")
+        self.assertIsNot(get_rule_index(), index)
+
+    def test_default_state_resolved_once(self):
+        hold = State.objects.get(name="Hold")
+        self.assertEqual(default_state(), hold.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(default_state(), hold.id)
+
+        hold.delete()
+        self.assertNotEqual(default_state(), hold.id)
+
+    def test_rule_changes_invalidate(self):
+        self.assertEqual(get_rule_index().classify(0.5).name, "Hold")
+
+        StateIndicator.objects.filter(state=self.buy).update(
+            upper_threshold=1.0
+        )
+        # Queryset updates send no signals
+        self.assertEqual(get_rule_index().classify(0.5).name, "Hold")
+
+        sell = State.objects.create(name="Sell")
+        StateIndicator.objects.create(
+            state=sell,
+            indicator=self.bbands,
+            lower_threshold=1.0,
+            upper_threshold=2.0,
+        )
+        self.assertEqual(get_rule_index().classify(0.5), self.buy)
+        self.assertEqual(get_rule_index().classify(1.5), sell)
+
+        sell.delete()
+        self.assertEqual(get_rule_index().classify(1.5).name, "Hold")
@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from stocks.models import Stock, Subscription
+
+
+@patch("stocks.management.commands.run_analysis.run_analysis")
+class TestRunAnalysisCommand(TestCase):
+    def setUp(self):
+        self.aapl = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
+        self.msft = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="MSFT"), interval="1h"
+        )
+
+    def call(self, mock_run_analysis, **options):
+        mock_run_analysis.return_value = {
+            "analysed": 1,
+            "skipped": 0,
+            "changed": 0,
+        }
+        out = StringIO()
+        call_command("run_analysis", stdout=out, **options)
+        return out.getvalue()
+
+    def test_filters(self, mock_run_analysis):
+        self.call(mock_run_analysis, tickers=["AAPL", "MSFT"], interval="1h")
+        self.assertEqual(mock_run_analysis.call_args.args[0], [self.msft])
+
+        self.call(mock_run_analysis, subscriptions=[self.aapl.pk])
+        self.assertEqual(mock_run_analysis.call_args.args[0], [self.aapl])
+
+    def test_workers(self, mock_run_analysis):
+        self.call(mock_run_analysis, workers=4)
+
+        self.assertEqual(mock_run_analysis.call_args.kwargs["workers"], 4)
+
+    def test_json(self, mock_run_analysis):
+        output = json.loads(self.call(mock_run_analysis, json=True))
+
+        self.assertEqual(output["result"]["analysed"], 1)
+        self.assertEqual(
+            set(output["due"]), {str(self.aapl.pk), str(self.msft.pk)}
+        )
+
+    def test_profile(self, mock_run_analysis):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.prof")
+            self.call(mock_run_analysis, profile=path)
+
+            self.assertGreater(os.path.getsize(path), 0)
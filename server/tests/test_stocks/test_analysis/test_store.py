@@ -0,0 +1,134 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+
+from django.test import SimpleTestCase
+from pandas import Timestamp
+from stocks.analysis.periods import period_start
+from stocks.analysis.store import (
+    COLUMNS,
+    STALE_GENERATION_SECONDS,
+    HistoryStore,
+)
+from tests.base_case import make_bars
+
+NOW = datetime(2024, 3, 29, 12, tzinfo=timezone.utc)
+
+
+@patch("stocks.analysis.store.timezone.now", return_value=NOW)
+@patch("stocks.analysis.providers.yf.Ticker")
+class TestHistoryStore(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(self.directory.name)
+        self.bars = make_bars(211, "2023-09-01", tz="America/New_York").assign(
+            Dividends=0.0
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_first_run_downloads_period(self, mock_ticker, _):
+        mock_ticker.return_value.history.return_value = self.bars
+
+        history = self.store.get_history("AAPL", "1d", "6mo")
+
+        mock_ticker.return_value.history.assert_called_once_with(
+            period="6mo", interval="1d"
+        )
+        self.assertEqual(history.index[0], self.bars.index[29])
+        stored = self.store.read("AAPL", "1d")
+        self.assertIsInstance(stored.history["Close"].values, np.ndarray)
+        np.testing.assert_array_equal(
+            stored.history.to_numpy(), self.bars[COLUMNS].iloc[29:].to_numpy()
+        )
+        self.assertTrue(stored.history.index.equals(self.bars.index[29:]))
+
+    def test_delta_fetch_reconciles_forming_bar(self, mock_ticker, _):
+        history_call = mock_ticker.return_value.history
+        history_call.return_value = self.bars.iloc[:-1].copy()
+        history_call.return_value.iloc[-1, 3] += 5  # still forming
+        self.store.get_history("AAPL", "1d", "6mo")
+
+        history_call.reset_mock()
+        history_call.return_value = self.bars.iloc[-3:]
+        history = self.store.get_history("AAPL", "1d", "6mo")
+
+        self.assertEqual(
+            history_call.call_args.kwargs["start"], self.bars.index[-3]
+        )
+        self.assertIn("end", history_call.call_args.kwargs)
+        np.testing.assert_array_equal(
+            history["Close"].to_numpy(),
+            self.bars["Close"].iloc[29:].to_numpy(),
+        )
+
+    def test_adjusted_bars_are_downloaded_again(self, mock_ticker, _):
+        history_call = mock_ticker.return_value.history
+        history_call.return_value = self.bars.iloc[:-1]
+        self.store.get_history("AAPL", "1d", "6mo")
+
+        adjusted = self.bars.copy()
+        adjusted[["Open", "High", "Low", "Close"]] *= 0.98
+        history_call.side_effect = [adjusted.iloc[-3:], adjusted]
+        history = self.store.get_history("AAPL", "1d", "6mo")
+
+        self.assertEqual(history_call.call_count, 3)
+        self.assertEqual(
+            history_call.call_args.kwargs, {"period": "6mo", "interval": "1d"}
+        )
+        self.assertEqual(history["Close"].iloc[0], adjusted["Close"].iloc[29])
+
+    def test_longer_period_downloads_again(self, mock_ticker, _):
+        history_call = mock_ticker.return_value.history
+        history_call.return_value = self.bars
+        self.store.get_history("AAPL", "1d", "6mo")
+
+        history_call.return_value = make_bars(
+            367, "2023-03-29", tz="America/New_York"
+        )
+        self.store.get_history("AAPL", "1d", "1y")
+
+        self.assertEqual(
+            history_call.call_args.kwargs, {"period": "1y", "interval": "1d"}
+        )
+
+    def test_update_trims_bars_to_period(self, mock_ticker, _):
+        self.store.write("AAPL", "1d", self.bars.iloc[:-1], self.bars.index[0])
+        mock_ticker.return_value.history.return_value = self.bars.iloc[-3:]
+
+        self.store.get_history("AAPL", "1d", "6mo")
+
+        stored = self.store.read("AAPL", "1d")
+        self.assertEqual(
+            stored.covered_from, period_start("6mo", Timestamp(NOW))
+        )
+        self.assertTrue(stored.history.index.equals(self.bars.index[29:]))
+
+    def test_write_keeps_generations_of_other_writers(self, *_):
+        key_dir = self.store._key_dir("AAPL", "1d")
+        self.store.write("AAPL", "1d", self.bars, self.bars.index[0])
+        replaced = (key_dir / "CURRENT").read_text()
+        pending = key_dir / "pending"
+        pending.mkdir()
+        stale = key_dir / "stale"
+        stale.mkdir()
+        stale_time = NOW.timestamp() - STALE_GENERATION_SECONDS - 1
+        os.utime(stale, (stale_time, stale_time))
+
+        self.store.write("AAPL", "1d", self.bars, self.bars.index[0])
+
+        self.assertFalse((key_dir / replaced).exists())
+        self.assertFalse(stale.exists())
+        self.assertTrue(pending.exists())
+        self.assertIsNotNone(self.store.read("AAPL", "1d"))
+
+    def test_missing_generation_is_a_miss(self, *_):
+        key_dir = self.store._key_dir("AAPL", "1d")
+        self.store.write("AAPL", "1d", self.bars, self.bars.index[0])
+        (key_dir / "CURRENT").write_text("removed")
+
+        self.assertIsNone(self.store.read("AAPL", "1d"))
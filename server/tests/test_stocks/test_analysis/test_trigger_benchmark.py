@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from stocks.analysis.trigger_benchmark import (
+    STAGES,
+    run_trigger_benchmark,
+)
+from stocks.models import Stock, Subscription
+
+
+class TestRunTriggerBenchmark(TestCase):
+    def test_stages_and_rollback(self):
+        run = run_trigger_benchmark(20)
+
+        self.assertEqual(run["subscriptions"], 20)
+        self.assertEqual(run["status"], "succeeded")
+        # The last trades, one step per history and the one finding there
+        # are no more
+        self.assertEqual(run["stages"]["fetch"]["calls"], 22)
+        self.assertEqual(run["skipped"], 0)
+        self.assertEqual(
+            run["stages"]["compute"]["calls"], 20 + run["messages"]
+        )
+        self.assertEqual(
+            run["stages"]["db_write"]["calls"], run["messages"] + 1
+        )
+        self.assertEqual(run["stages"]["chart"]["calls"], run["messages"])
+        self.assertEqual(run["stages"]["send"]["calls"], run["messages"])
+        self.assertGreater(run["messages"], 0)
+        self.assertGreater(run["queries"], 0)
+        self.assertFalse(Stock.objects.exists())
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_fetch_workers(self):
+        run = run_trigger_benchmark(8, latency=0.05, fetch_workers=8)
+
+        self.assertEqual(run["status"], "succeeded")
+        self.assertEqual(
+            run["stages"]["compute"]["calls"], 8 + run["messages"]
+        )
+        # The requests overlap instead of taking 8 x 50ms
+        self.assertLess(run["stages"]["fetch"]["seconds"], 0.3)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "trigger.json")
+            call_command(
+                "benchmark_trigger_analysis",
+                sizes=[3, 6],
+                batch_mode=True,
+                output=output,
+                stdout=open(os.devnull, "w"),
+            )
+            with open(output) as file:
+                runs = json.load(file)["runs"]
+
+        self.assertEqual([run["subscriptions"] for run in runs], [3, 6])
+        self.assertEqual(set(runs[0]["stages"]), set(STAGES))
@@ -1,12 +1,15 @@
-from unittest.mock import patch
-from pandas import DataFrame
+from datetime import datetime, timezone
+from unittest.mock import ANY, patch
+from pandas import DataFrame, date_range
 
 from django.contrib.auth.models import User
+from django.test import override_settings
 from rest_framework import status
 
 
 from core.models import UserProfile
-from stocks.models import Stock, Subscription, State
+from stocks.analysis.fetcher import get_limiter, record_response
+from stocks.models import AnalysisJob, Stock, Subscription, State
 from tests.base_case import APIBaseTest
 
 
@@ -142,65 +145,142 @@ class TestTriggerAnalysis(APIBaseTest):
     def setUp(self):
         super().setUp()
         self.url = "/api/analysis/"
-        self.mock_analytics_done = patch("stocks.views.analytics_done").start()
-        self.mock_get_stock_history = patch(
-            "stocks.views.get_stock_history"
-        ).start()
-
-        self.user = User.objects.create(username="test_user", password="1234")
-        self.user_profile = UserProfile.objects.get(user=self.user)
-        self.user_profile.telegram_id = 1234
-        self.user_profile.save()
 
     def test_no_active_subscriptions(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {"message": "No active subscriptions"})
+        self.assertFalse(AnalysisJob.objects.exists())
 
-    @patch("stocks.views.analyse_stock")
-    def test_current_state_not_changed(self, mock_analyse_stock):
-        stock = Stock.objects.create(ticker="AAPL")
-        sub = Subscription.objects.create(stock=stock)
-        sub.users.add(self.user)
+    def test_queues_one_job(self):
+        sub = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
 
-        data = [[70, 0.8, 70, 100]]
-        mock_history = DataFrame(
-            data, columns=["RSI", "BBands%", "RSI_SMA14", "Close"]
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        job = AnalysisJob.objects.get()
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(
+            first.data,
+            {
+                "message": "queued",
+                "job": job.pk,
+                "due": {sub.pk: ANY},
+            },
         )
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data["message"], "already queued")
+        self.assertEqual(second.data["job"], job.pk)
+        self.assertEqual(job.status, AnalysisJob.Status.QUEUED)
 
-        self.mock_get_stock_history.return_value = mock_history
-        mock_analyse_stock.return_value = sub.state
+    def test_queues_while_running(self):
+        Subscription.objects.create(stock=Stock.objects.create(ticker="AAPL"))
+        running = AnalysisJob.objects.create(status=AnalysisJob.Status.RUNNING)
 
         response = self.client.get(self.url)
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.mock_analytics_done.send.assert_not_called()
-        self.assertEqual(response.data, {"message": "success"})
 
-    @patch("stocks.views.analyse_stock")
-    def test_current_state_changed(self, mock_analyse_stock):
-        new_state = State.objects.create(name="Buy")
-        stock = Stock.objects.create(ticker="AAPL")
-        sub = Subscription.objects.create(stock=stock)
-        sub.users.add(self.user)
+        self.assertEqual(response.data["message"], "queued")
+        self.assertNotEqual(response.data["job"], running.pk)
 
-        data = [[70, 0.8, 70, 100]]
-        mock_history = DataFrame(
-            data, columns=["RSI", "BBands%", "RSI_SMA14", "Close"]
+    @patch("stocks.views.timezone")
+    def test_queues_due_subscriptions(self, mock_timezone):
+        # Wednesday 10:07 in New York
+        mock_timezone.now.return_value = datetime(
+            2024, 6, 5, 14, 7, tzinfo=timezone.utc
+        )
+        hourly = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL"), interval="1h"
         )
+        Subscription.objects.create(stock=Stock.objects.create(ticker="MSFT"))
 
-        self.mock_get_stock_history.return_value = mock_history
-        mock_analyse_stock.return_value = new_state
+        response = self.client.post(
+            self.url, {"subscriptions": [hourly.pk]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = AnalysisJob.objects.get()
+        self.assertEqual(job.subscriptions, [hourly.pk])
+        # The bar of 10:30 is served 20 minutes later
+        self.assertEqual(
+            response.data["due"], {hourly.pk: "2024-06-05T10:50:00-04:00"}
+        )
+
+    def test_invalid_subscriptions(self):
+        response = self.client.post(
+            self.url, {"subscriptions": ["AAPL"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            self.url, {"subscriptions": [404]}, format="json"
+        )
+        self.assertEqual(response.data, {"message": "No active subscriptions"})
+
+    @patch("stocks.views.timezone")
+    def test_due_when_markets_closed(self, mock_timezone):
+        # Saturday, the next daily bar closes on Monday at 16:00 in New York
+        mock_timezone.now.return_value = datetime(
+            2024, 6, 8, 12, tzinfo=timezone.utc
+        )
+        sub = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
 
         response = self.client.get(self.url)
+
+        self.assertEqual(
+            response.data["due"], {sub.pk: "2024-06-10T16:20:00-04:00"}
+        )
+
+
+class TestAnalysisSchedule(APIBaseTest):
+    @patch("stocks.views.timezone")
+    def test_due_times(self, mock_timezone):
+        now = datetime(2024, 6, 5, 14, 7, tzinfo=timezone.utc)
+        mock_timezone.now.return_value = now
+        new = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="AAPL")
+        )
+        # Analysed Friday evening, due after Monday's close
+        daily = Subscription.objects.create(
+            stock=Stock.objects.create(ticker="MSFT"),
+            analysed_at=datetime(2024, 6, 7, 21, tzinfo=timezone.utc),
+        )
+
+        response = self.client.get("/api/analysis/schedule/")
+
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.mock_analytics_done.send.assert_called_once_with(
-            sender=Subscription.__class__,
-            instance=sub,
-            history=mock_history,
+        self.assertEqual(
+            response.data["subscriptions"],
+            {
+                new.pk: now.isoformat(),
+                daily.pk: "2024-06-10T16:20:00-04:00",
+            },
         )
-        self.assertEqual(response.data, {"message": "success"})
-        sub.refresh_from_db()
-        self.assertEqual(sub.state, new_state)
+
+
+class TestAnalysisJobStatus(APIBaseTest):
+    def test_job(self):
+        job = AnalysisJob.objects.create(
+            status=AnalysisJob.Status.RUNNING,
+            stage="fetch",
+            progress={"subscriptions": 3, "fetched": 1},
+            timings={"filter": 0.5},
+        )
+
+        response = self.client.get(f"/api/analysis/jobs/{job.pk}/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "running")
+        self.assertEqual(response.data["stage"], "fetch")
+        self.assertEqual(response.data["progress"]["fetched"], 1)
+        self.assertEqual(response.data["timings"], {"filter": 0.5})
+
+    def test_unknown_job(self):
+        response = self.client.get("/api/analysis/jobs/404/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
 class TestTriggerUserAnalysis(APIBaseTest):
@@ -222,8 +302,8 @@ class TestTriggerUserAnalysis(APIBaseTest):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {"message": "No active subscriptions"})
 
-    @patch("stocks.views.analyse_stock")
-    def test_current_state_hold(self, mock_analyse_stock):
+    @patch("stocks.views.analyse_stocks")
+    def test_current_state_hold(self, mock_analyse_stocks):
         stock = Stock.objects.create(ticker="AAPL")
         sub = Subscription.objects.create(stock=stock)
         sub.users.add(self.user)
@@ -234,7 +314,7 @@ class TestTriggerUserAnalysis(APIBaseTest):
         )
 
         self.mock_get_stock_history.return_value = mock_history
-        mock_analyse_stock.return_value = sub.state
+        mock_analyse_stocks.return_value = [sub.state]
 
         response = self.client.get(
             self.url + f"?telegram_id={self.user_profile.telegram_id}"
@@ -242,8 +322,8 @@ class TestTriggerUserAnalysis(APIBaseTest):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.mock_analytics_done.send.assert_not_called()
 
-    @patch("stocks.views.analyse_stock")
-    def test_current_state_not_hold(self, mock_analyse_stock):
+    @patch("stocks.views.analyse_stocks")
+    def test_current_state_not_hold(self, mock_analyse_stocks):
         state = State.objects.create(name="Buy")
         stock = Stock.objects.create(ticker="AAPL")
         sub = Subscription.objects.create(stock=stock, state=state)
@@ -255,7 +335,7 @@ class TestTriggerUserAnalysis(APIBaseTest):
         )
 
         self.mock_get_stock_history.return_value = mock_history
-        mock_analyse_stock.return_value = sub.state
+        mock_analyse_stocks.return_value = [sub.state]
 
         response = self.client.get(
             self.url + f"?telegram_id={self.user_profile.telegram_id}"
@@ -270,3 +350,74 @@ class TestTriggerUserAnalysis(APIBaseTest):
         )
 
         self.assertEqual(response.data, {"message": "success"})
+
+
+class TestBacktest(APIBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.url = "/api/analysis/backtest/"
+        self.mock_fetch_tickers = patch("stocks.views.fetch_tickers").start()
+
+    def test_tickers_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_interval(self):
+        response = self.client.get(self.url + "?tickers=AAPL&interval=7m")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backtest(self):
+        close = [100.0 + (i % 30) for i in range(120)]
+        history = DataFrame(
+            {"Close": close},
+            index=date_range("2024-01-01", periods=120, freq="D"),
+        )
+        self.mock_fetch_tickers.return_value = {
+            "AAPL": history,
+            "DEAD": DataFrame(),
+        }
+
+        response = self.client.get(
+            self.url + "?tickers=aapl,dead&period=1y&interval=1d"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.mock_fetch_tickers.assert_called_once_with(
+            ["AAPL", "DEAD"], "1y", "1d"
+        )
+        self.assertEqual(response.data["missing"], ["DEAD"])
+        transitions = response.data["transitions"]["AAPL"]
+        self.assertEqual(transitions[0]["time"], "2024-01-01T00:00:00")
+        self.assertEqual(transitions[0]["State"], "Hold")
+        self.assertEqual(
+            sum(row["Signals"] for row in response.data["summary"]),
+            len(transitions),
+        )
+
+
+class TestFetchStats(APIBaseTest):
+    @override_settings(
+        MARKET_DATA_MIN_CONCURRENCY=2, MARKET_DATA_MAX_CONCURRENCY=5
+    )
+    def test_snapshot_of_workers(self):
+        record_response("query2.finance.yahoo.com", 429, 0.5)
+        AnalysisJob.objects.create(fetch_stats={})
+        job = AnalysisJob.objects.create(
+            fetch_stats={"host:1": get_limiter().snapshot()}
+        )
+        AnalysisJob.objects.create()
+
+        response = self.client.get("/api/analysis/fetch-stats/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["job"], job.pk)
+        worker = response.data["workers"]["host:1"]
+        self.assertEqual(worker["max_limit"], 5)
+        self.assertEqual(
+            worker["hosts"]["query2.finance.yahoo.com"]["throttled"], 1
+        )
+
+    def test_no_snapshot_yet(self):
+        response = self.client.get("/api/analysis/fetch-stats/")
+
+        self.assertEqual(response.data, {"job": None, "workers": {}})